@@ -7,3 +7,17 @@ from .cli import pyaerocom_cachegen
 from . import tools
 from . import cache_tools
 from . import const
+from . import planning
+from . import output_store
+from . import plan_file
+from . import config_cache
+from . import serializer
+from . import sharding
+from . import config_diff
+from . import preflight
+from . import validation
+from . import job_ids
+from . import freshness
+from . import cache_pool
+from . import pyaro_snapshot
+from . import model_preread
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+team wide pool of pyaerocom cache files shared by concurrent runs
+
+pyaerocom stores its cache files in <const.CACHEDIR>/<user>. In the pool, the user
+directories are symlinks to one shared directory, so all users read and write the
+same cache files.
+The generation of a cache file is guarded by a lock file per obs network and variable:
+a cache job of a second run waits until the first one has written the cache file and
+then just reads it instead of creating it again.
+After each cache job, the least recently used cache files are evicted until the pool
+is below its disk quota.
+
+Pool layout (in CACHE_POOL_DIR):
+files/: the cache files
+<user> -> files: pyaerocom's user cache directory
+locks/<key>.lock: lock of a cache file being generated (host, pid and start time);
+    touched by its holder every LOCK_REFRESH_INTERVAL seconds
+pyaro_configs/: the pyaro configs and cache markers (see cache_tools.store_pyaro_config)
+index/: the freshness index of the cache files (see freshness.py)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from getpass import getuser
+from pathlib import Path
+from socket import gethostname
+
+from aeroval_parallelize.const import (
+    CACHE_POOL_DIR,
+    CACHE_POOL_LOCK_TIMEOUT,
+    CACHE_POOL_QUOTA,
+)
+
+# sub directories of the pool
+POOL_FILES_DIR_NAME = "files"
+POOL_LOCK_DIR_NAME = "locks"
+POOL_PYARO_DIR_NAME = "pyaro_configs"
+POOL_INDEX_DIR_NAME = "index"
+# interval [s] in which a lock held by another job is checked
+LOCK_POLL_INTERVAL = 30
+# interval [s] in which the holder of a lock refreshes it (see remove_stale_lock)
+LOCK_REFRESH_INTERVAL = 300
+# cache files used within this time [s] are not evicted (they might be read right now)
+EVICTION_MIN_AGE = 24 * 3600
+
+
+def get_pool_files_dir(pool_dir: str | Path = CACHE_POOL_DIR) -> Path:
+    """return the directory of the cache files of the pool"""
+    return Path(pool_dir).joinpath(POOL_FILES_DIR_NAME)
+
+
+def get_pool_pyaro_dir(pool_dir: str | Path = CACHE_POOL_DIR) -> Path:
+    """return the directory of the pyaro configs of the pool"""
+    return Path(pool_dir).joinpath(POOL_PYARO_DIR_NAME)
+
+
+def get_pool_index_dir(pool_dir: str | Path = CACHE_POOL_DIR) -> Path:
+    """return the directory of the freshness index of the pool"""
+    return Path(pool_dir).joinpath(POOL_INDEX_DIR_NAME)
+
+
+def get_lock_key(request_key: str, var: str) -> str:
+    """return the lock key of a cache file (see cache_tools.get_cache_request_key)"""
+    return f"{request_key}_{var}"
+
+
+def use_cache_pool(pool_dir: str | Path = CACHE_POOL_DIR) -> Path:
+    """make pyaerocom read and write its cache files in the pool
+
+    the user's cache directory is linked to the shared files directory
+    returns the files directory
+    """
+    # to avoid that lustre access is checked if the module is just imported
+    from pyaerocom import const
+
+    files_dir = get_pool_files_dir(pool_dir)
+    files_dir.mkdir(parents=True, exist_ok=True)
+    user_dir = Path(pool_dir).joinpath(getuser())
+    if not user_dir.is_symlink():
+        try:
+            user_dir.symlink_to(POOL_FILES_DIR_NAME, target_is_directory=True)
+        except FileExistsError:
+            if not user_dir.resolve() == files_dir.resolve():
+                raise FileExistsError(
+                    f"{user_dir} is not a link to the pool's files directory {files_dir}"
+                )
+    const.CACHEDIR = str(pool_dir)
+    return files_dir
+
+
+def try_lock(lock_file: Path) -> bool:
+    """create a lock file if it does not exist; return True if it was created"""
+    try:
+        fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o664)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w") as outhandle:
+        outhandle.write(f"{gethostname()} {os.getpid()} {datetime.now().isoformat()}\n")
+    return True
+
+
+def remove_stale_lock(
+    lock_file: Path, timeout: float = CACHE_POOL_LOCK_TIMEOUT
+) -> bool:
+    """remove a lock file not refreshed for timeout [s]; return True if it was removed
+
+    the lock is renamed to a name unique to this process first, so that two jobs
+    finding the same stale lock do not remove a lock taken in the meantime
+    """
+    try:
+        age = time.time() - os.stat(lock_file).st_mtime
+    except FileNotFoundError:
+        # released in the meantime
+        return True
+    if age <= timeout:
+        return False
+    stale_file = Path(f"{lock_file}.{gethostname()}.{os.getpid()}.stale")
+    try:
+        os.rename(lock_file, stale_file)
+    except FileNotFoundError:
+        # removed by another job in the meantime
+        return True
+    if time.time() - os.stat(stale_file).st_mtime <= timeout:
+        # another job removed the stale lock and took a new one before the rename
+        try:
+            os.link(stale_file, lock_file)
+        except FileExistsError:
+            pass
+        os.remove(stale_file)
+        return False
+    print(f"removing stale lock {lock_file} ({age / 3600:.1f}h old)")
+    os.remove(stale_file)
+    return True
+
+
+def refresh_lock(lock_file: Path, stop: threading.Event, interval: float) -> None:
+    """touch a held lock file every interval [s] until stop is set"""
+    while not stop.wait(interval):
+        try:
+            os.utime(lock_file)
+        except OSError:
+            pass
+
+
+@contextmanager
+def cache_pool_lock(
+    key: str,
+    pool_dir: str | Path = CACHE_POOL_DIR,
+    timeout: float = CACHE_POOL_LOCK_TIMEOUT,
+    poll_interval: float = LOCK_POLL_INTERVAL,
+    refresh_interval: float = LOCK_REFRESH_INTERVAL,
+):
+    """hold the lock of a cache file of the pool
+
+    waits until a lock held by another job is released (or not refreshed for timeout [s])
+    the lock is refreshed every refresh_interval [s] by a thread while it's held,
+    so that jobs running longer than timeout keep their lock
+    """
+    lock_file = Path(pool_dir).joinpath(POOL_LOCK_DIR_NAME, f"{key}.lock")
+    lock_file.parent.mkdir(parents=True, exist_ok=True)
+    waiting = False
+    while not try_lock(lock_file):
+        if remove_stale_lock(lock_file, timeout=timeout):
+            continue
+        if not waiting:
+            print(f"waiting for the lock {lock_file}...")
+            waiting = True
+        time.sleep(poll_interval)
+    if waiting:
+        print(f"got the lock {lock_file}")
+    stop = threading.Event()
+    refresher = threading.Thread(
+        target=refresh_lock, args=(lock_file, stop, refresh_interval), daemon=True
+    )
+    refresher.start()
+    try:
+        yield lock_file
+    finally:
+        stop.set()
+        refresher.join()
+        try:
+            os.remove(lock_file)
+        except FileNotFoundError:
+            pass
+
+
+def get_last_use(stat: os.stat_result) -> float:
+    """return the time of the last use of a file (access or modification)"""
+    return max(stat.st_atime, stat.st_mtime)
+
+
+def touch_cache_file(cache_file: str | Path) -> None:
+    """mark a cache file of the pool as used (its access time is used for the eviction)"""
+    try:
+        os.utime(cache_file, (time.time(), os.stat(cache_file).st_mtime))
+    except OSError:
+        pass
+
+
+def evict_cache_pool(
+    pool_dir: str | Path = CACHE_POOL_DIR,
+    quota: float = CACHE_POOL_QUOTA,
+    min_age: float = EVICTION_MIN_AGE,
+) -> list[Path]:
+    """remove the least recently used cache files until the pool is below quota [GB]
+
+    files used within the last min_age seconds are kept
+    returns the removed files
+    """
+    files = []
+    for cache_file in get_pool_files_dir(pool_dir).glob("*.pkl"):
+        try:
+            files.append((cache_file, os.stat(cache_file)))
+        except FileNotFoundError:
+            continue
+    pool_size = sum(stat.st_size for _, stat in files)
+    quota_bytes = quota * 1024**3
+    removed = []
+    now = time.time()
+    for cache_file, stat in sorted(files, key=lambda entry: get_last_use(entry[1])):
+        if pool_size <= quota_bytes:
+            break
+        if now - get_last_use(stat) < min_age:
+            break
+        try:
+            os.remove(cache_file)
+        except FileNotFoundError:
+            pass
+        pool_size -= stat.st_size
+        removed.append(cache_file)
+    if removed:
+        print(
+            f"evicted {len(removed)} cache file(s) from {pool_dir}; "
+            f"pool size {pool_size / 1024**3:.1f}GB"
+        )
+    if pool_size > quota_bytes:
+        print(
+            f"cache pool {pool_dir} exceeds its quota of {quota}GB "
+            f"({pool_size / 1024**3:.1f}GB), but all files were used recently"
+        )
+    return removed
+
+
+@contextmanager
+def cache_pool_session(
+    keys: list[str],
+    pool_dir: str | Path = CACHE_POOL_DIR,
+    quota: float = CACHE_POOL_QUOTA,
+    timeout: float = CACHE_POOL_LOCK_TIMEOUT,
+):
+    """run a cache generation in the pool
+
+    the locks of keys (see get_lock_key) are held while the body runs (a cache job
+    waiting for a lock then reads the cache file written by the other job);
+    the pool is evicted down to its quota [GB] afterwards
+    """
+    # the cache files are shared with the team
+    os.umask(0o002)
+    use_cache_pool(pool_dir)
+    with ExitStack() as stack:
+        for key in sorted(set(keys)):
+            stack.enter_context(
+                cache_pool_lock(key, pool_dir=pool_dir, timeout=timeout)
+            )
+        yield
+    evict_cache_pool(pool_dir, quota=quota)
@@ -1,16 +1,26 @@
 #!/usr/bin/env python3
 """
-cache file generator CLI for pyaerocom
+cache file generator for pyaerocom
 
 for usage via the PPI queues
+The cache generation jobs of any number of obs networks are written and submitted
+from within the calling process (see create_cache_jobs); the pyaerocom_cachegen
+command line interface is a thin wrapper around that.
 """
 from __future__ import annotations
 
+import hashlib
+import math
+import os
 import subprocess
+import time
 from datetime import datetime
 
 from pathlib import Path
 
+import jsonpickle
+import simplejson as json
+
 from aeroval_parallelize.const import (
     CONDA_ENV,
     CP_COMMAND,
@@ -27,27 +37,229 @@ from aeroval_parallelize.const import (
     TMP_DIR,
     USER,
     DEFAULT_CACHE_RAM,
+    CACHE_RAM_PER_VAR,
+    MAX_CACHE_RAM,
+    LOCAL_CACHE_NETWORK_RAM,
+    DEFAULT_LOCAL_CACHE_RAM,
+    LOCAL_CACHE_MEM_FRACTION,
     CONDA_ENV,
     # DEFAULT_MODULE_NAME,
     ENV_MODULE_NAME,
     DEFAULT_PYTHON,
+    QSUB_CACHE_PRIORITY,
+    PICKLE_JSON_EXT,
+    PYARO_CACHED_EXT,
+    PYARO_CONFIG_DIR,
+    CACHE_INDEX_DIR,
+    CACHE_POOL_QUOTA,
 )
+from aeroval_parallelize.cache_pool import (
+    get_lock_key,
+    get_pool_files_dir,
+    get_pool_index_dir,
+    get_pool_pyaro_dir,
+    touch_cache_file,
+)
+from aeroval_parallelize.freshness import get_entry_file
+from aeroval_parallelize.job_ids import register_qsub_output
+from aeroval_parallelize.output_store import normalise_config
+from aeroval_parallelize.pyaro_snapshot import get_snapshot_config
 
 # script start time
 START_TIME = datetime.now().strftime("%Y%m%d_%H%M%S")
 
 # starting part of the qsub job name
 QSUB_SCRIPT_START = f"pya_{RND}_caching_"
+# interval [s] in which locally running cache scripts are polled
+LOCAL_POLL_INTERVAL = 1.0
+
+# in process results of the cache check
+# key: (obs_id, var, pyaro config hash, cache pool, pyaro snapshot directory)
+_CACHE_CHECKS = {}
+
+
+def get_pyaro_config_hash(pyaro_config) -> str | None:
+    """return the content hash of a pyaro config (PyaroConfig or dict); None for no config"""
+    if pyaro_config is None:
+        return None
+    json_str = json.dumps(
+        normalise_config(pyaro_config),
+        sort_keys=True,
+        ensure_ascii=False,
+        allow_nan=True,
+    )
+    return hashlib.sha256(json_str.encode("utf-8")).hexdigest()
+
+
+def store_pyaro_config(pyaro_config, config_dir: str | Path = PYARO_CONFIG_DIR) -> Path:
+    """store a pyaro config under its content hash and return the file
+
+    identical configs are written just once and shared by all runs
+    """
+    conffile = Path(config_dir).joinpath(
+        f"{get_pyaro_config_hash(pyaro_config)}{PICKLE_JSON_EXT}"
+    )
+    if not conffile.exists():
+        conffile.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first; several runs might store the same config
+        tmp_file = conffile.with_name(f"{conffile.name}.{os.getpid()}")
+        print(f"writing file {conffile}")
+        with open(tmp_file, "w", encoding="utf-8") as j:
+            j.write(jsonpickle.encode(pyaro_config))
+        os.replace(tmp_file, conffile)
+    return conffile
+
+
+def get_pyaro_cached_file(
+    pyaro_config, var: str, config_dir: str | Path = PYARO_CONFIG_DIR
+) -> Path:
+    """return the file marking the cache of a pyaro config and variable as created"""
+    return Path(config_dir).joinpath(
+        f"{get_pyaro_config_hash(pyaro_config)}.{var}{PYARO_CACHED_EXT}"
+    )
+
+
+def is_cache_valid(
+    obs_id: str,
+    var: str,
+    pyaro_config=None,
+    cache_pool: str | Path = None,
+    pyaro_snapshot: str | Path = None,
+) -> bool:
+    """check if pyaerocom has a valid cache file for an obs network and variable
+
+    only the header of the cache file is read and compared with the current state
+    of the obs data base by pyaerocom's cache handler (the same check pyaerocom does
+    before using a cache file). Any error counts as cache miss.
+    pyaro configs whose content (hash) has never been cached are a miss right away.
+    cache_pool: check the cache files of this cache pool (see cache_pool.py);
+    valid cache files are marked as used there
+    pyaro_snapshot: pyaro configs read their snapshot in this directory (if written;
+    see pyaro_snapshot.py)
+    """
+    key = (
+        obs_id,
+        var,
+        get_pyaro_config_hash(pyaro_config),
+        cache_pool,
+        pyaro_snapshot,
+    )
+    if key in _CACHE_CHECKS:
+        return _CACHE_CHECKS[key]
+    pyaro_config_dir = PYARO_CONFIG_DIR
+    cache_dir = None
+    if cache_pool is not None:
+        pyaro_config_dir = get_pool_pyaro_dir(cache_pool)
+        cache_dir = str(get_pool_files_dir(cache_pool))
+    if (
+        pyaro_config is not None
+        and not get_pyaro_cached_file(
+            pyaro_config, var, config_dir=pyaro_config_dir
+        ).exists()
+    ):
+        _CACHE_CHECKS[key] = False
+        return False
+
+    # to avoid that lustre access is checked if the module is just imported
+    from pyaerocom import const
+    from pyaerocom.io import ReadUngridded
+    from pyaerocom.io.cachehandler_ungridded import CacheHandlerUngridded
+
+    valid = False
+    if const.CACHING:
+        try:
+            if pyaro_config is not None:
+                if pyaro_snapshot is not None:
+                    pyaro_config = get_snapshot_config(pyaro_config, pyaro_snapshot)
+                reader = ReadUngridded(configs=[pyaro_config]).get_lowlevel_reader(
+                    pyaro_config.name
+                )
+            else:
+                reader = ReadUngridded().get_lowlevel_reader(obs_id)
+            cache_handler = CacheHandlerUngridded(reader)
+            cache_file = cache_handler.file_path(var, cache_dir=cache_dir)
+            if os.path.isfile(cache_file):
+                with open(cache_file, "rb") as in_handle:
+                    valid = bool(cache_handler._check_pkl_head_vs_database(in_handle))
+            if valid and cache_pool is not None:
+                touch_cache_file(cache_file)
+        except Exception as e:
+            print(f"cache check failed for {obs_id}, {var}: {e}")
+            valid = False
+    if valid:
+        print(f"valid cache file found for {obs_id}, {var}")
+    _CACHE_CHECKS[key] = valid
+    return valid
+
+
+def get_cache_misses(
+    conf_info: dict, cache_pool: str | Path = None, pyaro_snapshot: str | Path = None
+) -> dict:
+    """reduce the output of tools.get_config_info to the variables without a valid cache file
+
+    obs networks with all variables cached are removed
+    cache_pool, pyaro_snapshot: see is_cache_valid
+    """
+    misses = {}
+    for obs_id, obs_info in conf_info.items():
+        pyaro_config = obs_info.get("pyaro_config")
+        obs_vars = [
+            var
+            for var in obs_info["obs_vars"]
+            if not is_cache_valid(
+                obs_id,
+                var,
+                pyaro_config=pyaro_config,
+                cache_pool=cache_pool,
+                pyaro_snapshot=pyaro_snapshot,
+            )
+        ]
+        if obs_vars:
+            misses[obs_id] = {**obs_info, "obs_vars": obs_vars}
+    return misses
+
+
+def get_script_main_str(cache_pool: dict = None) -> str:
+    """return the main block of a cache generation script
+
+    cache_pool is None or a dict with the keys
+    dir: directory of the cache pool
+    keys: lock keys of the cache files created by the script (see cache_pool.get_lock_key)
+    quota: disk quota [GB] of the cache pool
+    """
+    if cache_pool is None:
+        return """if __name__ == "__main__":
+    main()
+"""
+    return f"""if __name__ == "__main__":
+    from aeroval_parallelize.cache_pool import cache_pool_session
+
+    with cache_pool_session(
+        {cache_pool['keys']!r}, pool_dir={str(cache_pool['dir'])!r}, quota={cache_pool['quota']!r}
+    ):
+        main()
+"""
 
 
 def write_script_pyaro(
     filename: str | Path,
     conffile: str | Path = None,
-    var: str = "od550aer",
+    var: str | list[str] = "od550aer",
     obsnetwork: str = "AeronetSunV3Lev2.daily",
     use_module: bool = False,
+    cached_files: list = None,
+    cache_pool: dict = None,
+    snapshot_dir: str | Path = None,
 ):
-    """1st version for run with pyaro"""
+    """1st version for run with pyaro
+
+    var can also be a list of variables, which are read at once
+    the files in cached_files are created after a successful read
+    (see get_pyaro_cached_file)
+    cache_pool: run in a cache pool (see get_script_main_str)
+    snapshot_dir: read the snapshot of the pyaro source in this directory; it's written
+    first if needed (see pyaro_snapshot.py)
+    """
 
     import os
     import stat
@@ -57,21 +269,29 @@ def write_script_pyaro(
     else:
         shebang = "#!/usr/bin/env python"
 
+    snapshot_str = ""
+    if snapshot_dir is not None:
+        snapshot_str = f"""
+    from aeroval_parallelize.pyaro_snapshot import prepare_snapshot_config
+
+    obsconf = prepare_snapshot_config(obsconf, {str(snapshot_dir)!r})"""
+
     script_proto = f"""{shebang}
     
+from pathlib import Path
 from pyaerocom.io import ReadUngridded
 import jsonpickle
 
 def main():
     with open("{conffile}", "r") as f:
         json_str = f.read()
-        obsconf = jsonpickle.decode(json_str)
+        obsconf = jsonpickle.decode(json_str){snapshot_str}
     reader = ReadUngridded("{obsnetwork}")
-    data = reader.read(vars_to_retrieve="{var}", configs=obsconf)
+    data = reader.read(vars_to_retrieve={var!r}, configs=obsconf)
+    for cached_file in {[str(_file) for _file in cached_files or []]!r}:
+        Path(cached_file).touch()
 
-if __name__ == "__main__":
-    main()
-"""
+{get_script_main_str(cache_pool)}"""
     with open(filename, "w") as f:
         f.write(script_proto)
 
@@ -82,11 +302,19 @@ if __name__ == "__main__":
 
 def write_script(
     filename: str | Path,
-    var: str = "od550aer",
+    var: str | list[str] = "od550aer",
     obsnetwork: str = "AeronetSunV3Lev2.daily",
     use_module: bool = False,
+    index_entries: dict = None,
+    cache_pool: dict = None,
 ):
-    """version for run internal obs networks"""
+    """version for run internal obs networks
+
+    var can also be a list of variables, which are read at once
+    index_entries (file as key, content as value) are written to the freshness index
+    after a successful read (see freshness.py)
+    cache_pool: run in a cache pool (see get_script_main_str)
+    """
     import os
     import stat
 
@@ -97,15 +325,19 @@ def write_script(
 
     script_proto = f"""{shebang}
     
+import json
+from pathlib import Path
 from pyaerocom.io import ReadUngridded
 
 def main():
     reader = ReadUngridded("{obsnetwork}")
-    data = reader.read(vars_to_retrieve="{var}")
+    data = reader.read(vars_to_retrieve={var!r})
+    for index_file, entry in {dict((str(key), value) for key, value in (index_entries or {}).items())!r}.items():
+        Path(index_file).parent.mkdir(parents=True, exist_ok=True)
+        with open(index_file, "w") as f:
+            json.dump(entry, f)
 
-if __name__ == "__main__":
-    main()
-"""
+{get_script_main_str(cache_pool)}"""
     with open(filename, "w") as f:
         f.write(script_proto)
 
@@ -125,6 +357,7 @@ def get_runfile_str_arr_module(
     date=START_TIME,
     module=ENV_MODULE_NAME,
     ram=DEFAULT_CACHE_RAM,
+    priority=QSUB_CACHE_PRIORITY,
 ) -> str:
     """create list of strings with runfile for gridengine using the aerotools modules @ PPI"""
     # create runfile
@@ -144,6 +377,7 @@ def get_runfile_str_arr_module(
 #$ -S /bin/bash
 #$ -N {Path(file).stem}
 #$ -q {queue_name}
+#$ -p {priority}
 #$ -pe shmem-1 1
 #$ -wd {wd}
 #$ -l h_rt=4:00:00
@@ -201,7 +435,8 @@ def run_queue(
             script_name=qsub_run_file_name,
             queue_name=qsub_queue,
             module=options["env_mod"],
-            ram=options["qsub_ram"],
+            ram=options.get("file_ram", {}).get(_file, options["qsub_ram"]),
+            priority=options.get("qsub_priority", QSUB_CACHE_PRIORITY),
         )
 
         with open(qsub_run_file_name, "w") as f:
@@ -228,7 +463,382 @@ def run_queue(
             else:
                 print("success...")
                 print(f"{sh_result.stdout}")
+                register_qsub_output(sh_result.stdout)
 
         else:
             print(f"qsub files created.")
             print(f"you can start the job with the command: qsub {qsub_run_file_name}.")
+
+
+def get_cache_ram(
+    var_no: int, ram=DEFAULT_CACHE_RAM, ram_per_var=CACHE_RAM_PER_VAR
+) -> int:
+    """return the RAM [GB] of a cache job reading var_no variables at once
+
+    ram is the RAM of a single variable job; the result is capped at MAX_CACHE_RAM
+    (unless ram is larger already)
+    """
+    total_ram = float(ram) + ram_per_var * max(var_no - 1, 0)
+    return math.ceil(min(total_ram, max(MAX_CACHE_RAM, float(ram))))
+
+
+def get_cache_script_name(obs_network: str, var: str | list[str], rnd=RND) -> str:
+    """return the file name of a cache generation script (its stem is the job name)"""
+    var_str = "-".join(var) if isinstance(var, list) else var
+    return f"pya_{rnd}_caching_{obs_network}_{var_str}.py"
+
+
+def get_request_var_list(request: dict, multi_var: bool = False) -> list:
+    """return the variables of a cache request per script
+
+    that's the list of variables or (multi_var) a list holding the list of variables
+    """
+    if multi_var and len(request["obs_vars"]) > 1:
+        return [list(request["obs_vars"])]
+    return list(request["obs_vars"])
+
+
+def write_cache_scripts(
+    requests: dict,
+    tempdir: str | Path,
+    rnd=RND,
+    use_module: bool = True,
+    multi_var: bool = False,
+    pyaro_config_dir: str | Path = PYARO_CONFIG_DIR,
+    source_digests: dict = None,
+    index_dir: str | Path = CACHE_INDEX_DIR,
+    cache_pool: str | Path = None,
+    pool_quota: float = CACHE_POOL_QUOTA,
+    pyaro_snapshot: str | Path = None,
+) -> list[Path]:
+    """write the cache generation scripts of all requested obs networks and variables
+
+    requests is a dict with the obs network as key and a dict with the keys
+    obs_vars: variables to cache
+    obs_id: obs network to read (optional; defaults to the key)
+    pyaro_config: pyaro config (optional)
+    pyaro_config_file: existing picklejson file of the pyaro config (optional)
+    as value (the output of tools.get_config_info works)
+    the key is used for the script and job names
+    pyaro configs are stored under their content hash in pyaro_config_dir
+    (see store_pyaro_config)
+    source_digests is a dict with the obs network as key and the digest of its source
+    files as value; it's written to the freshness index in index_dir once a cache file
+    is created (see freshness.py)
+    returns the list of scripts (one per obs network and variable)
+
+    cache_pool: create the cache files in this cache pool with a disk quota of
+    pool_quota [GB] (see cache_pool.py); the pool's pyaro config and index
+    directories are used in that case
+    pyaro_snapshot: pyaro obs networks are read from their snapshot in this directory
+    (see pyaro_snapshot.py)
+    if multi_var is set, one script per obs network reads all its variables at once
+    (the raw data is read just once; pyaerocom writes a cache file per variable)
+    """
+    if cache_pool is not None:
+        pyaro_config_dir = get_pool_pyaro_dir(cache_pool)
+        index_dir = get_pool_index_dir(cache_pool)
+    scripts = []
+    for obs_network, request in requests.items():
+        conffile = request.get("pyaro_config_file")
+        pyaro_config = request.get("pyaro_config")
+        if conffile is None and pyaro_config is not None:
+            conffile = store_pyaro_config(pyaro_config, config_dir=pyaro_config_dir)
+
+        obs_id = request.get("obs_id", obs_network)
+        request_key = get_cache_request_key(obs_id, pyaro_config)
+        for var in get_request_var_list(request, multi_var=multi_var):
+            outfile = Path(tempdir).joinpath(
+                get_cache_script_name(obs_network, var, rnd=rnd)
+            )
+            script_pool = None
+            if cache_pool is not None:
+                script_pool = {
+                    "dir": cache_pool,
+                    "keys": [
+                        get_lock_key(request_key, _var)
+                        for _var in (var if isinstance(var, list) else [var])
+                    ],
+                    "quota": pool_quota,
+                }
+            if conffile is not None:
+                cached_files = []
+                if pyaro_config is not None:
+                    cached_files = [
+                        get_pyaro_cached_file(
+                            pyaro_config, _var, config_dir=pyaro_config_dir
+                        )
+                        for _var in (var if isinstance(var, list) else [var])
+                    ]
+                write_script_pyaro(
+                    outfile,
+                    conffile=conffile,
+                    var=var,
+                    obsnetwork=obs_id,
+                    use_module=use_module,
+                    cached_files=cached_files,
+                    cache_pool=script_pool,
+                    snapshot_dir=pyaro_snapshot,
+                )
+                print(f"Wrote pyaro {outfile}")
+            else:
+                index_entries = {}
+                if source_digests and obs_network in source_digests:
+                    index_entries = {
+                        get_entry_file(obs_id, _var, index_dir=index_dir): {
+                            "digest": source_digests[obs_network],
+                            "time": START_TIME,
+                        }
+                        for _var in (var if isinstance(var, list) else [var])
+                    }
+                write_script(
+                    outfile,
+                    var=var,
+                    obsnetwork=obs_id,
+                    use_module=use_module,
+                    index_entries=index_entries,
+                    cache_pool=script_pool,
+                )
+                print(f"Wrote {outfile}")
+            scripts.append(outfile)
+    return scripts
+
+
+def get_local_cache_ram(obs_network: str) -> float:
+    """return the estimated RAM [GB] of a local cache process of an obs network (single variable)"""
+    for network, ram in LOCAL_CACHE_NETWORK_RAM.items():
+        if obs_network.lower().startswith(network.lower()):
+            return ram
+    return DEFAULT_LOCAL_CACHE_RAM
+
+
+def get_cache_script_rams(
+    requests: dict, tempdir: str | Path, rnd=RND, multi_var: bool = False, ram=None
+) -> dict:
+    """return the RAM [GB] of each script written by write_cache_scripts
+
+    ram: RAM of a single variable script; estimated per obs network if None
+    (see get_local_cache_ram, every additional variable adds half of that)
+    """
+    script_rams = {}
+    for obs_network, request in requests.items():
+        if ram is None:
+            var_ram = get_local_cache_ram(request.get("obs_id", obs_network))
+            ram_per_var = var_ram / 2
+        else:
+            var_ram = ram
+            ram_per_var = CACHE_RAM_PER_VAR
+        for var in get_request_var_list(request, multi_var=multi_var):
+            _script = Path(tempdir).joinpath(
+                get_cache_script_name(obs_network, var, rnd=rnd)
+            )
+            var_no = len(var) if isinstance(var, list) else 1
+            script_rams[_script] = get_cache_ram(
+                var_no, ram=var_ram, ram_per_var=ram_per_var
+            )
+    return script_rams
+
+
+def get_local_mem_budget() -> float:
+    """return the default memory budget [GB] for local cache generation"""
+    try:
+        mem = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024**3
+    except (ValueError, OSError):
+        return None
+    return mem * LOCAL_CACHE_MEM_FRACTION
+
+
+def print_local_run_summary(results: dict, wall_time: float) -> None:
+    """print the summary of run_scripts_locally"""
+    failed = [_script for _script in results if results[_script]["returncode"] != 0]
+    print(
+        f"cache generation summary: {len(results) - len(failed)} succeeded, "
+        f"{len(failed)} failed, wall time {wall_time:.1f}s"
+    )
+    for _script, result in results.items():
+        status = "ok" if result["returncode"] == 0 else "FAILED"
+        print(f"  {status:6s} {result['runtime']:8.1f}s  {Path(_script).name}")
+
+
+def run_scripts_locally(
+    scripts: list[Path],
+    jobs: int = 1,
+    mem_budget: float = None,
+    script_rams: dict = {},
+) -> dict:
+    """run cache generation scripts on the local machine
+
+    up to jobs scripts run at the same time, as long as the sum of their RAM estimates
+    (script_rams, see get_cache_script_rams) stays below mem_budget [GB]. A script
+    exceeding the budget on its own is run when nothing else runs.
+    returns a dict with the script as key and a dict with the keys returncode and
+    runtime [s] as value
+    """
+    start_time = time.time()
+    pending = list(scripts)
+    # key: script, value: dict with the keys proc, ram and start
+    running = {}
+    results = {}
+    while pending or running:
+        while pending and len(running) < max(jobs, 1):
+            ram_used = sum(job["ram"] for job in running.values())
+            next_script = None
+            for _script in pending:
+                ram = script_rams.get(_script, 0)
+                if mem_budget is None or not running or ram_used + ram <= mem_budget:
+                    next_script = _script
+                    break
+            if next_script is None:
+                break
+            pending.remove(next_script)
+            cmd_arr = [next_script]
+            print(f"running command {' '.join(map(str, cmd_arr))}...")
+            running[next_script] = {
+                "proc": subprocess.Popen(cmd_arr),
+                "ram": script_rams.get(next_script, 0),
+                "start": time.time(),
+            }
+
+        for _script in list(running):
+            returncode = running[_script]["proc"].poll()
+            if returncode is None:
+                continue
+            results[_script] = {
+                "returncode": returncode,
+                "runtime": time.time() - running[_script]["start"],
+            }
+            if returncode == 0:
+                print(f"success... {_script}")
+            else:
+                print(f"failed with return code {returncode}: {_script}")
+            del running[_script]
+        if running:
+            time.sleep(LOCAL_POLL_INTERVAL)
+
+    print_local_run_summary(results, time.time() - start_time)
+    return results
+
+
+def create_cache_jobs(
+    requests: dict,
+    tempdir: str | Path,
+    rnd=RND,
+    qsub_queue: str = QSUB_QUEUE_NAME,
+    submit_flag: bool = False,
+    options: dict = {},
+    multi_var: bool = False,
+    source_digests: dict = None,
+    cache_pool: str | Path = None,
+    pool_quota: float = CACHE_POOL_QUOTA,
+    pyaro_snapshot: str | Path = None,
+) -> list[Path]:
+    """write and submit the cache generation jobs of all requested obs networks and variables
+
+    requests, multi_var, source_digests, cache_pool, pool_quota, pyaro_snapshot:
+    see write_cache_scripts
+    options: queue options of run_queue (env_mod, qsub_ram and optionally qsub_priority)
+    the RAM of jobs reading several variables is scaled by the number of variables
+    returns the list of scripts
+    """
+    scripts = write_cache_scripts(
+        requests,
+        tempdir,
+        rnd=rnd,
+        use_module=True,
+        multi_var=multi_var,
+        source_digests=source_digests,
+        cache_pool=cache_pool,
+        pool_quota=pool_quota,
+        pyaro_snapshot=pyaro_snapshot,
+    )
+    file_ram = get_cache_script_rams(
+        requests, tempdir, rnd=rnd, multi_var=multi_var, ram=options["qsub_ram"]
+    )
+    run_queue(
+        scripts,
+        qsub_queue=qsub_queue,
+        submit_flag=submit_flag,
+        options={**options, "file_ram": file_ram},
+    )
+    return scripts
+
+
+def get_cache_request_key(obs_id: str, pyaro_config=None) -> str:
+    """return the key of a cache request (used for the job name)
+
+    pyaro configs of the same name, but different content get different keys
+    """
+    pyaro_hash = get_pyaro_config_hash(pyaro_config)
+    if pyaro_hash is None:
+        return obs_id
+    return f"{obs_id}-{pyaro_hash[:8]}"
+
+
+def plan_cache_jobs(
+    conf_infos: dict,
+    rnd=RND,
+    multi_var: bool = False,
+    planned_jobs: dict = None,
+) -> tuple[dict, dict]:
+    """plan the cache generation jobs of several analysis jobs
+
+    conf_infos is a dict with the analysis job's runfile as key and the output of
+    tools.get_config_info as value
+    every (obs_id, var, pyaro config hash) key gets exactly one cache job
+    planned_jobs is a dict with the key as key and the name of the cache job as value
+    holding the jobs submitted before; these are not planned again. It is updated.
+    returns
+    requests: the new cache jobs (see write_cache_scripts)
+    job_holds: dict with the runfile as key and the comma separated names of the cache
+        jobs it depends on as value
+    """
+    if planned_jobs is None:
+        planned_jobs = {}
+    requests = {}
+    # keys needed by each runfile
+    runfile_keys = {}
+    for runfile, conf_info in conf_infos.items():
+        keys = runfile_keys.setdefault(runfile, [])
+        for obs_id, obs_info in conf_info.items():
+            pyaro_config = obs_info.get("pyaro_config")
+            request_key = get_cache_request_key(obs_id, pyaro_config)
+            obs_vars = obs_info["obs_vars"]
+            if isinstance(obs_vars, str):
+                obs_vars = [obs_vars]
+            for var in obs_vars:
+                keys.append((request_key, var))
+                if (request_key, var) in planned_jobs:
+                    continue
+                request = requests.setdefault(
+                    request_key, {"obs_id": obs_id, "obs_vars": []}
+                )
+                if pyaro_config is not None:
+                    request["pyaro_config"] = pyaro_config
+                if var not in request["obs_vars"]:
+                    request["obs_vars"].append(var)
+
+    for request_key, request in requests.items():
+        for var in get_request_var_list(request, multi_var=multi_var):
+            job_name = Path(get_cache_script_name(request_key, var, rnd=rnd)).stem
+            for _var in var if isinstance(var, list) else [var]:
+                planned_jobs[(request_key, _var)] = job_name
+
+    job_holds = {
+        runfile: ",".join(dict.fromkeys(planned_jobs[key] for key in keys))
+        for runfile, keys in runfile_keys.items()
+    }
+    return requests, job_holds
+
+
+def get_hold_jid(hold_pattern: str, cache_jobs: str) -> str:
+    """replace the cache job name patterns of a hold pattern by the exact cache jobs
+
+    other patterns (e.g. the shard jobs of a merge job) are kept
+    """
+    hold_patterns = [
+        pattern
+        for pattern in (hold_pattern or "").split(",")
+        if pattern and not pattern.startswith(QSUB_SCRIPT_START)
+    ]
+    hold_patterns += [job for job in (cache_jobs or "").split(",") if job]
+    return ",".join(hold_patterns)
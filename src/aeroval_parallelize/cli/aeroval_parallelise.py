@@ -9,15 +9,12 @@ command line interface for parallelisation for aeroval processing
 """
 from __future__ import annotations
 
-import jsonpickle
 import logging
 
 import argparse
-import os
-import subprocess
 import sys
-from copy import deepcopy
 from pathlib import Path
+from tempfile import mkdtemp
 
 from aeroval_parallelize.const import (
     CONDA_ENV,
@@ -38,7 +35,29 @@ from aeroval_parallelize.const import (
     DEFAULT_CACHE_RAM,
     DEFAULT_ANA_RAM,
     DEFAULT_ASSEMBLY_RAM,
-    PICKLE_JSON_EXT,
+    QSUB_ANA_PRIORITY,
+    QSUB_ASSEMBLY_PRIORITY,
+    QSUB_CACHE_PRIORITY,
+    DEFAULT_JOB_WALLTIME,
+    OUTPUT_STORE_DIR,
+    CACHE_POOL_DIR,
+    CACHE_POOL_QUOTA,
+    PYARO_SNAPSHOT_DIR,
+    MODEL_PREREAD_DIR,
+)
+from aeroval_parallelize.cache_tools import (
+    create_cache_jobs,
+    get_cache_misses,
+    get_hold_jid,
+    plan_cache_jobs,
+)
+from aeroval_parallelize.model_preread import create_preread_jobs
+from aeroval_parallelize.preflight import PREFLIGHT_MODES
+from aeroval_parallelize.sharding import parse_shard_option
+from aeroval_parallelize.validation import (
+    ConfigValidationError,
+    print_validation_summary,
+    validate_configs,
 )
 from aeroval_parallelize.tools import (  # CONDA_ENV,; JSON_RUNSCRIPT,; QSUB_HOST,; QSUB_QUEUE_NAME,; QSUB_USER,; TMP_DIR,; RND,; RUN_UUID,
     AEROVAL_HEATMAP_FILES_MASK,
@@ -48,19 +67,218 @@ from aeroval_parallelize.tools import (  # CONDA_ENV,; JSON_RUNSCRIPT,; QSUB_HOS
     adjust_hm_ts_file,
     adjust_menujson,
     combine_output,
+    get_assembly_hold_jid,
     get_assembly_job_str,
     get_config_info,
+    add_assembly_dir,
+    iter_job_specs,
     prep_files,
     read_config_var,
     run_queue,
+    run_queue_bundled,
     run_queue_simple,
     ENV_MODULE_NAME,
 )
 
-CACHE_CREATION_CMD = ["pyaerocom_cachegen"]
 RUN_PYARO_CACHING = True
 
 
+def submit_cache_jobs(
+    conf_infos: dict, planned_jobs: dict, tempdir: str, rnd, options: dict
+) -> dict:
+    """plan and submit the cache generation jobs of aeroval jobs
+
+    conf_infos is a dict with the runfile as key and the output of get_config_info as value
+    planned_jobs holds the cache jobs submitted so far and is updated (see plan_cache_jobs)
+    if options["cache_check"] is set, variables with a valid cache file are not submitted
+    returns a dict with the runfile as key and the names of its cache jobs as value
+    """
+    if options.get("cache_check", False):
+        conf_infos = {
+            runfile: get_cache_misses(
+                conf_info,
+                cache_pool=options.get("cache_pool"),
+                pyaro_snapshot=options.get("pyaro_snapshot"),
+            )
+            for runfile, conf_info in conf_infos.items()
+        }
+    if not RUN_PYARO_CACHING:
+        for conf_info in conf_infos.values():
+            for obs_info in conf_info.values():
+                obs_info.pop("pyaro_config", None)
+
+    requests, job_holds = plan_cache_jobs(
+        conf_infos,
+        rnd=rnd,
+        multi_var=options.get("cache_multi_var", False),
+        planned_jobs=planned_jobs,
+    )
+    if requests:
+        # the cache jobs use the same qsub directory as the aeroval parallelization
+        create_cache_jobs(
+            requests,
+            tempdir,
+            rnd=rnd,
+            qsub_queue=options["qsub_cache_queue_name"],
+            submit_flag=(not options["dry_qsub"]),
+            options={
+                "env_mod": options["env_mod"],
+                "qsub_ram": options["cacheram"],
+                "qsub_priority": options["cache_priority"],
+            },
+            multi_var=options.get("cache_multi_var", False),
+            cache_pool=options.get("cache_pool"),
+            pool_quota=options["pool_quota"],
+            pyaro_snapshot=options.get("pyaro_snapshot"),
+        )
+    return job_holds
+
+
+def submit_preread_jobs(
+    requests: dict, submitted: set, tempdir: str, options: dict
+) -> None:
+    """submit the model pre-read jobs that have not been submitted yet
+
+    requests is a dict with the job name as key and the job's config as value
+    (see model_preread.plan_preread); submitted holds the names of the pre-read jobs
+    submitted so far and is updated
+    """
+    requests = {
+        job_name: preread_cfg
+        for job_name, preread_cfg in requests.items()
+        if job_name not in submitted
+    }
+    if not requests:
+        return
+    create_preread_jobs(
+        requests,
+        tempdir,
+        qsub_queue=options["qsub_queue_name"],
+        submit_flag=(not options["dry_qsub"]),
+        options={
+            "env_mod": options["env_mod"],
+            "qsub_ram": options["anaram"],
+            "qsub_priority": options["cache_priority"],
+        },
+    )
+    submitted.update(requests)
+
+
+def submit_assembly_jobs(assemblies: dict, tempdir: str, rnd, options: dict):
+    """submit the data assembly and json file reordering jobs; one per experiment
+
+    assemblies is a dict with the experiment directory as key and a dict with the
+    config file and the directories to assemble as value (see add_assembly_dir)
+    each assembly waits for the ids of the analysis jobs of its experiment
+    """
+    for idx, out_dir in enumerate(assemblies):
+        assembly_script_str = get_assembly_job_str(
+            out_dir=out_dir,
+            in_dirs=assemblies[out_dir]["in_dirs"],
+            job_id=rnd,
+            wd=Path(out_dir).parent.parent,
+            ram=options["assemblyram"],
+            queue_name=options["qsub_queue_name"],
+            module=options["env_mod"],
+            merge=options["merge"],
+            fan_out=options["campaign"],
+            priority=options["assembly_priority"],
+            config_file=Path(assemblies[out_dir]["config_file"]).resolve(),
+            hold_pattern=get_assembly_hold_jid(assemblies[out_dir], rnd),
+        )
+        qsub_start_file_name = Path.joinpath(
+            Path(tempdir), f"pya_{rnd}_data_merging.{idx:04d}.run"
+        )
+
+        # Now add the reordering job. Just add that to the pure assembly job
+        # since it's a serial operation anyway
+        menu_json_file = Path.joinpath(Path(out_dir), "menu.json")
+        aeroval_config_file = Path(assemblies[out_dir]["config_file"]).resolve()
+        reorder_cmd_arr = [
+            "aeroval_parallelize",
+            "--adjustall",
+            f"'{aeroval_config_file}'",
+            f"'{menu_json_file}'",
+        ]
+        reorder_cmd_str = " ".join(map(str, reorder_cmd_arr))
+
+        assembly_script_str += f"""echo "starting {reorder_cmd_str} ..." >> ${{logfile}}
+{reorder_cmd_str} >> ${{logfile}} 2>&1"""
+
+        with open(qsub_start_file_name, "w") as f:
+            f.write(assembly_script_str)
+        run_queue_simple(
+            [qsub_start_file_name],
+            submit_flag=(not options["dry_qsub"]),
+            qsub_dir=tempdir,
+            options=options,
+        )
+
+
+def run_streaming(options: dict, rnd):
+    """plan and submit the jobs in a pipeline
+
+    each job spec of iter_job_specs is submitted (cache generation jobs first) as soon
+    as its config has been written. Only the directories to assemble are kept in memory.
+    The configs are validated job by job; a failed validation stops the submission of
+    the remaining jobs.
+    """
+    tempdir = mkdtemp(dir=options["qsub_dir"])
+    # cache jobs submitted so far (see plan_cache_jobs)
+    planned_jobs = {}
+    # model pre-read jobs submitted so far
+    submitted_prereads = set()
+    assemblies = {}
+    for spec in iter_job_specs(options, tempdir):
+        add_assembly_dir(assemblies, spec)
+        if spec["runfile"] is None:
+            continue
+
+        if options["validate"]:
+            # validate job by job since nothing is kept
+            errors = validate_configs({spec["name"]: spec["cfg"]}, processes=1)
+            if errors:
+                print_validation_summary(errors)
+                if not options["force"]:
+                    print(
+                        "Error: config validation failed. Use --force to submit anyway."
+                    )
+                    sys.exit(1)
+
+        # just the hold pattern of the current job
+        cache_holds = {}
+        if not options["nocache"]:
+            conf_info = get_config_info(
+                spec["runfile"], options["cfgvar"], cfg=spec["cfg"]
+            )
+            cache_holds = submit_cache_jobs(
+                {spec["runfile"]: conf_info}, planned_jobs, tempdir, rnd, options
+            )
+        options["hold_jid"] = {
+            spec["runfile"]: get_hold_jid(
+                spec["hold_pattern"], cache_holds.get(spec["runfile"])
+            )
+        }
+
+        if options["cachegen_only"]:
+            continue
+        submit_preread_jobs(
+            spec.get("prereads", {}), submitted_prereads, tempdir, options
+        )
+        run_queue(
+            [spec["runfile"]],
+            submit_flag=(not options["dry_qsub"]),
+            qsub_queue=options["qsub_queue_name"],
+            qsub_dir=tempdir,
+            options=options,
+        )
+
+    if options["cachegen_only"]:
+        print("cache file generation only was requested. Exiting.")
+        return
+    submit_assembly_jobs(assemblies, tempdir, rnd, options)
+
+
 def main():
     """main program"""
 
@@ -153,6 +371,11 @@ def main():
         "--io_aux_file",
         help="set io_aux_file in the configuration file manually",
     )
+    parser.add_argument(
+        "--no-config-cache",
+        help="always import the aeroval config file(s) instead of using the config cache",
+        action="store_true",
+    )
     parser.add_argument(
         "--extract_obsconfigfile",
         help="extract obsconfig files and save to tmp path (mainly for testing)",
@@ -218,6 +441,128 @@ def main():
         default=DEFAULT_ASSEMBLY_RAM,
     )
 
+    group_queue_opts.add_argument(
+        "--ana-priority",
+        help=f"queue priority (-p, -1023 to 0) of the analysis jobs (defaults to {QSUB_ANA_PRIORITY}).",
+        type=int,
+        default=QSUB_ANA_PRIORITY,
+    )
+    group_queue_opts.add_argument(
+        "--cache-priority",
+        help=f"queue priority (-p, -1023 to 0) of the cache generation and model pre-read jobs (defaults to {QSUB_CACHE_PRIORITY}).",
+        type=int,
+        default=QSUB_CACHE_PRIORITY,
+    )
+    group_queue_opts.add_argument(
+        "--assembly-priority",
+        help=f"queue priority (-p, -1023 to 0) of the assembly jobs (defaults to {QSUB_ASSEMBLY_PRIORITY}).",
+        type=int,
+        default=QSUB_ASSEMBLY_PRIORITY,
+    )
+
+    group_queue_opts.add_argument(
+        "--pack-jobs",
+        help="pack small model / obs combinations into one queue job and split large ones",
+        action="store_true",
+    )
+    group_queue_opts.add_argument(
+        "--job-walltime",
+        help=f"target wall time [h] of a packed analysis job (defaults to {DEFAULT_JOB_WALLTIME}h).",
+        default=DEFAULT_JOB_WALLTIME,
+    )
+
+    group_queue_opts.add_argument(
+        "--plan",
+        help="write all job configs to a single plan file and submit all jobs with a single generic runfile",
+        action="store_true",
+    )
+    group_queue_opts.add_argument(
+        "--no-validation",
+        help="do not validate the job configs (EvalSetup) before submission",
+        action="store_true",
+    )
+    group_queue_opts.add_argument(
+        "--force",
+        help="submit the jobs even if the validation of the job configs failed",
+        action="store_true",
+    )
+    group_queue_opts.add_argument(
+        "--no-cache-check",
+        help="submit cache generation jobs also for obs networks and variables with valid cache files",
+        action="store_true",
+    )
+    group_queue_opts.add_argument(
+        "--cache-multi-var",
+        help="one cache generation job per obs network reading all its variables at once (RAM is scaled by the number of variables)",
+        action="store_true",
+    )
+    group_queue_opts.add_argument(
+        "--cache-pool",
+        help=f"create and read the pyaerocom cache files in a cache pool shared with other runs; defaults to {CACHE_POOL_DIR} if given without directory",
+        nargs="?",
+        const=CACHE_POOL_DIR,
+    )
+    group_queue_opts.add_argument(
+        "--pool-quota",
+        help=f"disk quota [GB] of the cache pool; least recently used cache files are evicted above that; defaults to {CACHE_POOL_QUOTA}",
+        type=float,
+        default=CACHE_POOL_QUOTA,
+    )
+    group_queue_opts.add_argument(
+        "--pyaro-snapshot",
+        help=f"convert the sources of pyaro obs networks once to a columnar snapshot read by the cache and analysis jobs; defaults to {PYARO_SNAPSHOT_DIR} if given without directory",
+        nargs="?",
+        const=PYARO_SNAPSHOT_DIR,
+    )
+    group_queue_opts.add_argument(
+        "--model-preread",
+        help=f"read the model data needed by the analysis jobs once per model in a pre-read job and let the analysis jobs read the written subsets; defaults to {MODEL_PREREAD_DIR} if given without directory",
+        nargs="?",
+        const=MODEL_PREREAD_DIR,
+    )
+    group_queue_opts.add_argument(
+        "--preflight",
+        help="check the data availability before submission; drop (default) or just warn about model / obs combinations without data",
+        nargs="?",
+        const="drop",
+        choices=PREFLIGHT_MODES,
+    )
+    group_queue_opts.add_argument(
+        "--campaign",
+        help="plan several config files together; model / obs combinations that are identical in several configs are run once and their output is provided to all experiments",
+        action="store_true",
+    )
+    group_queue_opts.add_argument(
+        "--only-models",
+        help="run only these models (names in model_cfg, wildcards allowed) and merge their output into the existing experiment",
+        nargs="+",
+    )
+    group_queue_opts.add_argument(
+        "--only-obs",
+        help="run only these obs networks (names in obs_cfg, wildcards allowed) and merge their output into the existing experiment",
+        nargs="+",
+    )
+    group_queue_opts.add_argument(
+        "--diff-to",
+        help="existing experiment directory (<project dir>/<experiment dir>); run only the model / obs combinations that are new or changed compared to the config stored there and merge their output into that experiment",
+    )
+    group_queue_opts.add_argument(
+        "--shard-obs",
+        help="split the stations of an obs network into shards run as separate jobs; <obs name>:<number of longitude bands>[:<west>:<east>] or <obs name>:<station list file> (one line of station names per shard); can be given several times",
+        action="append",
+    )
+    group_queue_opts.add_argument(
+        "--stream",
+        help="submit the jobs of each model / obs combination as soon as its config has been written; not possible with --pack-jobs and --plan",
+        action="store_true",
+    )
+    group_queue_opts.add_argument(
+        "--output-store",
+        help=f"reuse the output of unchanged model / obs combinations from earlier runs and store the output of this run; defaults to {OUTPUT_STORE_DIR} if given without directory",
+        nargs="?",
+        const=OUTPUT_STORE_DIR,
+    )
+
     group_assembly = parser.add_argument_group(
         "data assembly", "options for assembly of parallelizations output"
     )
@@ -230,6 +575,20 @@ def main():
         help="combine the output of a parallel runs; MUST INCLUDE <project dir>/<experiment dir>!!",
         action="store_true",
     )
+    group_assembly.add_argument(
+        "--fan-out",
+        help="copy input directories of other experiments to the experiment of the output directory first (use with -c)",
+        action="store_true",
+    )
+    group_assembly.add_argument(
+        "--fan-out-config",
+        help="aeroval config file of the output directory's experiment; its exp_name, exp_descr and exp_pi are used when fanning out (use with --fan-out)",
+    )
+    group_assembly.add_argument(
+        "--merge",
+        help="merge the output into an existing experiment instead of replacing it (use with -c)",
+        action="store_true",
+    )
     group_menujson = parser.add_argument_group(
         "adjust variable and model order",
         "options to change existing order of variables and models",
@@ -337,17 +696,55 @@ def main():
     else:
         options["anaram"] = DEFAULT_ANA_RAM
 
+    options["ana_priority"] = args.ana_priority
+    options["cache_priority"] = args.cache_priority
+    options["assembly_priority"] = args.assembly_priority
+
     if args.assemblyram:
         options["assemblyram"] = args.assemblyram
     else:
         options["assemblyram"] = DEFAULT_ASSEMBLY_RAM
 
+    if args.pack_jobs:
+        options["pack_jobs"] = True
+    else:
+        options["pack_jobs"] = False
+
+    if args.job_walltime:
+        options["job_walltime"] = float(args.job_walltime)
+    else:
+        options["job_walltime"] = DEFAULT_JOB_WALLTIME
+
+    if args.plan:
+        options["plan"] = True
+    else:
+        options["plan"] = False
+
+    if args.shard_obs:
+        options["shard_obs"] = {}
+        for shard_str in args.shard_obs:
+            obs_name, shard_filters = parse_shard_option(shard_str)
+            options["shard_obs"][obs_name] = shard_filters
+
+    if args.stream:
+        options["stream"] = True
+    else:
+        options["stream"] = False
+
+    if args.output_store:
+        options["output_store"] = args.output_store
+
     if args.tempdir:
         options["tempdir"] = Path(args.tempdir)
 
     if args.cfgvar:
         options["cfgvar"] = args.cfgvar
 
+    if args.no_config_cache:
+        options["no_config_cache"] = True
+    else:
+        options["no_config_cache"] = False
+
     if args.json_basedir:
         options["json_basedir"] = args.json_basedir
 
@@ -362,6 +759,68 @@ def main():
     else:
         options["combinedirs"] = False
 
+    if args.diff_to:
+        options["diff_to"] = Path(args.diff_to)
+
+    if args.no_validation:
+        options["validate"] = False
+    else:
+        options["validate"] = True
+
+    if args.no_cache_check:
+        options["cache_check"] = False
+    else:
+        options["cache_check"] = True
+
+    if args.cache_multi_var:
+        options["cache_multi_var"] = True
+    else:
+        options["cache_multi_var"] = False
+
+    if args.cache_pool:
+        options["cache_pool"] = args.cache_pool
+
+    options["pool_quota"] = args.pool_quota
+
+    if args.pyaro_snapshot:
+        options["pyaro_snapshot"] = args.pyaro_snapshot
+
+    if args.model_preread:
+        options["model_preread"] = args.model_preread
+
+    if args.force:
+        options["force"] = True
+    else:
+        options["force"] = False
+
+    if args.preflight:
+        options["preflight"] = args.preflight
+
+    if args.campaign:
+        options["campaign"] = True
+    else:
+        options["campaign"] = False
+
+    if args.fan_out:
+        options["fan_out"] = True
+    else:
+        options["fan_out"] = False
+
+    if args.fan_out_config:
+        options["fan_out_config"] = args.fan_out_config
+
+    if args.only_models:
+        options["only_models"] = args.only_models
+
+    if args.only_obs:
+        options["only_obs"] = args.only_obs
+
+    # the output of a diff or partial run needs to be merged into the existing experiment
+    if args.merge or args.diff_to or args.only_models or args.only_obs:
+        options["merge"] = True
+    else:
+        options["merge"] = False
+
     if args.outdir:
         options["outdir"] = Path(args.outdir)
 
@@ -372,6 +831,16 @@ Please add an output directory using the -o switch."""
         print(error_str)
         sys.exit(1)
 
+    # shards are merged by name; that does not work for packed jobs
+    if "shard_obs" in options and options["pack_jobs"]:
+        print("Error: --shard-obs can't be combined with --pack-jobs.")
+        sys.exit(1)
+
+    # packing and the plan file need all job configs before the first submission
+    if options["stream"] and (options["pack_jobs"] or options["plan"]):
+        print("Error: --stream can't be combined with --pack-jobs or --plan.")
+        sys.exit(1)
+
     if options["extract_obsconfigfile"]:
         # just create the obsconfig files and exit
         raise NotImplementedError
@@ -382,128 +851,36 @@ Please add an output directory using the -o switch."""
         and not options["adjustheatmap"]
         and not options["adjustall"]
     ):
+        if options["stream"]:
+            run_streaming(options, rnd)
+            return
         # create aeroval config file for the queue
         # for now one for each model and Obsnetwork combination
-        runfiles, cache_job_id_mask, json_run_dirs, tempdir = prep_files(options)
+        try:
+            runfiles, cache_job_id_mask, assemblies, tempdir, preread_requests = (
+                prep_files(options)
+            )
+        except ConfigValidationError:
+            print("Error: config validation failed. Use --force to submit anyway.")
+            sys.exit(1)
         # host_str = f"{options['qsub_user']}@{options['qsub_host']}"
-        obs_conf_flag = False
+        cache_holds = {}
         if not options["nocache"]:
             # CREATE CACHE
-            # now start cache file generation using the command line for simplicity
-
-            # store already submitted obs networks
-            submitted_obs_nets = {}
-            for _aeroval_file in runfiles:
-                # create jobs for cache file generation first and add the wait for them to the qsub parameters
-                # add waiting for all cache file generation scripts for now
-                # options["hold_jid"] = "create_cache_*"
-                try:
-                    options["hold_jid"][_aeroval_file] = cache_job_id_mask[
-                        _aeroval_file
-                    ]
-                except KeyError:
-                    options["hold_jid"] = {}
-                    options["hold_jid"][_aeroval_file] = cache_job_id_mask[
-                        _aeroval_file
-                    ]
-
-                conf_info = get_config_info(_aeroval_file, options["cfgvar"])
-
-                for obs_net_key in conf_info:
-                    # obs_net_key = next(iter(conf_info))
-                    if (
-                        obs_net_key in submitted_obs_nets
-                    ):  # conf_info always has just one key
-                        # Obs net could have been used before, but not necessarily all vars
-                        # the following creates a list of
-                        if all(
-                            item in submitted_obs_nets[obs_net_key]
-                            for item in conf_info[obs_net_key]["obs_vars"]
-                        ):
-                            continue
-                        else:
-                            submitted_obs_nets[obs_net_key] += list(
-                                set(submitted_obs_nets[obs_net_key])
-                                - set(conf_info[obs_net_key]["obs_vars"])
-                            )
-                    else:
-                        try:
-                            submitted_obs_nets[obs_net_key] = deepcopy(
-                                conf_info[obs_net_key]["obs_vars"]
-                            )
-                        except KeyError:
-                            submitted_obs_nets[obs_net_key].update(
-                                deepcopy(conf_info[obs_net_key]["obs_vars"])
-                            )
-
-                        # create pyaro config, if necessary
-                        if "pyaro_config" in conf_info[obs_net_key]:
-                            obs_conf_flag = RUN_PYARO_CACHING
-                            if obs_conf_flag:
-                                obs_conf_file = Path(tempdir).joinpath(
-                                    f"pya_{rnd}_caching_{obs_net_key}{PICKLE_JSON_EXT}"
-                                )
-                                if os.path.exists(obs_conf_file):
-                                    continue
-                                else:
-                                    print(f"writing file {obs_conf_file}")
-                                    json_string = jsonpickle.encode(
-                                        conf_info[obs_net_key]["pyaro_config"]
-                                    )
-                                    with open(
-                                        obs_conf_file, "w", encoding="utf-8"
-                                    ) as j:
-                                        j.write(json_string)
-                        else:
-                            obs_conf_flag = False
-                            obs_conf_file = None
-
-                    # cache creation is started via the command line for simplicity
-                    cmd_arr = [*CACHE_CREATION_CMD]
-                    # if options["localhost"]:
-                    #     cmd_arr += ["-l"]
-                    if "env_mod" in options and options["env_mod"] != ENV_MODULE_NAME:
-                        cmd_arr += ["-m", options["env_mod"]]
-                    # append queue options
-                    queue_opts = [
-                        "--queue",
-                        options["qsub_cache_queue_name"],
-                        "--ram",
-                        options["cacheram"],
-                        "--queue-user",
-                        options["qsub_user"],
-                        "--qsub-id",
-                        str(rnd),
-                        "--qsub-dir",
-                        # emulates the qsub tempdir from the later run_queue method
-                        # the goal is to use always just one qsub directory for the cache
-                        # file generation and the aeroval parallelization
-                        f"{tempdir}",
-                    ]
-                    if obs_conf_flag:
-                        cmd_arr += ["--obsconfigfile", obs_conf_file]
-                    # qsub or dry-qsub?
-                    if options["dry_qsub"]:
-                        queue_opts += ["--dry-qsub"]
-                    else:
-                        queue_opts += ["--qsub"]
-                    cmd_arr += queue_opts
-                    # cmd_tmp_arr = deepcopy(cmd_arr)
-                    static_opts = [
-                        "--vars",
-                        *conf_info[obs_net_key]["obs_vars"],
-                        "-o",
-                        obs_net_key,
-                    ]
-                    cmd_arr += static_opts
-
-                    print(f"running command {' '.join(map(str, cmd_arr))}...")
-                    sh_result = subprocess.run(cmd_arr, capture_output=True)
-                    print(f"{sh_result.stdout}")
-                    if sh_result.returncode != 0:
-                        continue
-                    else:
-                        print("success...")
+            # one cache job per obs network, variable and pyaro config for all jobs
+            conf_infos = {
+                _aeroval_file: get_config_info(_aeroval_file, options["cfgvar"])
+                for _aeroval_file in runfiles
+            }
+            cache_holds = submit_cache_jobs(conf_infos, {}, tempdir, rnd, options)
+        # analysis jobs wait for exactly the cache jobs they need (and merge jobs
+        # for their shards)
+        options["hold_jid"] = {
+            _aeroval_file: get_hold_jid(
+                cache_job_id_mask[_aeroval_file], cache_holds.get(_aeroval_file)
+            )
+            for _aeroval_file in runfiles
+        }
 
         if options["dry_qsub"] and options["verbose"]:
             # just print the to be run files
@@ -513,68 +890,27 @@ Please add an output directory using the -o switch."""
             print("cache file generation only was requested. Exiting.")
             return
         else:
-            run_queue(
-                runfiles,
-                submit_flag=(not options["dry_qsub"]),
-                qsub_queue=options["qsub_queue_name"],
-                qsub_dir=tempdir,
-                options=options,
-            )
-            conf = read_config_var(config_file=runfiles[0], cfgvar=options["cfgvar"])
-            # now add jobs for data assembly and json file reordering
-            # create a data dict with the assembly directory as key and the directories to
-            # assemble as list of values
-            # assembly_paths = [Path(json_run_dirs[x]).parent for x in range(len(json_run_dirs))]
-            wds = {}
-            # the following returns a list of unique data assembly paths
-            for json_dir in json_run_dirs:
-                _dir = str(
-                    Path.joinpath(
-                        Path(json_dir).parent, conf["proj_id"], conf["exp_id"]
-                    )
-                )
-                try:
-                    wds[_dir].append(json_dir)
-                except KeyError:
-                    wds[_dir] = []
-                    wds[_dir].append(json_dir)
-            for out_dir in wds:
-                assembly_script_str = get_assembly_job_str(
-                    out_dir=out_dir,
-                    in_dirs=wds[out_dir],
-                    job_id=rnd,
-                    wd=Path(out_dir).parent.parent,
-                    ram=options["assemblyram"],
-                    queue_name=options["qsub_queue_name"],
-                    module=options["env_mod"],
-                )
-                qsub_start_file_name = Path.joinpath(
-                    Path(tempdir), f"pya_{rnd}_data_merging.run"
+            # the analysis jobs wait for the exact ids of their model pre-read jobs
+            submit_preread_jobs(preread_requests, set(), tempdir, options)
+            if options["plan"]:
+                run_queue_bundled(
+                    runfiles,
+                    submit_flag=(not options["dry_qsub"]),
+                    qsub_queue=options["qsub_queue_name"],
+                    qsub_dir=tempdir,
+                    options=options,
                 )
-
-                # Now add the reordering job. Just add that to the pure assembly job
-                # since it's a serial operation anyway
-                menu_json_file = Path.joinpath(Path(out_dir), "menu.json")
-                aeroval_config_file = Path(options["files"][0]).resolve()
-                reorder_cmd_arr = [
-                    "aeroval_parallelize",
-                    "--adjustall",
-                    f"'{aeroval_config_file}'",
-                    f"'{menu_json_file}'",
-                ]
-                reorder_cmd_str = " ".join(map(str, reorder_cmd_arr))
-
-                assembly_script_str += f"""echo "starting {reorder_cmd_str} ..." >> ${{logfile}}
-{reorder_cmd_str} >> ${{logfile}} 2>&1"""
-
-                with open(qsub_start_file_name, "w") as f:
-                    f.write(assembly_script_str)
-                run_queue_simple(
-                    [qsub_start_file_name],
+            else:
+                run_queue(
+                    runfiles,
                     submit_flag=(not options["dry_qsub"]),
+                    qsub_queue=options["qsub_queue_name"],
                     qsub_dir=tempdir,
                     options=options,
                 )
+            # now add jobs for data assembly and json file reordering
+            # one per experiment
+            submit_assembly_jobs(assemblies, tempdir, rnd, options)
 
     elif options["adjustmenujson"]:
         # adjust menu.json
@@ -598,7 +934,11 @@ Please add an output directory using the -o switch."""
         menu_json_file = options["files"][1]
         json_path = Path(menu_json_file).parent
 
-        cfg = read_config_var(aeroval_conf_file, options["cfgvar"])
+        cfg = read_config_var(
+            aeroval_conf_file,
+            options["cfgvar"],
+            use_cache=not options["no_config_cache"],
+        )
 
         # adjust menu.json
         adjust_menujson(
@@ -4,11 +4,31 @@ small helper program to read a aeroval config from a json file
 
 """
 import argparse
+import time
+from copy import deepcopy
 
-import simplejson as json
-import jsonpickle
 from fnmatch import fnmatch
-from aeroval_parallelize.const import JSON_EXT, PICKLE_JSON_EXT
+from aeroval_parallelize.const import (
+    JSON_EXT,
+    PICKLE_JSON_EXT,
+    CFG_JSON_EXT,
+    CFG_MSGPACK_EXT,
+    JOB_LIST_EXT,
+    PLAN_ENTRY_EXT,
+    RUNTIME_HISTORY_DIR,
+)
+from aeroval_parallelize.cache_pool import use_cache_pool
+from aeroval_parallelize.model_preread import apply_preread
+from aeroval_parallelize.output_store import (
+    STORE_HASH_KEY,
+    get_config_hash,
+    store_output,
+)
+from aeroval_parallelize.plan_file import read_plan_entry_path
+from aeroval_parallelize.pyaro_snapshot import use_snapshots
+from aeroval_parallelize.planning import record_runtime
+from aeroval_parallelize.serializer import read_config_file
+from aeroval_parallelize.sharding import SHARD_COLDATA_KEY, merge_shard_coldata
 
 
 def main():
@@ -19,11 +39,37 @@ def main():
     parser.add_argument(
         "-d", "--dryrun", help="dry run, just print the config", action="store_true"
     )
+    parser.add_argument(
+        "--runtime-history-dir",
+        help=f"directory to store the runtimes in; defaults to {RUNTIME_HISTORY_DIR}",
+        default=RUNTIME_HISTORY_DIR,
+    )
+    parser.add_argument(
+        "--output-store",
+        help="store the json output of the config(s) in this output store after a successful run",
+    )
+    parser.add_argument(
+        "--cache-pool",
+        help="read (and write) the pyaerocom cache files in this cache pool",
+    )
+    parser.add_argument(
+        "--pyaro-snapshot",
+        help="read pyaro obs networks from their snapshot in this directory (if written)",
+    )
 
     args = parser.parse_args()
     options = {}
     if args.files:
-        options["files"] = args.files
+        options["files"] = []
+        # job list files contain the config files of a packed job
+        for _file in args.files:
+            if fnmatch(_file, f"*{JOB_LIST_EXT}"):
+                with open(_file, "r", encoding="utf-8") as infile:
+                    options["files"].extend(
+                        [line.strip() for line in infile if line.strip()]
+                    )
+            else:
+                options["files"].append(_file)
         # to avoid that lustre access is checked if the help just needs to be printed
         from pyaerocom.aeroval import EvalSetup, ExperimentProcessor
 
@@ -32,24 +78,73 @@ def main():
     else:
         options["dryrun"] = False
 
+    options["runtime_history_dir"] = args.runtime_history_dir
+
+    if args.output_store:
+        options["output_store"] = args.output_store
+
+    if args.cache_pool:
+        options["cache_pool"] = args.cache_pool
+        use_cache_pool(options["cache_pool"])
+
+    if args.pyaro_snapshot:
+        options["pyaro_snapshot"] = args.pyaro_snapshot
+
     for _file in options["files"]:
-        if fnmatch(_file, f"*{JSON_EXT}"):
-            with open(_file, "r", encoding="utf-8") as infile:
-                CFG = json.load(infile)
-        elif fnmatch(_file, f"*{PICKLE_JSON_EXT}"):
-            with open(_file, "r") as infile:
-                json_string = infile.read()
-            CFG = jsonpickle.decode(json_string)
+        if any(
+            fnmatch(_file, f"*{ext}")
+            for ext in [JSON_EXT, PICKLE_JSON_EXT, CFG_JSON_EXT, CFG_MSGPACK_EXT]
+        ):
+            CFG = read_config_file(_file)
+        elif fnmatch(_file, f"*{PLAN_ENTRY_EXT}"):
+            # read just this job's config from the plan file
+            CFG = read_plan_entry_path(_file)
         else:
             print(f"skipping file {_file} due to wrong file extension")
             continue
 
+        # the output store and the runtime history need the config as planned;
+        # reading snapshots and pre-read subsets changes it
+        cfg_hash = CFG.pop(STORE_HASH_KEY, None)
+        planned_cfg = deepcopy(CFG)
+        if "output_store" in options and cfg_hash is None:
+            cfg_hash = get_config_hash(planned_cfg)
+
+        if "pyaro_snapshot" in options:
+            use_snapshots(CFG, options["pyaro_snapshot"])
+        # read the models from their pre-read subsets (see model_preread.py)
+        apply_preread(CFG)
+
+        start_time = time.perf_counter()
+        if SHARD_COLDATA_KEY in CFG:
+            # merge job of a sharded obs network: merge the shards' colocated data first
+            if options["dryrun"]:
+                CFG.pop(SHARD_COLDATA_KEY)
+            else:
+                merge_shard_coldata(CFG)
         stp = EvalSetup(
             **CFG,
         )
         ana = ExperimentProcessor(stp)
         if not options["dryrun"]:
             res = ana.run()
+            # the runtime is used to plan the jobs of later runs
+            try:
+                record_runtime(
+                    planned_cfg,
+                    time.perf_counter() - start_time,
+                    history_dir=options["runtime_history_dir"],
+                )
+            except OSError as e:
+                print(f"could not store runtime of {_file}: {e}")
+            if "output_store" in options:
+                try:
+                    entry_path = store_output(
+                        CFG, options["output_store"], cfg_hash=cfg_hash
+                    )
+                    print(f"stored output of {_file} in {entry_path}")
+                except OSError as e:
+                    print(f"could not store output of {_file}: {e}")
         else:
             print(stp)
 
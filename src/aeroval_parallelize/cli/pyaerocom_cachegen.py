@@ -8,7 +8,6 @@ from __future__ import annotations
 
 import argparse
 import os.path
-import subprocess
 import sys
 from pathlib import Path
 from tempfile import mkdtemp
@@ -20,12 +19,22 @@ from aeroval_parallelize.cache_tools import (
     QSUB_USER,
     RND,
     TMP_DIR,
-    run_queue,
-    write_script,
-    write_script_pyaro,
+    create_cache_jobs,
+    get_cache_script_rams,
+    get_local_mem_budget,
+    run_scripts_locally,
+    write_cache_scripts,
     DEFAULT_CACHE_RAM,
     ENV_MODULE_NAME,
 )
+from aeroval_parallelize.cache_pool import get_pool_index_dir
+from aeroval_parallelize.const import (
+    CACHE_INDEX_DIR,
+    CACHE_POOL_DIR,
+    CACHE_POOL_QUOTA,
+    PYARO_SNAPSHOT_DIR,
+)
+from aeroval_parallelize.freshness import filter_stale_requests
 from pyaerocom.io.pyaro.pyaro_config import PyaroConfig
 
 
@@ -45,9 +54,14 @@ def main():
         epilog=f"""{colors['BOLD']}Example usages:{colors['END']}
 {colors['UNDERLINE']}start cache generation serially{colors['END']}
 {script_name} --vars concpm10 concpm25 -o EEAAQeRep.v2
+{colors['UNDERLINE']}start cache generation locally with 4 parallel processes{colors['END']}
+{script_name} --jobs 4 --vars concpm10 concpm25 vmro3 concno2 -o EEAAQeRep.v2
 {colors['UNDERLINE']}with pyaro config file{colors['END']}
 {script_name} --vars concpm10 concpm25 -o EEAAQeRep.v2 --obsconfigfile <path to picklejson file>
 
+{colors['UNDERLINE']}create the cache files in the team's cache pool{colors['END']}
+{script_name} --cache-pool --vars concpm10 concpm25 -o EEAAQeRep.v2
+
 {colors['UNDERLINE']}dry run cache generation for queue job{colors['END']}
 {script_name} --dry-qsub --vars ang4487aer od550aer -o AeronetSunV3Lev2.daily
 
@@ -127,6 +141,47 @@ def main():
         "--ram",
         help=f"RAM usage [GB] for queue",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="number of cache scripts to run in parallel on the local machine (without --qsub); defaults to 1",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--mem-budget",
+        help="memory budget [GB] of the parallel local run; defaults to 80%% of the physical memory",
+        type=float,
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        help="create all cache files, also those whose source files did not change since their creation",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--multi-var",
+        help="read all variables of an obs network at once (one script / queue job per obs network)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cache-pool",
+        help=f"create the cache files in a cache pool shared with other runs; defaults to {CACHE_POOL_DIR} if given without directory",
+        nargs="?",
+        const=CACHE_POOL_DIR,
+    )
+    parser.add_argument(
+        "--pool-quota",
+        help=f"disk quota [GB] of the cache pool; least recently used cache files are evicted above that; defaults to {CACHE_POOL_QUOTA}",
+        type=float,
+        default=CACHE_POOL_QUOTA,
+    )
+    parser.add_argument(
+        "--pyaro-snapshot",
+        help=f"convert the source of the pyaro config once to a columnar snapshot and read that; defaults to {PYARO_SNAPSHOT_DIR} if given without directory",
+        nargs="?",
+        const=PYARO_SNAPSHOT_DIR,
+    )
 
     args = parser.parse_args()
     options = {}
@@ -227,8 +282,34 @@ def main():
     if args.tempdir:
         options["tempdir"] = Path(args.tempdir)
 
+    if args.multi_var:
+        options["multi_var"] = True
+    else:
+        options["multi_var"] = False
+
+    if args.force:
+        options["force"] = True
+    else:
+        options["force"] = False
+
+    if args.cache_pool:
+        options["cache_pool"] = args.cache_pool
+    else:
+        options["cache_pool"] = None
+    options["pool_quota"] = args.pool_quota
+
+    if args.pyaro_snapshot:
+        options["pyaro_snapshot"] = args.pyaro_snapshot
+    else:
+        options["pyaro_snapshot"] = None
+
+    options["jobs"] = args.jobs
+    if args.mem_budget:
+        options["mem_budget"] = args.mem_budget
+    else:
+        options["mem_budget"] = get_local_mem_budget()
+
     # generate cache files
-    scripts_to_run = []
     # create tmp dir for script creation
     # to run on the queue these have to be in either on /home or another
     # generally available file system
@@ -253,49 +334,66 @@ def main():
         else:
             vars_to_process = options["vars"]
 
-        for var in vars_to_process:
-            # write python file
-            obs_network = obsconf.name
-
-            outfile = tempdir.joinpath(f"pya_{rnd}_caching_{obs_network}_{var}.py")
-            write_script_pyaro(
-                outfile,
-                var=var,
-                obsnetwork=obs_network,
-                use_module=use_module,
-                conffile=options["obsconfigfile"],
-            )
-            print(f"Wrote pyaro {outfile}")
-            scripts_to_run.append(outfile)
+        requests = {
+            obsconf.name: {
+                "obs_vars": vars_to_process,
+                "pyaro_config": obsconf,
+                "pyaro_config_file": options["obsconfigfile"],
+            }
+        }
     else:
-        for obs_network in options["obsnetworks"]:
-            for var in options["vars"]:
-                # write python file
-                outfile = tempdir.joinpath(f"pya_{rnd}_caching_{obs_network}_{var}.py")
-                write_script(
-                    outfile, var=var, obsnetwork=obs_network, use_module=use_module
-                )
-                print(f"Wrote {outfile}")
-                scripts_to_run.append(outfile)
+        requests = {
+            obs_network: {"obs_vars": options["vars"]}
+            for obs_network in options["obsnetworks"]
+        }
+
+    # regenerate only the cache files whose source files changed (see freshness.py)
+    source_digests = None
+    index_dir = CACHE_INDEX_DIR
+    if options["cache_pool"] is not None:
+        index_dir = get_pool_index_dir(options["cache_pool"])
+    if not options["force"]:
+        requests, source_digests = filter_stale_requests(requests, index_dir=index_dir)
+        if not requests:
+            print("all cache files are up to date. Use --force to create them anyway.")
+            sys.exit(0)
 
     if options["qsub"] or options["dry_qsub"]:
         # run via queue, either on localhost or qsub submit host
-        run_queue(
-            scripts_to_run,
+        create_cache_jobs(
+            requests,
+            tempdir,
+            rnd=rnd,
+            qsub_queue=options["qsub_queue_name"],
             submit_flag=(not options["dry_qsub"]),
             options=options,
-            qsub_queue=options["qsub_queue_name"],
+            multi_var=options["multi_var"],
+            source_digests=source_digests,
+            cache_pool=options["cache_pool"],
+            pool_quota=options["pool_quota"],
+            pyaro_snapshot=options["pyaro_snapshot"],
         )
     else:
-        # run serially on localhost
-        for _script in scripts_to_run:
-            cmd_arr = [_script]
-            print(f"running command {' '.join(map(str, cmd_arr))}...")
-            sh_result = subprocess.run(cmd_arr)
-            if sh_result.returncode != 0:
-                continue
-            else:
-                print("success...")
+        # run on localhost; options["jobs"] scripts in parallel
+        scripts = write_cache_scripts(
+            requests,
+            tempdir,
+            rnd=rnd,
+            use_module=use_module,
+            multi_var=options["multi_var"],
+            source_digests=source_digests,
+            cache_pool=options["cache_pool"],
+            pool_quota=options["pool_quota"],
+            pyaro_snapshot=options["pyaro_snapshot"],
+        )
+        run_scripts_locally(
+            scripts,
+            jobs=options["jobs"],
+            mem_budget=options["mem_budget"],
+            script_rams=get_cache_script_rams(
+                requests, tempdir, rnd=rnd, multi_var=options["multi_var"]
+            ),
+        )
 
 
 if __name__ == "__main__":
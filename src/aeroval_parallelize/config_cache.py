@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+cache for aeroval config files
+
+Reading a Python config file means importing it, which can be slow (e.g. if the
+config reads model lists from lustre at import time). Configs are therefore cached
+
+- in process, keyed by path, cfgvar, mtime and size
+- on disk (in CONFIG_CACHE_DIR; only if that's set) in serialised form, keyed by path
+  and cfgvar and validated using the mtime and the content hash of the config file
+
+so that later jobs (e.g. the assembly) can reuse the config without importing it again.
+The disk cache does not notice changes of modules imported by the config or of data
+read at import time; that's why it's opt-in.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from copy import deepcopy
+from pathlib import Path
+
+import simplejson as json
+
+from aeroval_parallelize.const import CONFIG_CACHE_DIR
+from aeroval_parallelize.serializer import decode_config, encode_config
+
+# serializer used for the disk cache entries; entries written by another serializer are ignored
+CACHE_SERIALIZER = "typed"
+
+# in process cache; key: (path, cfgvar, mtime, size), value: config
+_MEM_CACHE = {}
+
+
+def get_content_hash(config_file: str | Path) -> str:
+    """return the sha256 hash of a files content"""
+    with open(config_file, "rb") as inhandle:
+        return hashlib.sha256(inhandle.read()).hexdigest()
+
+
+def get_cache_file(config_file: str | Path, cfgvar: str, cache_dir: str | Path) -> Path:
+    """return the path of the disk cache file of a config"""
+    key = f"{Path(config_file).resolve()}:{cfgvar}"
+    return Path(cache_dir).joinpath(f"{hashlib.sha256(key.encode()).hexdigest()}.json")
+
+
+def get_cached_config(
+    config_file: str | Path,
+    cfgvar: str,
+    cache_dir: str | Path | None = CONFIG_CACHE_DIR,
+) -> dict | None:
+    """return a copy of the cached config or None if there's no valid cache entry"""
+    stat = os.stat(config_file)
+    mem_key = (str(Path(config_file).resolve()), cfgvar, stat.st_mtime_ns, stat.st_size)
+    if mem_key in _MEM_CACHE:
+        return deepcopy(_MEM_CACHE[mem_key])
+
+    if not cache_dir:
+        return None
+
+    cache_file = get_cache_file(config_file, cfgvar, cache_dir)
+    try:
+        with open(cache_file, "r", encoding="utf-8") as inhandle:
+            cache_entry = json.load(inhandle)
+    except (OSError, ValueError):
+        return None
+
+    if cache_entry.get("serializer") != CACHE_SERIALIZER:
+        return None
+
+    if cache_entry["mtime"] != stat.st_mtime_ns:
+        # file touched; still valid if the content did not change
+        if cache_entry["content_hash"] != get_content_hash(config_file):
+            return None
+        cache_entry["mtime"] = stat.st_mtime_ns
+        write_cache_entry(cache_file, cache_entry)
+
+    cfg = decode_config(cache_entry["cfg"])
+    print(f"using the cached config of {config_file} ({cache_file})")
+    _MEM_CACHE[mem_key] = cfg
+    return deepcopy(cfg)
+
+
+def write_cache_entry(cache_file: Path, cache_entry: dict) -> None:
+    """write a disk cache entry; several processes might do that at the same time"""
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}")
+        with open(tmp_file, "w", encoding="utf-8") as outhandle:
+            json.dump(cache_entry, outhandle)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f"could not write config cache file {cache_file}: {e}")
+
+
+def cache_config(
+    config_file: str | Path,
+    cfgvar: str,
+    cfg: dict,
+    cache_dir: str | Path | None = CONFIG_CACHE_DIR,
+    disk_cache: bool = True,
+) -> None:
+    """store a config in the in process and (optionally) the disk cache"""
+    stat = os.stat(config_file)
+    mem_key = (str(Path(config_file).resolve()), cfgvar, stat.st_mtime_ns, stat.st_size)
+    _MEM_CACHE[mem_key] = deepcopy(cfg)
+
+    if not cache_dir or not disk_cache:
+        return
+
+    cache_entry = {
+        "path": str(Path(config_file).resolve()),
+        "cfgvar": cfgvar,
+        "mtime": stat.st_mtime_ns,
+        "content_hash": get_content_hash(config_file),
+        "serializer": CACHE_SERIALIZER,
+        "cfg": encode_config(cfg),
+    }
+    write_cache_entry(get_cache_file(config_file, cfgvar, cache_dir), cache_entry)
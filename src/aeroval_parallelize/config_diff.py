@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+comparison of an aeroval config with the config stored in an existing experiment
+
+aeroval writes the config of an experiment to <experiment dir>/cfg_<proj_id>_<exp_id>.json.
+The stored config contains the default values of all options, so only the options
+given in the new config are compared. A model / obs unit needs to be run again if
+- its model entry (incl. its plot_types) or one of its obs entries changed or is new
+- one of the global options changed (all units need to be run again in that case)
+"""
+from __future__ import annotations
+
+from pathlib import Path
+
+import simplejson as json
+
+from aeroval_parallelize.output_store import normalise_config
+
+# global config keys that do not change the output of a unit
+DIFF_IGNORE_KEYS = [
+    "json_basedir",
+    "coldata_basedir",
+    "proj_id",
+    "exp_id",
+    "exp_name",
+    "exp_descr",
+    "exp_pi",
+    "public",
+    "var_order_menu",
+    "model_order_menu",
+    "obs_order_menu",
+]
+# config keys compared per unit
+DIFF_UNIT_KEYS = ["model_cfg", "obs_cfg", "plot_types"]
+# mask of the config file in an experiment directory
+STORED_CONFIG_MASK = "cfg_*.json"
+
+# marker for config values that are not in the stored config
+_MISSING = object()
+
+
+def read_stored_config(exp_dir: str | Path) -> dict:
+    """read the config stored in an experiment directory"""
+    cfg_files = sorted(Path(exp_dir).glob(STORED_CONFIG_MASK))
+    if not cfg_files:
+        raise FileNotFoundError(f"no {STORED_CONFIG_MASK} file in {exp_dir}")
+    with open(cfg_files[0], "r", encoding="utf-8") as inhandle:
+        return json.load(inhandle)
+
+
+def find_config_value(cfg: dict, key: str):
+    """return the value of key in a (possibly nested) stored config
+
+    the stored config groups some options (e.g. colocation options); returns _MISSING
+    if the key is not found
+    """
+    if key in cfg:
+        return cfg[key]
+    for value in cfg.values():
+        if isinstance(value, dict):
+            found = find_config_value(value, key)
+            if found is not _MISSING:
+                return found
+    return _MISSING
+
+
+def is_value_changed(value, stored_value) -> bool:
+    """compare a config value with a stored one"""
+    if stored_value is _MISSING:
+        return True
+    return normalise_config(value) != normalise_config(stored_value)
+
+
+def is_entry_changed(entry: dict, stored_entry: dict | None) -> bool:
+    """compare a model or obs entry with the stored one; only the keys of entry are compared"""
+    if stored_entry is None:
+        return True
+    return any(
+        is_value_changed(value, stored_entry.get(key, _MISSING))
+        for key, value in entry.items()
+    )
+
+
+def get_changed_globals(cfg: dict, stored_cfg: dict) -> list[str]:
+    """return the global config keys whose value differs from the stored config"""
+    return [
+        key
+        for key in cfg
+        if key not in DIFF_IGNORE_KEYS
+        and key not in DIFF_UNIT_KEYS
+        and is_value_changed(cfg[key], find_config_value(stored_cfg, key))
+    ]
+
+
+def is_unit_changed(unit_cfg: dict, stored_cfg: dict) -> bool:
+    """check if a (single model) unit needs to be run again"""
+    stored_models = stored_cfg.get("model_cfg", {})
+    stored_obs = stored_cfg.get("obs_cfg", {})
+    stored_plot_types = stored_cfg.get("plot_types") or {}
+    for model_name, model_entry in unit_cfg["model_cfg"].items():
+        if is_entry_changed(model_entry, stored_models.get(model_name)):
+            return True
+        if "plot_types" in unit_cfg and model_name in unit_cfg["plot_types"]:
+            if is_value_changed(
+                unit_cfg["plot_types"][model_name],
+                stored_plot_types.get(model_name, _MISSING),
+            ):
+                return True
+    return any(
+        is_entry_changed(obs_entry, stored_obs.get(obs_name))
+        for obs_name, obs_entry in unit_cfg["obs_cfg"].items()
+    )
+
+
+def filter_changed_units(units, cfg: dict, stored_cfg: dict):
+    """yield the units that are new or changed compared to the stored config"""
+    changed_globals = get_changed_globals(cfg, stored_cfg)
+    if changed_globals:
+        print(
+            f"global options changed: {', '.join(changed_globals)}; running all units"
+        )
+        yield from units
+        return
+
+    for unit in units:
+        if is_unit_changed(unit["cfg"], stored_cfg):
+            yield unit
+        else:
+            print(f"unit {unit['name']} unchanged; not running it")
@@ -54,6 +54,11 @@ QSUB_USER = USER
 # log directory
 QSUB_LOG_DIR = f"/lustre/store{STORE}/project/aerocom/logs/aeroval_logs/"
 
+# cache directory for aeroval config files (see config_cache.py)
+# the disk cache is off unless the environment variable is set to a directory
+# readable by all queue hosts (e.g. /lustre/storeB/users/<user>/aeroval_config_cache)
+CONFIG_CACHE_DIR = environ.get("AEROVAL_CONFIG_CACHE_DIR", "")
+
 # some copy constants
 REMOTE_CP_COMMAND = ["scp", "-v"]
 CP_COMMAND = ["cp", "-v"]
@@ -67,12 +72,37 @@ ENV_MODULE_NAME = "/modules/MET/rhel8/user-modules/fou-kl/aerotools/aerotools.co
 
 # default RAM asked for caching jobs (in GB)
 DEFAULT_CACHE_RAM = 40
+# additional RAM per variable of a cache job reading several variables at once (in GB)
+CACHE_RAM_PER_VAR = 10
+# maximum RAM asked for a caching job (in GB)
+MAX_CACHE_RAM = 120
+# estimated RAM of a local cache generation process reading a single variable (in GB)
+# key: start of the obs network name; DEFAULT_LOCAL_CACHE_RAM for other networks
+LOCAL_CACHE_NETWORK_RAM = {
+    "EEAAQeRep": 16,
+    "EBASMC": 24,
+    "AeronetSun": 4,
+    "AeronetInv": 4,
+    "AirNow": 8,
+    "MEP": 8,
+}
+DEFAULT_LOCAL_CACHE_RAM = 8
+# fraction of the physical memory used for local cache generation by default
+LOCAL_CACHE_MEM_FRACTION = 0.8
 
 # default RAM for analysis jobs (in GB)
 DEFAULT_ANA_RAM = 40
 # default RAM for assembly jobs (in GB)
 DEFAULT_ASSEMBLY_RAM = 30
 
+# queue job priorities (-p); users can only lower the priority of their jobs (-1023 to 0)
+# the critical path: assembly before cache generation before analysis jobs
+# small offsets, so that just the order of our own jobs changes and they do not drop
+# below the jobs of other users
+QSUB_ASSEMBLY_PRIORITY = 0
+QSUB_CACHE_PRIORITY = -1
+QSUB_ANA_PRIORITY = -2
+
 # default module name
 # DEFAULT_MODULE_NAME = "/modules/MET/rhel8/user-modules/fou-kl/aerotools/aerotools"
 
@@ -82,3 +112,42 @@ DEFAULT_PYTHON = "python"
 
 JSON_EXT = ".json"
 PICKLE_JSON_EXT = ".picklejson"
+# aeroval configs written with the typed serializer (see serializer.py)
+CFG_JSON_EXT = ".cfgjson"
+CFG_MSGPACK_EXT = ".cfgmsgpack"
+# bundled plan file holding all aeroval configs of a parallel run
+PLAN_EXT = ".pyaplan"
+# reference to a single config within a plan file
+PLAN_ENTRY_EXT = ".planentry"
+# list of aeroval config files to be run within one queue job (packed jobs)
+JOB_LIST_EXT = ".joblist"
+
+# target wall time [h] of a packed analysis job
+DEFAULT_JOB_WALLTIME = 4
+# directory where the analysis jobs store their runtimes
+# used to estimate the cost of a model / obs network combination in later runs
+RUNTIME_HISTORY_DIR = f"/lustre/store{STORE}/users/{USER}/aeroval_runtimes"
+# default directory of the content addressed store of analysis job outputs
+OUTPUT_STORE_DIR = f"/lustre/store{STORE}/users/{USER}/aeroval_output_store"
+# directory of the cached index of the available model data (pre-flight check)
+DATA_INDEX_DIR = f"/lustre/store{STORE}/users/{USER}/aeroval_data_index"
+# directory of the content hashed pyaro configs used by the cache generation
+PYARO_CONFIG_DIR = f"/lustre/store{STORE}/users/{USER}/aeroval_pyaro_configs"
+# extension of the files marking a pyaro config and variable as cached
+PYARO_CACHED_EXT = ".cached"
+# directory of the freshness index of the cache files (see freshness.py)
+CACHE_INDEX_DIR = f"/lustre/store{STORE}/users/{USER}/aeroval_cache_index"
+# team wide cache directory shared by all runs in cache pool mode (see cache_pool.py)
+CACHE_POOL_DIR = environ.get(
+    "AEROVAL_CACHE_POOL_DIR",
+    f"/lustre/store{STORE}/project/aerocom/aeroval_cache_pool",
+)
+# disk quota [GB] of the cache pool; least recently used cache files are evicted above that
+CACHE_POOL_QUOTA = 500
+# time [s] without refresh after which a lock of the cache pool counts as stale
+# (the job holding it died; see cache_pool.cache_pool_lock)
+CACHE_POOL_LOCK_TIMEOUT = 3600
+# directory of the columnar (parquet) snapshots of pyaro sources (see pyaro_snapshot.py)
+PYARO_SNAPSHOT_DIR = f"/lustre/store{STORE}/users/{USER}/aeroval_pyaro_snapshots"
+# directory of the model subsets written by the model pre-read jobs (see model_preread.py)
+MODEL_PREREAD_DIR = f"/lustre/store{STORE}/users/{USER}/aeroval_model_preread"
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+freshness index of the pyaerocom cache files
+
+The source files of an obs network are listed by pyaerocom's reader and just stat'ed
+(in parallel threads, no file is opened). The digest of their names, modification
+times and sizes is stored per obs network and variable when the cache file of the
+variable is created. A cache file is stale as soon as the digest of the current
+source files differs from the stored one (or if there's no stored digest).
+
+Index layout (in CACHE_INDEX_DIR):
+<obs network>/sources.json: the source files with modification time and size of the last scan
+<obs network>/<var>.json: the digest of the source files the cache file was created from
+
+pyaro networks are not covered; their sources are not known to pyaerocom's file lists.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import simplejson as json
+
+from aeroval_parallelize.const import CACHE_INDEX_DIR
+
+# maximum number of threads used to stat the source files
+FRESHNESS_THREADS = 16
+# name of the file holding the result of the last source scan of an obs network
+SOURCES_FILE_NAME = "sources.json"
+
+
+def stat_file(_file: str) -> tuple | None:
+    """return the modification time [ns] and size of a file; None if it's gone"""
+    try:
+        stat = os.stat(_file)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def stat_files(files: list[str], threads: int = FRESHNESS_THREADS) -> dict:
+    """stat files in parallel threads
+
+    returns a dict with the file as key and [modification time [ns], size] as value
+    """
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        stats = list(executor.map(stat_file, files))
+    return {
+        str(_file): list(stat) for _file, stat in zip(files, stats) if stat is not None
+    }
+
+
+def get_source_digest(file_stats: dict) -> str:
+    """return the digest of the source files (names, modification times and sizes)"""
+    json_str = json.dumps(sorted(file_stats.items()), ensure_ascii=False)
+    return hashlib.sha256(json_str.encode("utf-8")).hexdigest()
+
+
+def get_source_files(obs_id: str) -> list[str]:
+    """return the source files of an obs network as listed by pyaerocom's reader"""
+    # to avoid that lustre access is checked if the module is just imported
+    from pyaerocom.io import ReadUngridded
+
+    reader = ReadUngridded().get_lowlevel_reader(obs_id)
+    return [str(_file) for _file in reader.get_file_list()]
+
+
+def write_json(outfile: Path, data: dict) -> None:
+    """write a json file atomically (several jobs might write at the same time)"""
+    try:
+        outfile.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = outfile.with_name(f"{outfile.name}.{os.getpid()}")
+        with open(tmp_file, "w", encoding="utf-8") as outhandle:
+            json.dump(data, outhandle)
+        os.replace(tmp_file, outfile)
+    except OSError as e:
+        print(f"could not write freshness index file {outfile}: {e}")
+
+
+def scan_sources(
+    obs_id: str,
+    index_dir: str | Path = CACHE_INDEX_DIR,
+    threads: int = FRESHNESS_THREADS,
+) -> str | None:
+    """scan the source files of an obs network and return their digest
+
+    the scan result is written to the index; returns None if the files can't be listed
+    """
+    try:
+        files = get_source_files(obs_id)
+    except Exception as e:
+        print(f"could not list the source files of {obs_id}: {e}")
+        return None
+    file_stats = stat_files(files, threads=threads)
+    digest = get_source_digest(file_stats)
+    write_json(
+        Path(index_dir).joinpath(obs_id, SOURCES_FILE_NAME),
+        {"digest": digest, "time": datetime.now().isoformat(), "files": file_stats},
+    )
+    return digest
+
+
+def get_entry_file(
+    obs_id: str, var: str, index_dir: str | Path = CACHE_INDEX_DIR
+) -> Path:
+    """return the index file of the cache file of an obs network and variable"""
+    return Path(index_dir).joinpath(obs_id, f"{var}.json")
+
+
+def is_fresh(
+    obs_id: str, var: str, digest: str, index_dir: str | Path = CACHE_INDEX_DIR
+) -> bool:
+    """check if the cache file of an obs network and variable was created from the current sources"""
+    try:
+        with open(get_entry_file(obs_id, var, index_dir), "r") as inhandle:
+            return json.load(inhandle)["digest"] == digest
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def filter_stale_requests(
+    requests: dict,
+    index_dir: str | Path = CACHE_INDEX_DIR,
+    threads: int = FRESHNESS_THREADS,
+) -> tuple[dict, dict]:
+    """reduce cache requests (see cache_tools.write_cache_scripts) to the stale variables
+
+    returns the reduced requests and a dict with the obs network as key and the digest
+    of its current source files as value (to be stored once the cache files are created)
+    pyaro requests and obs networks whose sources can't be listed are kept as they are
+    """
+    stale_requests = {}
+    digests = {}
+    for obs_network, request in requests.items():
+        if "pyaro_config" in request or "pyaro_config_file" in request:
+            stale_requests[obs_network] = request
+            continue
+        obs_id = request.get("obs_id", obs_network)
+        digest = scan_sources(obs_id, index_dir=index_dir, threads=threads)
+        if digest is None:
+            stale_requests[obs_network] = request
+            continue
+        digests[obs_network] = digest
+        obs_vars = [
+            var
+            for var in request["obs_vars"]
+            if not is_fresh(obs_id, var, digest, index_dir=index_dir)
+        ]
+        fresh_vars = [var for var in request["obs_vars"] if var not in obs_vars]
+        if fresh_vars:
+            print(f"cache files of {obs_id} are up to date for {', '.join(fresh_vars)}")
+        if obs_vars:
+            stale_requests[obs_network] = {**request, "obs_vars": obs_vars}
+    return stale_requests, digests
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+bookkeeping of the ids of submitted queue jobs
+
+qsub prints `Your job <id> ("<name>") has been submitted` for every submitted job.
+The ids are parsed from that output and kept per job name, so that the hold lists
+(-hold_jid) of jobs submitted later use the exact ids of the jobs they wait for
+instead of job name patterns. Entries without a submitted job (e.g. in dry runs)
+are kept as job names / patterns.
+"""
+from __future__ import annotations
+
+import re
+from fnmatch import fnmatchcase
+
+# qsub output of a submitted job (array jobs add the task range to the id)
+QSUB_OUTPUT_PATTERN = re.compile(
+    r'Your job(?:-array)? (\d+)(?:\.[\d:-]+)? \("([^"]*)"\) has been submitted'
+)
+
+# ids of the jobs submitted by this process; key: job name
+_JOB_IDS = {}
+
+
+def register_qsub_output(output: str | bytes) -> dict:
+    """parse the output of qsub and register the ids of the submitted jobs
+
+    returns a dict with the job name as key and the job id as value
+    """
+    if isinstance(output, bytes):
+        output = output.decode("utf-8", errors="replace")
+    jobs = {name: job_id for job_id, name in QSUB_OUTPUT_PATTERN.findall(output)}
+    for name, job_id in jobs.items():
+        print(f"submitted job {name} with id {job_id}")
+    _JOB_IDS.update(jobs)
+    return jobs
+
+
+def get_job_id(name: str) -> str | None:
+    """return the id of a submitted job or None"""
+    return _JOB_IDS.get(name)
+
+
+def resolve_hold_jid(hold_jid: str | None) -> str | None:
+    """replace the job names and name patterns of a hold list by the ids of the submitted jobs
+
+    hold_jid is a comma separated list of job names (wildcards allowed)
+    entries that don't match any submitted job are kept as they are
+    """
+    if not hold_jid:
+        return hold_jid
+    entries = []
+    for entry in hold_jid.split(","):
+        if not entry:
+            continue
+        job_ids = [
+            job_id for name, job_id in _JOB_IDS.items() if fnmatchcase(name, entry)
+        ]
+        if job_ids:
+            entries += job_ids
+        else:
+            entries.append(entry)
+    return ",".join(dict.fromkeys(entries))
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+model pre-read stage
+
+Every analysis job of a model reads the model data again (often through an expensive
+reader like the one of EMEP). With the pre-read stage, one job per model reads the
+model variables needed by all obs networks of a config once, exactly as the
+colocation would (pyaerocom's Colocator incl. model_read_aux, model_read_opts and
+model_kwargs), and writes them as plain aerocom3 netcdf files. The analysis jobs wait
+for the pre-read job and read these files with ReadGridded instead.
+
+The subsets are stored under the hash of the model entry, the global config
+settings and the names, modification times and sizes of the model files of the
+needed variables (as listed by ReadGridded, see freshness.py), so runs with the same
+settings share them. Several pre-read jobs of the same subset directory
+(e.g. of concurrent runs) add the missing variables one after the other.
+An analysis job reads the original model data if not all of its variables were
+pre-read.
+
+Layout (in MODEL_PREREAD_DIR):
+<hash>/<idx>/aerocom3_*.nc: the subsets (one directory per model data directory)
+<hash>/preread.json: the pre-read variables (written after the subsets)
+locks/<hash>.lock: lock of a subset directory being written
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import time
+from functools import lru_cache
+from pathlib import Path
+
+import simplejson as json
+
+from aeroval_parallelize.cache_pool import cache_pool_lock
+from aeroval_parallelize.const import (
+    CFG_JSON_EXT,
+    DEFAULT_ANA_RAM,
+    DEFAULT_PYTHON,
+    MODEL_PREREAD_DIR,
+    QSUB_QUEUE_NAME,
+    RND,
+)
+from aeroval_parallelize.freshness import get_source_digest, stat_files
+from aeroval_parallelize.planning import get_obs_vars
+from aeroval_parallelize.serializer import write_config_file
+from aeroval_parallelize.sharding import SHARD_COLDATA_KEY
+
+# key in the configs of the analysis jobs with the model name as key and the subset
+# directory as value; it's removed from the config before the analysis is run
+PREREAD_KEY = "model_preread_dirs"
+# job name start of the pre-read jobs
+PREREAD_JOB_START = f"pya_{RND}_preread_"
+# file listing the pre-read variables of a subset directory
+PREREAD_MANIFEST = "preread.json"
+# pyaerocom's default obs_vert_type
+DEFAULT_VERT_TYPE = "Surface"
+# global config keys that do not change the model data read
+PREREAD_IGNORE_KEYS = [
+    "json_basedir",
+    "coldata_basedir",
+    "proj_id",
+    "exp_id",
+    "exp_name",
+    "exp_descr",
+    "exp_pi",
+    "public",
+    "var_order_menu",
+    "model_order_menu",
+    "obs_order_menu",
+    "model_cfg",
+    "obs_cfg",
+    "plot_types",
+    PREREAD_KEY,
+    SHARD_COLDATA_KEY,
+]
+# model entry keys already applied by the pre-read
+PREREAD_APPLIED_KEYS = ["model_kwargs", "model_read_opts", "model_read_aux"]
+
+
+def get_preread_vars(model_entry: dict, obs_cfg: dict) -> dict:
+    """return the model variables and vertical types the obs networks of obs_cfg need
+
+    returns a dict with <model var>:<vertical type> as key and [model var, vertical type]
+    as value
+    """
+    model_use_vars = model_entry.get("model_use_vars", {})
+    model_add_vars = model_entry.get("model_add_vars", {})
+    preread_vars = {}
+    for obs_entry in obs_cfg.values():
+        vert_type = obs_entry.get("obs_vert_type", DEFAULT_VERT_TYPE)
+        for obs_var in get_obs_vars(obs_entry):
+            for model_var in [
+                model_use_vars.get(obs_var, obs_var),
+                *model_add_vars.get(obs_var, []),
+            ]:
+                preread_vars[f"{model_var}:{vert_type}"] = [model_var, vert_type]
+    return preread_vars
+
+
+def get_model_data_dirs(model_entry: dict) -> list[str]:
+    """return the model_data_dir of a model entry as list"""
+    data_dirs = model_entry.get("model_data_dir") or []
+    if isinstance(data_dirs, str):
+        return [data_dirs]
+    return list(data_dirs)
+
+
+@lru_cache(maxsize=None)
+def get_model_file_stats(
+    model_id: str, model_data_dir: str | None, var_names: tuple
+) -> dict:
+    """return the stats of the model files of var_names (see freshness.stat_files)
+
+    the files are listed by pyaerocom's ReadGridded; the data directory itself is
+    stat'ed if no files are found (e.g. models read by other readers)
+    """
+    # to avoid that lustre access is checked if the module is just imported
+    from pyaerocom.io import ReadGridded
+
+    files = []
+    try:
+        reader = ReadGridded(data_id=model_id, data_dir=model_data_dir)
+        file_info = reader.file_info
+        file_names = set(
+            file_info.loc[file_info["var_name"].isin(var_names), "filename"]
+        )
+        files = [
+            str(_file)
+            for _file in reader.files
+            if os.path.basename(_file) in file_names
+        ]
+    except Exception as e:
+        # pyaerocom raises different exceptions if there's no data
+        print(f"could not list the model files of {model_id}: {e}")
+    if not files and model_data_dir is not None:
+        files = [model_data_dir]
+    return stat_files(files)
+
+
+def get_preread_hash(cfg: dict, model_name: str, preread_vars: dict) -> str:
+    """return the hash of the model data read for a model of an aeroval config
+
+    the stats of the model files of the variables in preread_vars (see
+    get_preread_vars) are included, so that added or changed files lead to a new subset
+    """
+    model_entry = cfg["model_cfg"][model_name]
+    hash_cfg = {
+        key: value for key, value in cfg.items() if key not in PREREAD_IGNORE_KEYS
+    }
+    hash_cfg["model_entry"] = model_entry
+    # the variables read_aux computes a variable from are read from files as well
+    var_names = {model_var for model_var, _ in preread_vars.values()}
+    for model_var in list(var_names):
+        aux = model_entry.get("model_read_aux", {}).get(model_var, {})
+        var_names.update(aux.get("vars_required", []))
+    hash_cfg["data_stats"] = [
+        get_source_digest(
+            get_model_file_stats(
+                model_entry["model_id"], data_dir, tuple(sorted(var_names))
+            )
+        )
+        for data_dir in get_model_data_dirs(model_entry) or [None]
+    ]
+    json_str = json.dumps(
+        hash_cfg, sort_keys=True, ensure_ascii=False, allow_nan=True, default=str
+    )
+    return hashlib.sha256(json_str.encode("utf-8")).hexdigest()
+
+
+def get_preread_job_name(preread_hash: str, preread_vars: dict) -> str:
+    """return the name of the pre-read job of a subset directory and variables"""
+    vars_hash = hashlib.sha256(",".join(sorted(preread_vars)).encode()).hexdigest()
+    return f"{PREREAD_JOB_START}{preread_hash[:8]}_{vars_hash[:8]}"
+
+
+def plan_preread(
+    unit_cfg: dict,
+    cfg: dict,
+    preread_dir: str | Path = MODEL_PREREAD_DIR,
+    requests: dict = None,
+) -> list[str]:
+    """plan the pre-read of the models of a unit
+
+    the subset directories are added to unit_cfg (PREREAD_KEY); the variables of all
+    obs networks of the config cfg the unit belongs to are pre-read
+    requests is updated with the job name as key and the config of the pre-read job
+    as value; models using climatologies (globally or in their model entry) are not
+    pre-read
+    returns the names of the pre-read jobs the unit has to wait for
+    """
+    if requests is None:
+        requests = {}
+    if unit_cfg.get("model_use_climatology", False):
+        return []
+    job_names = []
+    for model_name, model_entry in unit_cfg["model_cfg"].items():
+        if model_entry.get("model_use_climatology", False):
+            continue
+        preread_vars = get_preread_vars(model_entry, cfg["obs_cfg"])
+        preread_hash = get_preread_hash(unit_cfg, model_name, preread_vars)
+        model_dir = Path(preread_dir).joinpath(preread_hash)
+        unit_cfg.setdefault(PREREAD_KEY, {})[model_name] = str(model_dir)
+        job_name = get_preread_job_name(preread_hash, preread_vars)
+        if job_name not in requests:
+            requests[job_name] = {
+                **{
+                    key: value
+                    for key, value in unit_cfg.items()
+                    if key not in [PREREAD_KEY, SHARD_COLDATA_KEY]
+                },
+                "model_cfg": {model_name: model_entry},
+                "obs_cfg": cfg["obs_cfg"],
+                # pyaerocom's output handling must not touch the unit's directories
+                "json_basedir": str(model_dir.joinpath("json")),
+                "coldata_basedir": str(model_dir.joinpath("coldata")),
+                PREREAD_KEY: {model_name: str(model_dir)},
+            }
+        job_names.append(job_name)
+    return job_names
+
+
+def read_manifest(model_dir: str | Path) -> dict | None:
+    """return the manifest of a subset directory; None if there's none"""
+    try:
+        with open(Path(model_dir).joinpath(PREREAD_MANIFEST), "r") as inhandle:
+            return json.load(inhandle)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(model_dir: str | Path, manifest: dict) -> None:
+    """write the manifest of a subset directory atomically"""
+    outfile = Path(model_dir).joinpath(PREREAD_MANIFEST)
+    tmp_file = outfile.with_name(f"{outfile.name}.{os.getpid()}")
+    with open(tmp_file, "w", encoding="utf-8") as outhandle:
+        json.dump(manifest, outhandle)
+    os.replace(tmp_file, outfile)
+
+
+def write_preread(cfg: dict) -> dict:
+    """read the model variables of a pre-read job config and write them to its subset directories
+
+    variables pre-read already are skipped; variables that can't be read are left
+    out (the analysis jobs needing them read the original model data then)
+    returns a dict with the model name as key and the manifest as value
+    """
+    # to avoid that lustre access is checked if the module is just imported
+    from pyaerocom.aeroval import EvalSetup
+    from pyaerocom.aeroval._processing_base import DataImporter
+
+    stp = EvalSetup(**{key: value for key, value in cfg.items() if key != PREREAD_KEY})
+    importer = DataImporter(stp)
+    manifests = {}
+    for model_name, model_dir in cfg[PREREAD_KEY].items():
+        model_entry = cfg["model_cfg"][model_name]
+        model_dir = Path(model_dir)
+        model_dir.mkdir(parents=True, exist_ok=True)
+        with cache_pool_lock(model_dir.name, pool_dir=model_dir.parent):
+            manifest = read_manifest(model_dir) or {
+                "model_id": model_entry["model_id"],
+                "vars": {},
+            }
+            missing_vars = {
+                key: value
+                for key, value in get_preread_vars(model_entry, cfg["obs_cfg"]).items()
+                if key not in manifest["vars"]
+            }
+            vert_types = dict.fromkeys(vert for _, vert in missing_vars.values())
+            for vert_type in vert_types:
+                # the vertical type is the only obs setting used to read model data
+                col = importer.get_colocator(model_name=model_name)
+                col.colocation_setup.obs_vert_type = vert_type
+                for key, (model_var, vert) in missing_vars.items():
+                    if vert != vert_type:
+                        continue
+                    start_time = time.perf_counter()
+                    try:
+                        data = col.get_model_data(model_var)
+                        # one child per model data directory
+                        children = getattr(data, "children", [data])
+                        for idx, child in enumerate(children):
+                            out_dir = model_dir.joinpath(str(idx))
+                            out_dir.mkdir(parents=True, exist_ok=True)
+                            child.to_netcdf(
+                                str(out_dir),
+                                data_id=model_entry["model_id"],
+                                vert_code=child.metadata.get("vert_code") or vert,
+                            )
+                    except Exception as e:
+                        print(
+                            f"could not pre-read {model_var} ({vert}) of {model_name}: {e}"
+                        )
+                        continue
+                    manifest["vars"][key] = len(children)
+                    print(
+                        f"pre-read {model_var} ({vert}) of {model_name} "
+                        f"in {time.perf_counter() - start_time:.1f}s"
+                    )
+            # the variables are usable as soon as they are in the manifest
+            write_manifest(model_dir, manifest)
+        manifests[model_name] = manifest
+    return manifests
+
+
+def get_preread_entry(model_entry: dict, model_dir: str | Path, dir_no: int) -> dict:
+    """return the model entry reading the subsets in model_dir with ReadGridded"""
+    preread_entry = {
+        key: value
+        for key, value in model_entry.items()
+        if key not in PREREAD_APPLIED_KEYS
+    }
+    data_dirs = [str(Path(model_dir).joinpath(str(idx))) for idx in range(dir_no)]
+    preread_entry["model_data_dir"] = data_dirs[0] if dir_no == 1 else data_dirs
+    if "gridded_reader_id" in model_entry:
+        preread_entry["gridded_reader_id"] = {
+            **model_entry["gridded_reader_id"],
+            "model": "ReadGridded",
+        }
+    return preread_entry
+
+
+def apply_preread(cfg: dict) -> dict:
+    """let the models of an aeroval config read their pre-read subsets (see PREREAD_KEY)
+
+    models with variables that were not pre-read read the original model data
+    the config is changed in place and returned
+    """
+    for model_name, model_dir in cfg.pop(PREREAD_KEY, {}).items():
+        model_entry = cfg["model_cfg"].get(model_name)
+        if model_entry is None:
+            continue
+        manifest = read_manifest(model_dir)
+        needed_vars = get_preread_vars(model_entry, cfg["obs_cfg"])
+        if manifest is None or any(key not in manifest["vars"] for key in needed_vars):
+            print(f"{model_name} was not pre-read completely; reading the model data")
+            continue
+        dir_no = max([manifest["vars"][key] for key in needed_vars] or [1])
+        print(f"reading {model_name} from {model_dir}")
+        cfg["model_cfg"][model_name] = get_preread_entry(model_entry, model_dir, dir_no)
+    return cfg
+
+
+def write_preread_scripts(
+    requests: dict, tempdir: str | Path, use_module: bool = True
+) -> list[Path]:
+    """write the config file and the script of every pre-read job
+
+    returns the list of scripts (named after the job)
+    """
+    import stat
+
+    if use_module:
+        shebang = f"#!/usr/bin/env {DEFAULT_PYTHON}"
+    else:
+        shebang = "#!/usr/bin/env python"
+
+    scripts = []
+    for job_name, preread_cfg in requests.items():
+        conffile = Path(tempdir).joinpath(f"{job_name}{CFG_JSON_EXT}")
+        write_config_file(preread_cfg, conffile)
+        script = Path(tempdir).joinpath(f"{job_name}.py")
+        script_proto = f"""{shebang}
+
+from aeroval_parallelize.model_preread import write_preread
+from aeroval_parallelize.serializer import read_config_file
+
+def main():
+    write_preread(read_config_file({str(conffile)!r}))
+
+if __name__ == "__main__":
+    main()
+"""
+        with open(script, "w") as f:
+            f.write(script_proto)
+        # make executable
+        st = os.stat(script)
+        os.chmod(script, st.st_mode | stat.S_IEXEC)
+        print(f"wrote pre-read job {script}")
+        scripts.append(script)
+    return scripts
+
+
+def create_preread_jobs(
+    requests: dict,
+    tempdir: str | Path,
+    qsub_queue: str = QSUB_QUEUE_NAME,
+    submit_flag: bool = False,
+    options: dict = {},
+) -> list[Path]:
+    """write and submit the pre-read jobs (see plan_preread)
+
+    options: queue options of cache_tools.run_queue (env_mod, qsub_ram and optionally
+    qsub_priority)
+    returns the list of scripts
+    """
+    from aeroval_parallelize.cache_tools import run_queue
+
+    scripts = write_preread_scripts(requests, tempdir)
+    run_queue(
+        scripts,
+        qsub_queue=qsub_queue,
+        submit_flag=submit_flag,
+        options={"qsub_ram": DEFAULT_ANA_RAM, **options},
+    )
+    return scripts
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+content addressed store for the output of the analysis jobs
+
+The aeroval config of each job is hashed after normalisation (removal of the
+run specific directories). After a successful run the json output of the job is
+copied to the store under that hash, so that later runs using the same config
+can skip the job and hand the stored output directly to the data assembly.
+
+The hash is computed when the jobs are planned and handed to the job in its config
+(STORE_HASH_KEY), since the job changes its config before the run (e.g. to read
+pre-read model data or pyaro snapshots).
+
+Changes of the model or obs data itself are not detected!
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+from pathlib import Path
+
+import simplejson as json
+
+from aeroval_parallelize.model_preread import PREREAD_KEY
+from aeroval_parallelize.sharding import SHARD_COLDATA_KEY
+
+# key in the configs of the analysis jobs holding the hash of the config as planned;
+# it's removed from the config before the analysis is run
+STORE_HASH_KEY = "output_store_hash"
+# config keys that differ between runs, but do not change the output
+NORMALISE_EXCLUDE_KEYS = [
+    "json_basedir",
+    "coldata_basedir",
+    SHARD_COLDATA_KEY,
+    PREREAD_KEY,
+    STORE_HASH_KEY,
+]
+# config keys that point to files whose content needs to be part of the hash
+NORMALISE_FILE_KEYS = ["io_aux_file"]
+# extension of the file marking a complete store entry
+# (next to the entry to keep the entry identical to a json_basedir)
+STORE_COMPLETE_EXT = ".complete"
+
+
+def normalise_config(obj):
+    """return a json serialisable, order independent representation of an aeroval config"""
+    if isinstance(obj, dict):
+        return {
+            str(key): normalise_config(obj[key])
+            for key in sorted(obj, key=str)
+            if key not in NORMALISE_EXCLUDE_KEYS
+        }
+    elif isinstance(obj, (list, tuple)):
+        return [normalise_config(item) for item in obj]
+    elif isinstance(obj, (set, frozenset)):
+        return sorted(normalise_config(item) for item in obj)
+    elif hasattr(obj, "model_dump"):
+        # pydantic models like the PyaroConfig
+        return normalise_config(obj.model_dump())
+    elif obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    return str(obj)
+
+
+def get_config_hash(cfg: dict) -> str:
+    """return the content hash of an aeroval config"""
+    norm_cfg = normalise_config(cfg)
+    for key in NORMALISE_FILE_KEYS:
+        if key in cfg and cfg[key] is not None and os.path.isfile(cfg[key]):
+            with open(cfg[key], "rb") as inhandle:
+                norm_cfg[key] = hashlib.sha256(inhandle.read()).hexdigest()
+    json_str = json.dumps(norm_cfg, sort_keys=True, ensure_ascii=False, allow_nan=True)
+    return hashlib.sha256(json_str.encode("utf-8")).hexdigest()
+
+
+def get_store_path(store_dir: str | Path, cfg_hash: str) -> Path:
+    """return the directory of a store entry"""
+    return Path(store_dir).joinpath(cfg_hash[:2], cfg_hash)
+
+
+def is_stored(store_dir: str | Path, cfg_hash: str) -> bool:
+    """check if the store has a complete entry for cfg_hash"""
+    entry_path = get_store_path(store_dir, cfg_hash)
+    return entry_path.with_name(f"{entry_path.name}{STORE_COMPLETE_EXT}").exists()
+
+
+def store_output(cfg: dict, store_dir: str | Path, cfg_hash: str | None = None) -> Path:
+    """copy the json output of a finished aeroval config to the store
+
+    cfg_hash: hash of the config as planned (see STORE_HASH_KEY); computed from cfg if None
+    returns the path of the store entry
+    """
+    if cfg_hash is None:
+        cfg_hash = get_config_hash(cfg)
+    entry_path = get_store_path(store_dir, cfg_hash)
+    if is_stored(store_dir, cfg_hash):
+        return entry_path
+
+    # copy to a temporary directory first and rename that, so that an entry
+    # is never seen half written
+    entry_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = entry_path.with_name(f"{entry_path.name}.{os.getpid()}")
+    shutil.copytree(cfg["json_basedir"], tmp_path, dirs_exist_ok=True)
+    try:
+        os.rename(tmp_path, entry_path)
+    except OSError:
+        # another job stored the same config in the meantime
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    entry_path.with_name(f"{entry_path.name}{STORE_COMPLETE_EXT}").touch()
+    return entry_path
+
+
+def link_stored_output(
+    store_dir: str | Path, cfg_hash: str, json_run_dir: str | Path
+) -> None:
+    """make a stored output available as json_run_dir for the data assembly"""
+    Path(json_run_dir).parent.mkdir(parents=True, exist_ok=True)
+    os.symlink(get_store_path(store_dir, cfg_hash), json_run_dir)
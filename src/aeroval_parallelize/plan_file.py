@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+bundled plan file for aeroval parallelisation
+
+All aeroval configs of a parallel run are stored in a single file instead of one
+file per job. The file consists of the encoded configs, followed by an index (json)
+and a fixed width trailer with the offset of the index:
+
+<config 1><config 2>...<index>\\n<offset of index>\\n
+
+A job reads the trailer, the index and its own config only.
+Configs are referenced by a plan entry path: <plan directory>/<entry name>PLAN_ENTRY_EXT
+(a file name that does not exist on disk).
+"""
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import simplejson as json
+
+from aeroval_parallelize.const import PLAN_ENTRY_EXT, PLAN_EXT
+from aeroval_parallelize.serializer import decode_config, encode_config
+
+# name of the plan file within the plan directory
+PLAN_FILE_NAME = f"plan{PLAN_EXT}"
+# width of the trailer holding the index offset (without newline)
+PLAN_TRAILER_WIDTH = 20
+# minimal number of entries to encode with a process pool
+PLAN_PARALLEL_MIN_ENTRIES = 64
+
+
+def encode_entries(cfgs: list[dict], processes: int | None = None) -> list[str]:
+    """encode configs; in parallel if there's enough of them"""
+    if len(cfgs) < PLAN_PARALLEL_MIN_ENTRIES or processes == 1:
+        return [encode_config(cfg) for cfg in cfgs]
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(encode_config, cfgs, chunksize=16))
+
+
+def write_plan(
+    plan_dir: str | Path, entries: dict, processes: int | None = None
+) -> Path:
+    """write all configs to the plan file in plan_dir
+
+    entries is a dict with the entry name as key and the aeroval config as value
+    returns the path of the plan file
+    """
+    plan_file = Path(plan_dir).joinpath(PLAN_FILE_NAME)
+    names = list(entries)
+    encoded = encode_entries([entries[name] for name in names], processes=processes)
+
+    index = {}
+    offset = 0
+    with open(plan_file, "wb") as outhandle:
+        for name, json_string in zip(names, encoded):
+            data = json_string.encode("utf-8")
+            outhandle.write(data)
+            outhandle.write(b"\n")
+            index[name] = [offset, len(data)]
+            offset += len(data) + 1
+        outhandle.write(json.dumps({"entries": index, "order": names}).encode("utf-8"))
+        outhandle.write(f"\n{offset:0{PLAN_TRAILER_WIDTH}d}\n".encode("utf-8"))
+    print(f"wrote {len(names)} configs to {plan_file}")
+    return plan_file
+
+
+def read_plan_index(plan_file: str | Path) -> dict:
+    """return the index of a plan file"""
+    with open(plan_file, "rb") as inhandle:
+        file_len = inhandle.seek(0, 2)
+        inhandle.seek(file_len - PLAN_TRAILER_WIDTH - 1)
+        index_offset = int(inhandle.read(PLAN_TRAILER_WIDTH))
+        inhandle.seek(index_offset)
+        index_len = file_len - index_offset - PLAN_TRAILER_WIDTH - 2
+        return json.loads(inhandle.read(index_len).decode("utf-8"))
+
+
+def read_plan_entry(plan_file: str | Path, entry: str | int) -> dict:
+    """read a single config from a plan file
+
+    entry is either the entry name or its position in the plan
+    """
+    index = read_plan_index(plan_file)
+    if isinstance(entry, int):
+        entry = index["order"][entry]
+    offset, length = index["entries"][entry]
+    with open(plan_file, "rb") as inhandle:
+        inhandle.seek(offset)
+        json_string = inhandle.read(length).decode("utf-8")
+    return decode_config(json_string)
+
+
+def get_plan_entry_path(plan_dir: str | Path, name: str) -> Path:
+    """return the path referencing a plan entry"""
+    return Path(plan_dir).joinpath(f"{name}{PLAN_ENTRY_EXT}")
+
+
+def read_plan_entry_path(entry_path: str | Path) -> dict:
+    """read the config referenced by a plan entry path"""
+    entry_path = Path(entry_path)
+    return read_plan_entry(entry_path.parent.joinpath(PLAN_FILE_NAME), entry_path.stem)
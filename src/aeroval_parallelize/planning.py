@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+job planning for aeroval parallelisation
+
+- estimate the cost (runtime) of a single model / obs network combination (unit)
+- split units that would run longer than the target wall time
+- pack small units into one queue job so that they share the job overhead
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from copy import deepcopy
+from functools import lru_cache
+from math import ceil
+from pathlib import Path
+
+import simplejson as json
+
+from aeroval_parallelize.const import (
+    DEFAULT_JOB_WALLTIME,
+    RUNTIME_HISTORY_DIR,
+)
+
+# fixed cost [s] of every queue job (module load, pyaerocom import, lustre checks)
+JOB_OVERHEAD = 300
+# cost [s] of one variable and one year for an average obs network
+VAR_YEAR_COST = 180
+# cost [s] per GB of model data
+MODEL_GB_COST = 30
+# relative cost of obs networks with many stations
+# matched case insensitive against the start of the pyaerocom obs_id
+OBS_NETWORK_COST_WEIGHTS = {
+    "EEA": 8.0,
+    "AirNow": 6.0,
+    "EBAS": 4.0,
+    "CNEMC": 4.0,
+    "MEP": 2.0,
+}
+# weight of the last runtime in the runtime history
+RUNTIME_HISTORY_WEIGHT = 0.5
+
+
+def get_obs_vars(obs_entry: dict) -> list[str]:
+    """small helper to return the obs_vars of an obs_cfg entry as list"""
+    obs_vars = obs_entry.get("obs_vars", [])
+    if isinstance(obs_vars, str):
+        return [obs_vars]
+    return list(obs_vars)
+
+
+def get_years(cfg: dict) -> set[int]:
+    """return the years covered by the periods of an aeroval config"""
+    years = set()
+    for period in cfg.get("periods", []):
+        parts = str(period).split("-")
+        try:
+            start, stop = int(parts[0][:4]), int(parts[-1][:4])
+        except ValueError:
+            continue
+        years.update(range(start, stop + 1))
+
+    if not years and "start" in cfg:
+        try:
+            start = int(str(cfg["start"])[:4])
+            stop = int(str(cfg.get("stop", cfg["start"]))[:4])
+            years.update(range(start, stop + 1))
+        except ValueError:
+            pass
+
+    return years
+
+
+def get_period_years(cfg: dict) -> int:
+    """return the number of years covered by the periods of an aeroval config"""
+    return max(len(get_years(cfg)), 1)
+
+
+@lru_cache(maxsize=None)
+def get_dir_volume(data_dir: str) -> float:
+    """return the size of all files below data_dir in GB"""
+    size = 0
+    for root, _, files in os.walk(data_dir):
+        for _file in files:
+            try:
+                size += os.stat(os.path.join(root, _file)).st_size
+            except OSError:
+                continue
+    return size / 1024**3
+
+
+def get_runtime_key(cfg: dict) -> str:
+    """return the key under which the runtime of an aeroval config is stored
+
+    The key is build from the model ids, the obs ids and variables and the periods,
+    so that it stays the same between runs using different directories
+    """
+    key_list = [
+        sorted(
+            str(entry.get("model_id", model))
+            for model, entry in cfg["model_cfg"].items()
+        ),
+        sorted(
+            [str(entry.get("obs_id", obs)), sorted(get_obs_vars(entry))]
+            for obs, entry in cfg["obs_cfg"].items()
+        ),
+        sorted(map(str, cfg.get("periods", []))),
+    ]
+    return hashlib.sha256(json.dumps(key_list).encode("utf-8")).hexdigest()
+
+
+def read_runtime(cfg: dict, history_dir: str | Path = RUNTIME_HISTORY_DIR) -> float:
+    """return the runtime [s] of an earlier run of the same config or None"""
+    history_file = Path(history_dir).joinpath(f"{get_runtime_key(cfg)}.json")
+    try:
+        with open(history_file, "r") as inhandle:
+            return float(json.load(inhandle)["runtime"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def record_runtime(
+    cfg: dict, runtime: float, history_dir: str | Path = RUNTIME_HISTORY_DIR
+) -> None:
+    """store the runtime [s] of a finished aeroval config in the runtime history"""
+    Path(history_dir).mkdir(parents=True, exist_ok=True)
+    last_runtime = read_runtime(cfg, history_dir=history_dir)
+    if last_runtime is not None:
+        runtime = (
+            RUNTIME_HISTORY_WEIGHT * runtime
+            + (1.0 - RUNTIME_HISTORY_WEIGHT) * last_runtime
+        )
+    history_file = Path(history_dir).joinpath(f"{get_runtime_key(cfg)}.json")
+    # write to a temporary file first; several jobs might finish at the same time
+    tmp_file = history_file.with_name(f"{history_file.name}.{os.getpid()}")
+    with open(tmp_file, "w", encoding="utf-8") as outhandle:
+        json.dump({"runtime": runtime}, outhandle)
+    os.replace(tmp_file, history_file)
+
+
+def estimate_unit_cost(
+    cfg: dict,
+    history_dir: str | Path | None = RUNTIME_HISTORY_DIR,
+    model_volume: bool = True,
+) -> float:
+    """estimate the runtime [s] of an aeroval config without the job overhead
+
+    uses the runtime of an earlier run if available. Otherwise the cost is estimated
+    from the number of variables, the period length, the obs network and the volume
+    of the model data (if model_data_dir is given in the model entry)
+
+    set model_volume to False to skip the model data volume; walking the model
+    directories is slow on lustre and not needed if the cost is just used for sorting
+    """
+    if history_dir is not None:
+        runtime = read_runtime(cfg, history_dir=history_dir)
+        if runtime is not None:
+            return runtime
+
+    years = get_period_years(cfg)
+    cost = 0.0
+    for obs_entry in cfg["obs_cfg"].values():
+        if obs_entry.get("is_superobs", False):
+            continue
+        weight = 1.0
+        for network, network_weight in OBS_NETWORK_COST_WEIGHTS.items():
+            if str(obs_entry.get("obs_id", "")).lower().startswith(network.lower()):
+                weight = network_weight
+                break
+        cost += VAR_YEAR_COST * len(get_obs_vars(obs_entry)) * years * weight
+
+    if not model_volume:
+        return cost
+
+    for model_entry in cfg["model_cfg"].values():
+        if "model_data_dir" in model_entry:
+            cost += MODEL_GB_COST * get_dir_volume(str(model_entry["model_data_dir"]))
+
+    return cost
+
+
+def split_units(
+    units: list[dict],
+    walltime: float = DEFAULT_JOB_WALLTIME * 3600,
+    history_dir: str | Path | None = RUNTIME_HISTORY_DIR,
+) -> list[dict]:
+    """split units whose estimated cost exceeds the wall time along the obs variables
+
+    Only units with a single obs network are split, since the members of a superobs
+    need to be run together.
+    returns the new list of units; the estimated cost is added to each unit
+    """
+    work_time = max(walltime - JOB_OVERHEAD, 1.0)
+    ret_units = []
+    for unit in units:
+        cost = estimate_unit_cost(unit["cfg"], history_dir=history_dir)
+        obs_networks = list(unit["cfg"]["obs_cfg"])
+        if cost <= work_time or len(obs_networks) != 1:
+            unit["cost"] = cost
+            ret_units.append(unit)
+            continue
+
+        obs_vars = get_obs_vars(unit["cfg"]["obs_cfg"][obs_networks[0]])
+        part_no = min(ceil(cost / work_time), len(obs_vars))
+        if part_no <= 1:
+            unit["cost"] = cost
+            ret_units.append(unit)
+            continue
+
+        for part_idx in range(part_no):
+            part_unit = deepcopy(unit)
+            part_unit["name"] = f"{unit['name']}_{part_idx + 1:02d}"
+            part_unit["cfg"]["obs_cfg"][obs_networks[0]]["obs_vars"] = obs_vars[
+                part_idx::part_no
+            ]
+            part_unit["cost"] = estimate_unit_cost(
+                part_unit["cfg"], history_dir=history_dir
+            )
+            ret_units.append(part_unit)
+
+    return ret_units
+
+
+def pack_units(
+    costs: dict,
+    walltime: float = DEFAULT_JOB_WALLTIME * 3600,
+) -> list[list]:
+    """pack units into jobs using first fit decreasing
+
+    costs is a dict with the unit (e.g. the config file) as key and the
+    estimated cost [s] as value.
+    returns a list of jobs, each being a list of units
+    """
+    jobs = []
+    job_loads = []
+    for unit in sorted(costs, key=lambda x: costs[x], reverse=True):
+        for job_idx, job_load in enumerate(job_loads):
+            if JOB_OVERHEAD + job_load + costs[unit] <= walltime:
+                jobs[job_idx].append(unit)
+                job_loads[job_idx] += costs[unit]
+                break
+        else:
+            jobs.append([unit])
+            job_loads.append(costs[unit])
+
+    return jobs
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+pre-flight check of the data availability
+
+Before anything is submitted, an index of the available data (variables and years)
+is built for all models and gridded obs networks of a config (in parallel threads
+since that's mostly waiting for lustre). Model / obs units without model or gridded
+obs data for the periods of the config are dropped or just flagged.
+
+The index is cached on disk per model (obs network) and data directory and is rebuilt
+as soon as the modification time of the data directory changes.
+pyaerocom has no generic way to list the years of ungridded obs data without reading
+it, so ungridded obs networks are just checked for the support of the obs variables.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+import simplejson as json
+
+from aeroval_parallelize.const import DATA_INDEX_DIR
+from aeroval_parallelize.planning import get_obs_vars, get_years
+
+# year used by pyaerocom for climatological data
+CLIMATOLOGY_YEAR = 9999
+# maximum number of threads used to build the model data index
+PREFLIGHT_THREADS = 8
+# pre-flight modes: drop units without data or just print a warning
+PREFLIGHT_MODES = ["drop", "warn"]
+
+# in process cache; key: (model_id, model_data_dir), value: index
+_INDEX_CACHE = {}
+
+
+def get_index_file(model_id: str, model_data_dir: str | None, index_dir: str) -> Path:
+    """return the path of the disk cache file of a model's data index"""
+    key = f"{model_id}:{model_data_dir}"
+    return Path(index_dir).joinpath(f"{hashlib.sha256(key.encode()).hexdigest()}.json")
+
+
+def read_index_file(index_file: Path) -> dict | None:
+    """return a cached data index if it's still valid"""
+    try:
+        with open(index_file, "r", encoding="utf-8") as inhandle:
+            index = json.load(inhandle)
+        if os.stat(index["data_dir"]).st_mtime_ns == index["mtime"]:
+            return index
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def write_index_file(index_file: Path, index: dict) -> None:
+    """write a data index to the disk cache"""
+    try:
+        index_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = index_file.with_name(f"{index_file.name}.{os.getpid()}")
+        with open(tmp_file, "w", encoding="utf-8") as outhandle:
+            json.dump(index, outhandle)
+        os.replace(tmp_file, index_file)
+    except OSError as e:
+        print(f"could not write data index file {index_file}: {e}")
+
+
+def get_model_index(
+    model_id: str, model_data_dir: str | None = None, index_dir: str = DATA_INDEX_DIR
+) -> dict | None:
+    """return the data index of a model (or a gridded obs network)
+
+    the index is a dict with the keys
+    data_dir: data directory of the model
+    mtime: modification time of data_dir when the index was built
+    vars: dict with the variable name as key and the list of available years as value
+    vars_provided: all variables the model provides (incl. computed ones)
+    returns None if no data was found for the model
+    """
+    key = (model_id, model_data_dir)
+    if key in _INDEX_CACHE:
+        return _INDEX_CACHE[key]
+
+    index_file = get_index_file(model_id, model_data_dir, index_dir)
+    index = read_index_file(index_file)
+    if index is None:
+        from pyaerocom.io import ReadGridded
+
+        try:
+            reader = ReadGridded(data_id=model_id, data_dir=model_data_dir)
+            file_info = reader.file_info
+            index = {
+                "data_dir": str(reader.data_dir),
+                "mtime": os.stat(reader.data_dir).st_mtime_ns,
+                "vars": {},
+                "vars_provided": list(reader.vars_provided),
+            }
+        except Exception as e:
+            # pyaerocom raises different exceptions if there's no data
+            print(f"no data found for {model_id}: {e}")
+            _INDEX_CACHE[key] = None
+            return None
+
+        for var_name, year in zip(file_info["var_name"], file_info["year"]):
+            years = index["vars"].setdefault(var_name, [])
+            if int(year) not in years:
+                years.append(int(year))
+        write_index_file(index_file, index)
+
+    _INDEX_CACHE[key] = index
+    return index
+
+
+def build_model_indices(
+    model_cfg: dict, index_dir: str = DATA_INDEX_DIR, threads: int = PREFLIGHT_THREADS
+) -> dict:
+    """return the data indices of all models of a model_cfg; key: model name"""
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = {
+            model_name: executor.submit(
+                get_model_index,
+                entry["model_id"],
+                entry.get("model_data_dir"),
+                index_dir,
+            )
+            for model_name, entry in model_cfg.items()
+        }
+    return {model_name: future.result() for model_name, future in futures.items()}
+
+
+def is_gridded_obs(obs_entry: dict) -> bool:
+    """check if an obs_cfg entry is a gridded obs network (read with ReadGridded)"""
+    from pyaerocom import const
+
+    return (
+        "pyaro_config" not in obs_entry
+        and not obs_entry.get("is_superobs", False)
+        and obs_entry["obs_id"] not in const.OBS_IDS_UNGRIDDED
+    )
+
+
+def build_obs_indices(
+    obs_cfg: dict, index_dir: str = DATA_INDEX_DIR, threads: int = PREFLIGHT_THREADS
+) -> dict:
+    """return the data indices of the gridded obs networks of an obs_cfg; key: obs name"""
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = {
+            obs_name: executor.submit(
+                get_model_index,
+                entry["obs_id"],
+                entry.get("obs_data_dir"),
+                index_dir,
+            )
+            for obs_name, entry in obs_cfg.items()
+            if is_gridded_obs(entry)
+        }
+    return {obs_name: future.result() for obs_name, future in futures.items()}
+
+
+def has_years(index: dict, var_name: str, years: set) -> bool:
+    """check if a data index has data of var_name for any of years (or a climatology)"""
+    years_avail = set(index["vars"][var_name])
+    return not years or CLIMATOLOGY_YEAR in years_avail or bool(years & years_avail)
+
+
+@lru_cache(maxsize=None)
+def get_obs_vars_supported(obs_id: str, obs_vars: tuple) -> list[str] | None:
+    """return the variables an ungridded obs network supports
+
+    returns None if the obs network is unknown to ReadUngridded (e.g. gridded obs)
+    """
+    from pyaerocom import const
+    from pyaerocom.io import ReadUngridded
+
+    if obs_id not in const.OBS_IDS_UNGRIDDED:
+        return None
+    return list(ReadUngridded().get_vars_supported(obs_id, list(obs_vars)))
+
+
+def get_obs_problem(
+    obs_name: str,
+    obs_var: str,
+    supported: list | None,
+    obs_index: dict | None,
+    years: set,
+) -> str | None:
+    """return the problem of an obs variable without data or None"""
+    if supported is not None and obs_var not in supported:
+        return f"{obs_name} does not provide {obs_var}"
+    if obs_index is None:
+        return None
+    if obs_var in obs_index["vars"]:
+        if not has_years(obs_index, obs_var, years):
+            return f"{obs_name} has no {obs_var} data for {sorted(years)}"
+    elif obs_var not in obs_index["vars_provided"]:
+        return f"{obs_name} does not provide {obs_var}"
+    return None
+
+
+def get_unit_problems(
+    unit_cfg: dict, model_indices: dict, years: set, obs_indices: dict | None = None
+) -> tuple:
+    """check the data availability of a unit
+
+    obs_indices: data indices of the gridded obs networks (see build_obs_indices);
+    the years of obs networks without index are not checked
+    returns the number of checked variables and a list of problems
+    (one per variable without data)
+    """
+    if obs_indices is None:
+        obs_indices = {}
+    problems = []
+    var_no = 0
+    for model_name, model_entry in unit_cfg["model_cfg"].items():
+        index = model_indices.get(model_name)
+        model_use_vars = model_entry.get("model_use_vars", {})
+        model_read_aux = model_entry.get("model_read_aux", {})
+        for obs_name, obs_entry in unit_cfg["obs_cfg"].items():
+            if obs_entry.get("is_superobs", False):
+                continue
+            obs_vars = get_obs_vars(obs_entry)
+            supported = None
+            if "pyaro_config" not in obs_entry:
+                supported = get_obs_vars_supported(obs_entry["obs_id"], tuple(obs_vars))
+            for obs_var in obs_vars:
+                var_no += 1
+                model_var = model_use_vars.get(obs_var, obs_var)
+                obs_problem = get_obs_problem(
+                    obs_name, obs_var, supported, obs_indices.get(obs_name), years
+                )
+                if obs_problem is not None:
+                    problems.append(obs_problem)
+                elif index is None:
+                    problems.append(f"no data for model {model_name}")
+                elif model_var in index["vars"]:
+                    if not has_years(index, model_var, years):
+                        problems.append(
+                            f"{model_name} has no {model_var} data for {sorted(years)}"
+                        )
+                elif (
+                    model_var not in index["vars_provided"]
+                    and model_var not in model_read_aux
+                ):
+                    problems.append(f"{model_name} does not provide {model_var}")
+    return var_no, problems
+
+
+def preflight_units(
+    units, cfg: dict, mode: str = "drop", index_dir: str = DATA_INDEX_DIR
+):
+    """yield the units of a config that have data
+
+    units without data for any of their variables are dropped (mode "drop") or
+    yielded with a warning (mode "warn"). Units with missing data for some variables
+    are always yielded with a warning.
+    """
+    model_indices = build_model_indices(cfg["model_cfg"], index_dir=index_dir)
+    obs_indices = build_obs_indices(cfg["obs_cfg"], index_dir=index_dir)
+    years = get_years(cfg)
+    for unit in units:
+        var_no, problems = get_unit_problems(
+            unit["cfg"], model_indices, years, obs_indices=obs_indices
+        )
+        problem_str = "; ".join(dict.fromkeys(problems))
+        if problems and len(problems) >= var_no and mode == "drop":
+            print(f"dropping unit {unit['name']}: {problem_str}")
+            continue
+        if problems:
+            print(f"warning for unit {unit['name']}: {problem_str}")
+        yield unit
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+columnar snapshots of pyaro sources
+
+Many pyaro readers parse text files (e.g. csv) or download their data, and every
+cache and analysis job reading a pyaro obs network repeats that. A snapshot converts
+the source of a pyaro config once to a parquet file (columnar, memory mapped by
+polars) read by the parquet engine of pyaro-readers. Afterwards the jobs read the
+snapshot instead of the original source.
+
+The snapshots are stored under the hash of the source part of the config (reader,
+source location, filters and reader options); configs differing just in their name
+map or post processing share a snapshot. The names, modification times and sizes of
+the source files (of all files below a source directory) are part of the hash, so
+changed sources get a new snapshot. Sources that are not local files or directories
+(e.g. URLs) are not snapshotted, since their changes can't be detected.
+The filters are applied while the snapshot is written. A snapshot is written to a temporary file first; concurrent jobs wait
+for the one writing it.
+
+Layout (in PYARO_SNAPSHOT_DIR):
+<source hash>.parquet: the data of all variables of a pyaro source
+locks/<source hash>.lock: lock of a snapshot being written
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import time
+from pathlib import Path
+
+import simplejson as json
+
+from aeroval_parallelize.cache_pool import cache_pool_lock
+from aeroval_parallelize.const import PYARO_SNAPSHOT_DIR
+from aeroval_parallelize.freshness import get_source_digest, stat_files
+from aeroval_parallelize.output_store import normalise_config
+
+# pyaro engine reading the snapshots
+SNAPSHOT_ENGINE = "parquet"
+SNAPSHOT_EXT = ".parquet"
+# config keys not describing the source of a pyaro config
+SNAPSHOT_IGNORE_KEYS = ["name", "name_map", "post_processing"]
+
+
+def get_source_config(pyaro_config) -> dict:
+    """return the source part of a pyaro config (see SNAPSHOT_IGNORE_KEYS)"""
+    return {
+        key: value
+        for key, value in normalise_config(pyaro_config).items()
+        if key not in SNAPSHOT_IGNORE_KEYS
+    }
+
+
+def get_source_stats(pyaro_config) -> dict | None:
+    """return the stats of the source files of a pyaro config (see freshness.stat_files)
+
+    source directories are listed recursively
+    returns None if the source is not a local file or directory (e.g. an URL)
+    """
+    source = pyaro_config.filename_or_obj_or_url
+    if not isinstance(source, (str, os.PathLike)) or not os.path.exists(source):
+        return None
+    if os.path.isdir(source):
+        files = [
+            os.path.join(root, _file)
+            for root, _, files in os.walk(source)
+            for _file in files
+        ]
+    else:
+        files = [source]
+    return stat_files(files)
+
+
+def get_snapshot_hash(pyaro_config) -> str | None:
+    """return the hash of the source part of a pyaro config
+
+    the digest of the source files is included, so changed sources get a new snapshot
+    returns None if the source can't be stat'ed (see get_source_stats)
+    """
+    source_stats = get_source_stats(pyaro_config)
+    if source_stats is None:
+        return None
+    source_config = get_source_config(pyaro_config)
+    source_config["source_digest"] = get_source_digest(source_stats)
+    json_str = json.dumps(
+        source_config, sort_keys=True, ensure_ascii=False, allow_nan=True
+    )
+    return hashlib.sha256(json_str.encode("utf-8")).hexdigest()
+
+
+def get_snapshot_file(
+    pyaro_config, snapshot_dir: str | Path = PYARO_SNAPSHOT_DIR
+) -> Path | None:
+    """return the snapshot file of a pyaro config; None if its source is not local"""
+    snapshot_hash = get_snapshot_hash(pyaro_config)
+    if snapshot_hash is None:
+        return None
+    return Path(snapshot_dir).joinpath(f"{snapshot_hash}{SNAPSHOT_EXT}")
+
+
+def get_snapshot_frame(reader):
+    """return the data of all variables of a pyaro reader as one (long format) polars DataFrame
+
+    the columns are the ones of pyaro's parquet engine
+    """
+    # to avoid that polars is loaded if the module is just imported
+    import numpy as np
+    import polars
+
+    countries = {
+        name: str(station["country"]) for name, station in reader.stations().items()
+    }
+    frames = []
+    for var in reader.variables():
+        data = reader.data(var)
+        stations = data.stations.astype(str)
+        names, station_idx = np.unique(stations, return_inverse=True)
+        # polars does not support pyaro's datetime64[s]
+        frame = polars.DataFrame(
+            {
+                "variable": np.full(len(stations), var),
+                "units": np.full(len(stations), data.units),
+                "station": stations,
+                "country": np.array([countries.get(name, "") for name in names])[
+                    station_idx
+                ],
+                "value": data.values,
+                "longitude": data.longitudes,
+                "latitude": data.latitudes,
+                "altitude": data.altitudes,
+                "start_time": data.start_times.astype("datetime64[ms]"),
+                "end_time": data.end_times.astype("datetime64[ms]"),
+                "flag": data.flags,
+                "standard_deviation": data.standard_deviations,
+            }
+        )
+        frames.append(frame)
+    return polars.concat(frames)
+
+
+def write_snapshot(pyaro_config, snapshot_dir: str | Path = PYARO_SNAPSHOT_DIR) -> Path:
+    """write the snapshot of a pyaro config's source unless it exists already
+
+    returns the snapshot file; None if the source is not local (see get_source_stats)
+    """
+    # to avoid that pyaro's plugins are loaded if the module is just imported
+    import pyaro
+
+    snapshot_file = get_snapshot_file(pyaro_config, snapshot_dir)
+    if snapshot_file is None:
+        print(
+            f"no snapshot of {pyaro_config.name}: "
+            f"{pyaro_config.filename_or_obj_or_url} is not a local file or directory"
+        )
+        return None
+    with cache_pool_lock(snapshot_file.stem, pool_dir=snapshot_dir):
+        if snapshot_file.exists():
+            return snapshot_file
+
+        start_time = time.perf_counter()
+        with pyaro.open_timeseries(
+            pyaro_config.reader_id,
+            pyaro_config.filename_or_obj_or_url,
+            filters=pyaro_config.filters,
+            **(pyaro_config.model_extra or {}),
+        ) as reader:
+            frame = get_snapshot_frame(reader)
+        # the snapshot is complete as soon as it has its final name
+        tmp_file = snapshot_file.with_name(f"{snapshot_file.name}.{os.getpid()}")
+        frame.write_parquet(tmp_file)
+        os.replace(tmp_file, snapshot_file)
+        print(
+            f"wrote snapshot {snapshot_file} of {pyaro_config.name} "
+            f"({len(frame)} rows) in {time.perf_counter() - start_time:.1f}s"
+        )
+    return snapshot_file
+
+
+def get_snapshot_config(pyaro_config, snapshot_dir: str | Path = PYARO_SNAPSHOT_DIR):
+    """return the pyaro config reading the snapshot of pyaro_config
+
+    pyaro_config is returned as it is if there's no snapshot
+    """
+    snapshot_file = get_snapshot_file(pyaro_config, snapshot_dir)
+    if snapshot_file is None or not snapshot_file.exists():
+        return pyaro_config
+    config_dict = {
+        key: value
+        for key, value in pyaro_config.model_dump().items()
+        if key not in (pyaro_config.model_extra or {})
+    }
+    config_dict.update(
+        reader_id=SNAPSHOT_ENGINE,
+        filename_or_obj_or_url=str(snapshot_file),
+        # applied when the snapshot was written
+        filters={},
+    )
+    return type(pyaro_config).from_dict(config_dict)
+
+
+def prepare_snapshot_config(
+    pyaro_config, snapshot_dir: str | Path = PYARO_SNAPSHOT_DIR
+):
+    """write the snapshot of a pyaro config if needed and return the config reading it
+
+    pyaro_config is returned as it is if the snapshot can't be written
+    """
+    try:
+        write_snapshot(pyaro_config, snapshot_dir)
+    except Exception as e:
+        print(f"could not write the snapshot of {pyaro_config.name}: {e}")
+        return pyaro_config
+    return get_snapshot_config(pyaro_config, snapshot_dir)
+
+
+def use_snapshots(cfg: dict, snapshot_dir: str | Path = PYARO_SNAPSHOT_DIR) -> dict:
+    """let the pyaro obs networks of an aeroval config read their snapshots (if written)
+
+    the config is changed in place and returned
+    """
+    for obs_name, obs_entry in cfg.get("obs_cfg", {}).items():
+        pyaro_config = obs_entry.get("pyaro_config")
+        if pyaro_config is None:
+            continue
+        snapshot_config = get_snapshot_config(pyaro_config, snapshot_dir)
+        if snapshot_config is not pyaro_config:
+            print(f"reading {obs_name} from {snapshot_config.filename_or_obj_or_url}")
+            obs_entry["pyaro_config"] = snapshot_config
+    return cfg
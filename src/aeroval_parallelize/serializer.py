@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+serializer for aeroval configs
+
+jsonpickle encodes every object reflectively and adds py/object tags everywhere.
+An aeroval config consists of plain python types (dict, list, str, numbers, bools)
+with a few exceptions, which are tagged explicitly here:
+
+- PyaroConfig objects: {"__pyaro_config__": <dict>}
+- tuples: {"__tuple__": [...]}
+- sets: {"__set__": [...]}
+- pathlib paths: {"__path__": "..."}
+- anything else (including dicts with non string keys) falls back to jsonpickle:
+  {"__jsonpickle__": "<jsonpickle string>"}
+- dicts whose only key is one of these tags are escaped: {"__dict__": {<dict>}}
+
+NaN and infinite floats are written as NaN and (-)Infinity like jsonpickle does.
+
+The result is written as plain json or (if installed) as msgpack.
+
+run `python -m aeroval_parallelize.serializer <config file(s)>` to compare the
+encode and decode times with jsonpickle.
+"""
+from __future__ import annotations
+
+import sys
+import timeit
+from fnmatch import fnmatch
+from pathlib import Path
+
+import jsonpickle
+import simplejson as json
+
+from aeroval_parallelize.const import (
+    CFG_JSON_EXT,
+    CFG_MSGPACK_EXT,
+    JSON_EXT,
+    PICKLE_JSON_EXT,
+)
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+PYARO_CONFIG_TAG = "__pyaro_config__"
+TUPLE_TAG = "__tuple__"
+SET_TAG = "__set__"
+PATH_TAG = "__path__"
+JSONPICKLE_TAG = "__jsonpickle__"
+DICT_TAG = "__dict__"
+# dicts with one of these keys as only key are escaped with DICT_TAG
+TAGS = [PYARO_CONFIG_TAG, TUPLE_TAG, SET_TAG, PATH_TAG, JSONPICKLE_TAG, DICT_TAG]
+
+
+def _is_pyaro_config(obj) -> bool:
+    """check for a PyaroConfig without importing pyaerocom"""
+    return type(obj).__name__ == "PyaroConfig" and hasattr(obj, "model_dump")
+
+
+def to_serialisable(obj):
+    """convert an aeroval config to json / msgpack serialisable types"""
+    if obj is None or isinstance(obj, (str, bool, int, float)):
+        return obj
+    elif isinstance(obj, dict):
+        if all(isinstance(key, str) for key in obj):
+            serialisable = {key: to_serialisable(value) for key, value in obj.items()}
+            if len(obj) == 1 and next(iter(obj)) in TAGS:
+                # a user dict looking like a tagged value
+                return {DICT_TAG: serialisable}
+            return serialisable
+    elif isinstance(obj, list):
+        return [to_serialisable(item) for item in obj]
+    elif isinstance(obj, tuple):
+        return {TUPLE_TAG: [to_serialisable(item) for item in obj]}
+    elif isinstance(obj, (set, frozenset)):
+        return {SET_TAG: [to_serialisable(item) for item in obj]}
+    elif isinstance(obj, Path):
+        return {PATH_TAG: str(obj)}
+    elif _is_pyaro_config(obj):
+        return {PYARO_CONFIG_TAG: to_serialisable(obj.model_dump())}
+    return {JSONPICKLE_TAG: jsonpickle.encode(obj, keys=True)}
+
+
+def from_serialisable(obj):
+    """inverse of to_serialisable"""
+    if isinstance(obj, dict):
+        if len(obj) == 1:
+            key = next(iter(obj))
+            if key == TUPLE_TAG:
+                return tuple(from_serialisable(item) for item in obj[key])
+            elif key == SET_TAG:
+                return set(from_serialisable(item) for item in obj[key])
+            elif key == PATH_TAG:
+                return Path(obj[key])
+            elif key == PYARO_CONFIG_TAG:
+                from pyaerocom.io.pyaro.pyaro_config import PyaroConfig
+
+                return PyaroConfig.from_dict(from_serialisable(obj[key]))
+            elif key == JSONPICKLE_TAG:
+                return jsonpickle.decode(obj[key], keys=True)
+            elif key == DICT_TAG:
+                return {
+                    _key: from_serialisable(value) for _key, value in obj[key].items()
+                }
+        return {key: from_serialisable(value) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [from_serialisable(item) for item in obj]
+    return obj
+
+
+def encode_config(cfg: dict) -> str:
+    """encode an aeroval config as json string"""
+    # simplejson does not write NaN and Infinity by default (anymore)
+    return json.dumps(to_serialisable(cfg), ensure_ascii=False, allow_nan=True)
+
+
+def decode_config(json_string: str) -> dict:
+    """decode a json string created by encode_config"""
+    return from_serialisable(json.loads(json_string, allow_nan=True))
+
+
+def encode_config_msgpack(cfg: dict) -> bytes:
+    """encode an aeroval config using msgpack"""
+    return msgpack.packb(to_serialisable(cfg), use_bin_type=True)
+
+
+def decode_config_msgpack(data: bytes) -> dict:
+    """decode msgpack data created by encode_config_msgpack"""
+    return from_serialisable(msgpack.unpackb(data, raw=False))
+
+
+def write_config_file(cfg: dict, outfile: str | Path) -> None:
+    """write an aeroval config; the format is determined by the file extension"""
+    if fnmatch(str(outfile), f"*{CFG_MSGPACK_EXT}"):
+        with open(outfile, "wb") as outhandle:
+            outhandle.write(encode_config_msgpack(cfg))
+    elif fnmatch(str(outfile), f"*{PICKLE_JSON_EXT}"):
+        with open(outfile, "w", encoding="utf-8") as outhandle:
+            outhandle.write(jsonpickle.encode(cfg))
+    else:
+        with open(outfile, "w", encoding="utf-8") as outhandle:
+            outhandle.write(encode_config(cfg))
+
+
+def read_config_file(infile: str | Path) -> dict:
+    """read an aeroval config written by write_config_file
+
+    also reads existing PICKLE_JSON_EXT and plain JSON_EXT files
+    """
+    if fnmatch(str(infile), f"*{CFG_MSGPACK_EXT}"):
+        with open(infile, "rb") as inhandle:
+            return decode_config_msgpack(inhandle.read())
+    elif fnmatch(str(infile), f"*{CFG_JSON_EXT}"):
+        with open(infile, "r", encoding="utf-8") as inhandle:
+            return decode_config(inhandle.read())
+    elif fnmatch(str(infile), f"*{PICKLE_JSON_EXT}"):
+        with open(infile, "r", encoding="utf-8") as inhandle:
+            return jsonpickle.decode(inhandle.read())
+    elif fnmatch(str(infile), f"*{JSON_EXT}"):
+        with open(infile, "r", encoding="utf-8") as inhandle:
+            return json.load(inhandle)
+    raise ValueError(f"unknown config file extension: {infile}")
+
+
+def benchmark_serializers(cfg: dict, number: int = 10) -> dict:
+    """measure encode and decode times [s] and the encoded size [bytes] of a config
+
+    returns a dict with the serializer name as key
+    """
+    serializers = {
+        "jsonpickle": (jsonpickle.encode, jsonpickle.decode),
+        "typed json": (encode_config, decode_config),
+    }
+    if msgpack is not None:
+        serializers["typed msgpack"] = (encode_config_msgpack, decode_config_msgpack)
+
+    results = {}
+    for name, (encoder, decoder) in serializers.items():
+        data = encoder(cfg)
+        results[name] = {
+            "encode": timeit.timeit(lambda: encoder(cfg), number=number) / number,
+            "decode": timeit.timeit(lambda: decoder(data), number=number) / number,
+            "size": len(data),
+        }
+    return results
+
+
+def main():
+    """print encode and decode times of the configs given on the command line"""
+    for _file in sys.argv[1:]:
+        cfg = read_config_file(_file)
+        print(f"{_file}:")
+        for name, result in benchmark_serializers(cfg).items():
+            print(
+                f"  {name:14s} encode: {result['encode'] * 1000:8.2f} ms  "
+                f"decode: {result['decode'] * 1000:8.2f} ms  size: {result['size']} bytes"
+            )
+
+
+if __name__ == "__main__":
+    main()
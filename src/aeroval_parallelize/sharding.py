@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+spatial sharding of large obs networks
+
+The stations of an obs network are split into shards, either longitude bands or
+lists of station names. Each shard is run as its own job that creates the
+colocated data only (obs_filters restricted to the shard's stations).
+A merge job per model / obs network waits for its shards, concatenates the
+colocated data of the shards along the station dimension and computes all json
+files (including the regional statistics) from the merged colocated data.
+pyaerocom's range filters include both ends, so stations on the edge of two longitude
+bands are in both shards; the merge job keeps them once.
+"""
+from __future__ import annotations
+
+from copy import deepcopy
+from pathlib import Path
+
+# key in the merge job's config listing the coldata_basedirs of the shards
+# it's removed from the config before the analysis is run
+SHARD_COLDATA_KEY = "shard_coldata_dirs"
+# longitude range divided into longitude bands
+SHARD_LON_RANGE = (-180.0, 180.0)
+# name of the shards (appended to the name of the sharded unit)
+SHARD_NAME_START = "_shard"
+
+
+def get_lon_band_filters(
+    shard_no: int, west: float = SHARD_LON_RANGE[0], east: float = SHARD_LON_RANGE[1]
+) -> list[dict]:
+    """return the obs_filters of shard_no longitude bands of equal width
+
+    neighbouring bands share their edge (see drop_duplicate_stations)
+    """
+    width = (east - west) / shard_no
+    return [
+        {"longitude": [west + idx * width, west + (idx + 1) * width]}
+        for idx in range(shard_no)
+    ]
+
+
+def read_station_list_filters(station_file: str | Path) -> list[dict]:
+    """return the obs_filters of a station list file
+
+    each non empty line of the file holds the (white space separated)
+    station names of one shard; wildcards are allowed
+    """
+    filters = []
+    with open(station_file, "r", encoding="utf-8") as inhandle:
+        for line in inhandle:
+            if line.strip():
+                filters.append({"station_name": line.split()})
+    return filters
+
+
+def parse_shard_option(shard_str: str) -> tuple[str, list[dict]]:
+    """parse a shard option
+
+    <obs name>:<number of shards>[:<west>:<east>] for longitude bands
+    <obs name>:<station list file> for station lists (see read_station_list_filters)
+    returns the obs name (key of obs_cfg) and the obs_filters of the shards
+    """
+    obs_name, _, shard_def = shard_str.partition(":")
+    if not shard_def:
+        raise ValueError(f"no shards given in {shard_str}")
+    shard_no, *lon_range = shard_def.split(":")
+    if shard_no.isdigit():
+        return obs_name, get_lon_band_filters(int(shard_no), *map(float, lon_range))
+    return obs_name, read_station_list_filters(shard_def)
+
+
+def shard_units(units, shard_filters: dict):
+    """split units into shard units and a merge unit
+
+    shard_filters is a dict with the obs name as key and the obs_filters of the shards as value
+    only units with a single obs network are sharded; other units are passed through
+    shard units get the additional key shard_of (name of the sharded unit),
+    merge units the key shards (names of the shard units)
+    """
+    for unit in units:
+        obs_names = list(unit["cfg"]["obs_cfg"])
+        if len(obs_names) != 1 or obs_names[0] not in shard_filters:
+            yield unit
+            continue
+
+        obs_name = obs_names[0]
+        shard_names = []
+        for idx, obs_filter in enumerate(shard_filters[obs_name], start=1):
+            shard_cfg = deepcopy(unit["cfg"])
+            obs_filters = shard_cfg["obs_cfg"][obs_name].get("obs_filters", {})
+            obs_filters.update(obs_filter)
+            shard_cfg["obs_cfg"][obs_name]["obs_filters"] = obs_filters
+            shard_cfg["only_colocation"] = True
+            shard_names.append(f"{unit['name']}{SHARD_NAME_START}{idx:02d}")
+            yield {
+                "name": shard_names[-1],
+                "cfg": shard_cfg,
+                "hold_pattern": unit["hold_pattern"],
+                "shard_of": unit["name"],
+            }
+
+        merge_cfg = unit["cfg"]
+        merge_cfg["only_json"] = True
+        merge_cfg["only_colocation"] = False
+        yield {
+            "name": unit["name"],
+            "cfg": merge_cfg,
+            "hold_pattern": "",
+            "shards": shard_names,
+        }
+
+
+def drop_duplicate_stations(data):
+    """return colocated data (xarray.DataArray) with every station_name kept once
+
+    stations of several shards (on a band edge or in overlapping station lists) are
+    kept in the first shard
+    """
+    # to avoid that numpy is loaded if the module is just imported
+    import numpy as np
+
+    _, first_idx = np.unique(data["station_name"].values, return_index=True)
+    if len(first_idx) == data.sizes["station_name"]:
+        return data
+    print(
+        f"dropping {data.sizes['station_name'] - len(first_idx)} duplicate station(s)"
+    )
+    return data.isel(station_name=np.sort(first_idx))
+
+
+def merge_shard_coldata(cfg: dict) -> list[Path]:
+    """concatenate the colocated data of the shards of a merge job
+
+    the shards' coldata_basedirs are taken from cfg[SHARD_COLDATA_KEY] (which is removed)
+    the merged files are written to the coldata directory of cfg
+    stations contained in several shards are kept once (see drop_duplicate_stations)
+    returns the list of merged files
+    """
+    # to avoid that lustre access is checked if the module is just imported
+    import xarray as xr
+    from pyaerocom import ColocatedData
+
+    shard_dirs = cfg.pop(SHARD_COLDATA_KEY, [])
+    out_dir = Path(cfg["coldata_basedir"]).joinpath(cfg["proj_id"], cfg["exp_id"])
+
+    # colocated data files of all shards; key: path relative to the experiment dir
+    shard_files = {}
+    for shard_dir in shard_dirs:
+        exp_dir = Path(shard_dir).joinpath(cfg["proj_id"], cfg["exp_id"])
+        for _file in sorted(exp_dir.glob("**/*.nc")):
+            shard_files.setdefault(_file.relative_to(exp_dir), []).append(_file)
+
+    merged_files = []
+    for rel_path, files in shard_files.items():
+        coldata = [ColocatedData(data=str(_file)).data for _file in files]
+        merged = ColocatedData(
+            data=drop_duplicate_stations(xr.concat(coldata, dim="station_name"))
+        )
+        outfile = out_dir.joinpath(rel_path)
+        outfile.parent.mkdir(parents=True, exist_ok=True)
+        print(f"merging {len(files)} shards to {outfile}")
+        merged.to_netcdf(outfile.parent, savename=outfile.name)
+        merged_files.append(outfile)
+    return merged_files
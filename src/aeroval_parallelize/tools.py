@@ -22,12 +22,11 @@ from tempfile import mkdtemp
 from threading import Thread
 from uuid import uuid4
 import jsonpickle
-import os
 
 
 import simplejson as json
 
-from aeroval_parallelize.cache_tools import QSUB_SCRIPT_START
+from aeroval_parallelize.cache_tools import QSUB_SCRIPT_START, get_cache_misses
 from aeroval_parallelize.const import (
     CONDA_ENV,
     CP_COMMAND,
@@ -50,6 +49,56 @@ from aeroval_parallelize.const import (
     DEFAULT_PYTHON,
     JSON_EXT,
     PICKLE_JSON_EXT,
+    JOB_LIST_EXT,
+    DEFAULT_JOB_WALLTIME,
+    PLAN_ENTRY_EXT,
+    CONFIG_CACHE_DIR,
+    CFG_JSON_EXT,
+    CFG_MSGPACK_EXT,
+    QSUB_ANA_PRIORITY,
+    QSUB_ASSEMBLY_PRIORITY,
+)
+from aeroval_parallelize.config_cache import cache_config, get_cached_config
+from aeroval_parallelize.job_ids import (
+    get_job_id,
+    register_qsub_output,
+    resolve_hold_jid,
+)
+from aeroval_parallelize.config_diff import (
+    DIFF_IGNORE_KEYS,
+    filter_changed_units,
+    read_stored_config,
+)
+from aeroval_parallelize.output_store import (
+    STORE_HASH_KEY,
+    get_config_hash,
+    get_store_path,
+    is_stored,
+    link_stored_output,
+)
+from aeroval_parallelize.plan_file import (
+    get_plan_entry_path,
+    read_plan_entry_path,
+    write_plan,
+)
+from aeroval_parallelize.serializer import read_config_file, write_config_file
+from aeroval_parallelize.planning import (
+    estimate_unit_cost,
+    get_obs_vars,
+    pack_units,
+    split_units,
+)
+from aeroval_parallelize.model_preread import PREREAD_KEY, plan_preread
+from aeroval_parallelize.preflight import preflight_units
+from aeroval_parallelize.validation import (
+    ConfigValidationError,
+    print_validation_summary,
+    validate_configs,
+)
+from aeroval_parallelize.sharding import (
+    SHARD_COLDATA_KEY,
+    SHARD_NAME_START,
+    shard_units,
 )
 from pyaerocom.io.pyaro.pyaro_config import PyaroConfig
 
@@ -83,6 +132,8 @@ from pyaerocom.io.pyaro.pyaro_config import PyaroConfig
 
 # script start time
 START_TIME = datetime.now().strftime("%Y%m%d_%H%M%S")
+# start of the analysis job names
+QSUB_ANA_JOB_START = f"pya_{RND}_ana"
 
 # assume that the script to run the aeroval json file is in the same directory as this script
 # JSON_RUNSCRIPT = Path(Path(__file__).parent).joinpath(JSON_RUNSCRIPT_NAME)
@@ -90,8 +141,15 @@ JSON_RUNSCRIPT = JSON_RUNSCRIPT_NAME
 
 # experiments.json
 EXPERIMENT_JSON_FILE = "experiments.json"
+# config entries describing an experiment; taken from the target experiment's config
+# when outputs of other experiments are fanned out (see fan_out_output)
+EXP_INFO_KEYS = ["exp_name", "exp_descr", "exp_pi"]
 # match for aeroval config file
 AEROVAL_CONFIG_FILE_MASK = ["cfg_*.json"]
+# config keys ignored when comparing units of several experiments (campaign mode);
+# the shard coldata and pre-read directories differ per experiment, so a merge job
+# is shared like its shards
+CAMPAIGN_IGNORE_KEYS = [*DIFF_IGNORE_KEYS, SHARD_COLDATA_KEY, PREREAD_KEY]
 
 # match for heatmap files; the results of them are displayed according to their order
 # in the file. Unfortunately the parallelisation mixes that up, so we need to reorder them after
@@ -127,24 +185,207 @@ MERGE_EXP_CFG_FILES = ["cfg_*.json"]
 # CONDA_ENV = "pya_para"
 
 
-def prep_files(options):
-    """preprare the aeroval config files to run
-    return a list of files
+def get_obs_groups(obs_cfg: dict) -> list[list[str]]:
+    """group the obs_cfg entries that need to be run together
 
+    A superobs needs to be run together with its components (given as obs_cfg keys
+    or pyaerocom obs ids in its obs_id). Superobs sharing components end up in the
+    same group. All other obs networks form a group of their own.
+    returns a list of groups (lists of obs_cfg keys) in config order
     """
-    # returned list of runfiles
-    runfiles = []
-    # return also the jsondirs so that the caller knows which directories to assemble together
-    json_run_dirs = []
-    # dict with the run filename as key and the corresponding cache creation mask
-    cache_job_id_mask = {}
+    # union find with the obs_cfg keys as nodes
+    parent = {_obs: _obs for _obs in obs_cfg}
 
-    # create tmp dir
-    tempdir = mkdtemp(dir=options["qsub_dir"])
+    def find(_obs):
+        while parent[_obs] != _obs:
+            parent[_obs] = parent[parent[_obs]]
+            _obs = parent[_obs]
+        return _obs
+
+    for _obs in obs_cfg:
+        if not obs_cfg[_obs].get("is_superobs", False):
+            continue
+        components = obs_cfg[_obs]["obs_id"]
+        if isinstance(components, str):
+            components = [components]
+        for component in components:
+            for _other in obs_cfg:
+                if _other == component or obs_cfg[_other].get("obs_id") == component:
+                    parent[find(_other)] = find(_obs)
+
+    groups = {}
+    for _obs in obs_cfg:
+        groups.setdefault(find(_obs), []).append(_obs)
+    return list(groups.values())
+
+
+def iter_job_units(cfg: dict):
+    """split an aeroval config into the units that can be run in parallel
+
+    one unit per model and obs group (see get_obs_groups). That's usually a single
+    obs network, but a superobs is run together with its components.
+    yields dicts with the keys
+    name: name of the unit (used for the file name)
+    cfg: aeroval config of the unit
+    hold_pattern: job name pattern(s) of the cache generation jobs the unit has to wait for
+    """
+    obs_groups = get_obs_groups(cfg["obs_cfg"])
+
+    # only parallelise model for now since the PPI cluster is RAM limited
+    for _model in cfg["model_cfg"]:
+        out_cfg = deepcopy(cfg)
+        out_cfg.pop("model_cfg", None)
+        out_cfg["model_cfg"] = {}
+        out_cfg["model_cfg"][_model] = cfg["model_cfg"][_model]
+        # out_cfg["plot_types"] contains a per model map plot type config
+        # unfortunately pyaerocom crashes, if the model data according to the config is not present
+        # therefore just keep the config for the current model
+        # deleting all and then recreating what we need is the easier path
+        try:
+            # not all config files might have this...
+            model_plot_types = deepcopy(out_cfg["plot_types"][_model])
+            del out_cfg["plot_types"]
+            out_cfg["plot_types"] = {}
+            out_cfg["plot_types"][_model] = model_plot_types
+        except Exception as e:
+            pass
+
+        # also parallelize per obs group
+        out_cfg.pop("obs_cfg", None)
+
+        for obs_group in obs_groups:
+            unit_cfg = deepcopy(out_cfg)
+            unit_cfg["obs_cfg"] = {}
+            hold_patterns = []
+            superobs_names = []
+            for _obs_network in obs_group:
+                unit_cfg["obs_cfg"][_obs_network] = cfg["obs_cfg"][_obs_network]
+                if cfg["obs_cfg"][_obs_network].get("is_superobs", False):
+                    superobs_names.append(_obs_network)
+                    continue
+                # cache file generation works with pyaerocom's obs network names
+                # and not the one of aeroval (those used in the web interface)
+                # the cache generation runs the variables in parallel already
+                pya_obsid = cfg["obs_cfg"][_obs_network]["obs_id"]
+                hold_pattern = f"{QSUB_SCRIPT_START}{pya_obsid}*"
+                if hold_pattern not in hold_patterns:
+                    hold_patterns.append(hold_pattern)
+
+            if superobs_names:
+                group_name = "_".join(superobs_names)
+            else:
+                group_name = obs_group[0]
+            yield {
+                "name": f"{_model}_{group_name}",
+                "cfg": unit_cfg,
+                # -hold_jid takes a comma separated list of job names
+                "hold_pattern": ",".join(hold_patterns),
+            }
+
+
+def drop_cached_holds(
+    units, cache_pool: str | Path = None, pyaro_snapshot: str | Path = None
+):
+    """yield the units without the hold patterns of obs networks that are fully cached
+
+    units whose obs networks are all cached can start immediately
+    cache_pool, pyaro_snapshot: see cache_tools.is_cache_valid
+    """
+    for unit in units:
+        misses = get_cache_misses(
+            get_config_info(None, None, cfg=unit["cfg"]),
+            cache_pool=cache_pool,
+            pyaro_snapshot=pyaro_snapshot,
+        )
+        # -hold_jid takes a comma separated list of job names
+        unit["hold_pattern"] = ",".join(
+            f"{QSUB_SCRIPT_START}{obs_id}*" for obs_id in misses
+        )
+        yield unit
+
+
+def select_units(units, models: list[str] = None, obs: list[str] = None):
+    """yield the units of the given models and obs networks (wildcards allowed)
+
+    a unit is selected if one of its obs networks matches (e.g. a component of a superobs)
+    None means no selection
+    """
+    for unit in units:
+        if models is not None and not any(
+            match_file(_model, models) for _model in unit["cfg"]["model_cfg"]
+        ):
+            continue
+        if obs is not None and not any(
+            match_file(_obs, obs) for _obs in unit["cfg"]["obs_cfg"]
+        ):
+            continue
+        yield unit
+
+
+def iter_job_specs(options: dict, tempdir: str | Path):
+    """generator yielding the job specs of a parallel run one at a time
+
+    the aeroval configs are read, split and written (in non plan mode) lazily so that
+    the caller can submit the jobs of a spec while later configs are still being split.
+    Nothing but the current config is kept in memory.
+
+    yields dicts with the keys
+    name: name of the job (config file stem and unit name)
+    config_file: aeroval config file the job belongs to
+    cfg: aeroval config of the job
+    runfile: config file to run (a plan entry path in plan mode);
+        None if the output has been taken from the output store
+    json_run_dir: json_basedir of the job; None for shard jobs (not to be assembled)
+    out_dir: experiment directory the json_run_dir will be assembled into
+    hold_pattern: job name pattern(s) of the cache generation jobs to wait for
+    cost: estimated runtime [s]; only if options["pack_jobs"] is set
+    prereads: the model pre-read jobs of the job (see model_preread.plan_preread);
+        only if options["model_preread"] is set
+
+    if options["shard_obs"] is set (dict with the obs name as key and the obs_filters of the
+    shards as value), the units of these obs networks are split into shard jobs and a
+    merge job (see sharding.py). The merge job is yielded after its shards.
+
+    if options["diff_to"] is set (an existing experiment directory), only the units that
+    are new or changed compared to the config stored in that experiment are yielded.
+    Their out_dir is the existing experiment.
+
+    options["only_models"] and options["only_obs"] (lists of model and obs names,
+    wildcards allowed) restrict the yielded units to these models and obs networks
+
+    if options["preflight"] is set ("drop" or "warn"), units without model data for the
+    config's periods are dropped or flagged (see preflight.py)
+
+    if options["campaign"] is set, units that are identical in several configs (apart from
+    the experiment they belong to) are run only once. The specs of the duplicates have no
+    runfile, the json_run_dir of the job that runs the unit and its runfile as run_by.
+
+    if options["cache_check"] is set, units don't wait for obs networks whose cache
+    files are valid already (see cache_tools.get_cache_misses)
+
+    if options["model_preread"] is set (a directory), the jobs read their models from the
+    subsets written by pre-read jobs in that directory and wait for these jobs
+    (see model_preread.py)
+    """
+    plan_flag = options.get("plan", False)
+    pack_flag = options.get("pack_jobs", False)
+    walltime = float(options.get("job_walltime", DEFAULT_JOB_WALLTIME)) * 3600
+    # names of the jobs yielded so far; a config file might be given twice
+    job_names = set()
+    # coldata_basedirs of the shards; key: name of the sharded job
+    shard_coldata_dirs = {}
+    # specs of the units run so far (campaign mode); key: unit hash
+    unit_specs = {}
+    # index for temporary data directories; unique over all config files
+    dir_idx = 1
 
     for _file in options["files"]:
         # read aeroval config file
-        cfg = read_config_var(config_file=_file, cfgvar=options["cfgvar"])
+        cfg = read_config_var(
+            config_file=_file,
+            cfgvar=options["cfgvar"],
+            use_cache=not options.get("no_config_cache", False),
+        )
 
         # make some adjustments to the config file
         # e.g. adjust the json_basedir and the coldata_basedir entries
@@ -157,109 +398,310 @@ def prep_files(options):
         if "io_aux_file" in options:
             cfg["io_aux_file"] = options["io_aux_file"]
 
-        # index for temporary data directories
-        dir_idx = 1
-
-        # determine if one of the obs is a superobs
-        # if yes, we need to run the parts of the superobs together with
-        # superobs
-        # in that case we parallelise the model only for now
-        no_superobs_flag = True
-        out_cfg = deepcopy(cfg)
-        for _obs in out_cfg["obs_cfg"]:
-            try:
-                if out_cfg["obs_cfg"][_obs]["is_superobs"]:
-                    no_superobs_flag = False
-                    # store the obs needed for superobs
-                    superobs_obs = out_cfg["obs_cfg"][_obs]["obs_id"]
-            except:
-                pass
-
-        # only parallelise model for now since the PPI cluster is RAM limited
-        for _model in cfg["model_cfg"]:
-            out_cfg = deepcopy(cfg)
-            out_cfg.pop("model_cfg", None)
-            out_cfg["model_cfg"] = {}
-            out_cfg["model_cfg"][_model] = cfg["model_cfg"][_model]
-            # out_cfg["plot_types"] contains a per model map plot type config
-            # unfortunately pyaerocom crashes, if the model data according to the config is not present
-            # therefore just keep the config for the current model
-            # deleting all and then recreating what we need is the easier path
-            try:
-                # not all config files might have this...
-                model_plot_types = deepcopy(out_cfg["plot_types"][_model])
-                del out_cfg["plot_types"]
-                out_cfg["plot_types"] = {}
-                out_cfg["plot_types"][_model] = model_plot_types
-            except Exception as e:
-                pass
-
-            if no_superobs_flag:
-                # No superobs, also parallelize per obes network
-                out_cfg.pop("obs_cfg", None)
-
-                for _obs_network in cfg["obs_cfg"]:
-                    # cache file generation works with pyaerocom's obs network names
-                    # and not the one of aeroval (those used in the web interface)
-                    pya_obsid = cfg["obs_cfg"][_obs_network]["obs_id"]
-                    out_cfg["obs_cfg"] = {}
-                    out_cfg["obs_cfg"][_obs_network] = cfg["obs_cfg"][_obs_network]
-                    # adjust json_basedir and coldata_basedir so that the different runs
-                    # do not influence each other
-                    out_cfg["json_basedir"] = (
-                        f"{cfg['json_basedir']}/{Path(tempdir).parts[-1]}.{dir_idx:04d}"
+        units = iter_job_units(cfg)
+        if options.get("only_models") or options.get("only_obs"):
+            units = select_units(
+                units, models=options.get("only_models"), obs=options.get("only_obs")
+            )
+        if options.get("preflight"):
+            units = preflight_units(units, cfg, mode=options["preflight"])
+        if options.get("diff_to"):
+            units = filter_changed_units(
+                units, cfg, read_stored_config(options["diff_to"])
+            )
+        if options.get("cache_check", False) and not options.get("nocache", False):
+            units = drop_cached_holds(
+                units,
+                cache_pool=options.get("cache_pool"),
+                pyaro_snapshot=options.get("pyaro_snapshot"),
+            )
+        if pack_flag:
+            units = split_units(list(units), walltime=walltime)
+        if options.get("shard_obs"):
+            units = shard_units(units, options["shard_obs"])
+
+        for unit in units:
+            job_name = f"{Path(_file).stem}_{unit['name']}"
+            if job_name in job_names:
+                continue
+            job_names.add(job_name)
+
+            out_cfg = unit["cfg"]
+            # adjust json_basedir and coldata_basedir so that the different runs
+            # do not influence each other
+            out_cfg["json_basedir"] = (
+                f"{cfg['json_basedir']}/{Path(tempdir).parts[-1]}.{dir_idx:04d}"
+            )
+            out_cfg["coldata_basedir"] = (
+                f"{cfg['coldata_basedir']}/{Path(tempdir).parts[-1]}.{dir_idx:04d}"
+            )
+            dir_idx += 1
+            spec = {
+                "name": job_name,
+                "config_file": _file,
+                "cfg": out_cfg,
+                "runfile": None,
+                "json_run_dir": out_cfg["json_basedir"],
+                "out_dir": Path(
+                    options.get("diff_to")
+                    or Path(out_cfg["json_basedir"]).parent.joinpath(
+                        out_cfg["proj_id"], out_cfg["exp_id"]
                     )
-                    json_run_dirs.append(out_cfg["json_basedir"])
-                    out_cfg["coldata_basedir"] = (
-                        f"{cfg['coldata_basedir']}/{Path(tempdir).parts[-1]}.{dir_idx:04d}"
+                ),
+                "hold_pattern": unit["hold_pattern"],
+            }
+            if "shard_of" in unit:
+                shard_coldata_dirs.setdefault(
+                    f"{Path(_file).stem}_{unit['shard_of']}", []
+                ).append(out_cfg["coldata_basedir"])
+                spec["json_run_dir"] = None
+            elif "shards" in unit:
+                # wait for the shard jobs and merge their colocated data
+                out_cfg[SHARD_COLDATA_KEY] = shard_coldata_dirs.pop(job_name, [])
+                spec["hold_pattern"] = (
+                    f"{QSUB_ANA_JOB_START}_{job_name}{SHARD_NAME_START}*"
+                )
+            if pack_flag:
+                spec["cost"] = unit["cost"]
+
+            if options.get("campaign", False):
+                unit_hash = get_config_hash(
+                    {
+                        key: value
+                        for key, value in out_cfg.items()
+                        if key not in CAMPAIGN_IGNORE_KEYS
+                    }
+                )
+                if unit_hash in unit_specs:
+                    if "shard_of" in unit:
+                        continue
+                    # the output is fanned out to this experiment by the assembly
+                    print(f"{job_name} is run by another experiment already")
+                    spec["json_run_dir"] = unit_specs[unit_hash]["json_run_dir"]
+                    spec["run_by"] = unit_specs[unit_hash]["runfile"]
+                    yield spec
+                    continue
+                unit_specs[unit_hash] = spec
+
+            cfg_hash = None
+            if options.get("output_store") is not None:
+                cfg_hash = get_config_hash(out_cfg)
+                if is_stored(options["output_store"], cfg_hash):
+                    print(
+                        f"reusing {get_store_path(options['output_store'], cfg_hash)} for {unit['name']}"
                     )
-                    cfg_file = Path(_file).stem
-                    outfile = Path(tempdir).joinpath(
-                        f"{cfg_file}_{_model}_{_obs_network}{PICKLE_JSON_EXT}"
+                    link_stored_output(
+                        options["output_store"], cfg_hash, out_cfg["json_basedir"]
                     )
-                    # the parallelisation is based on obs network for now only, while the cache
-                    # generation runs the variables in parallel already
-                    cache_job_id_mask[outfile] = f"{QSUB_SCRIPT_START}{pya_obsid}*"
-                    if not os.path.exists(outfile):
-                        print(f"writing file {outfile}")
-                        json_string = jsonpickle.encode(out_cfg)
-                        with open(outfile, "w", encoding="utf-8") as j:
-                            j.write(json_string)
-                            # json.dump(out_cfg, j, ensure_ascii=False, indent=4)
-
-                        runfiles.append(outfile)
-                        if options["verbose"]:
-                            print(out_cfg)
-                    dir_idx += 1
-            else:
-                # adjust json_basedir and coldata_basedir so that the different runs
-                # do not influence each other
-                _obs_network = "allobs"
-                out_cfg["json_basedir"] = (
-                    f"{cfg['json_basedir']}/{Path(tempdir).parts[-1]}.{dir_idx:04d}"
+                    yield spec
+                    continue
+
+            if options.get("model_preread"):
+                spec["prereads"] = {}
+                preread_jobs = plan_preread(
+                    out_cfg, cfg, options["model_preread"], spec["prereads"]
                 )
-                json_run_dirs.append(out_cfg["json_basedir"])
-                out_cfg["coldata_basedir"] = (
-                    f"{cfg['coldata_basedir']}/{Path(tempdir).parts[-1]}.{dir_idx:04d}"
+                # -hold_jid takes a comma separated list of job names
+                spec["hold_pattern"] = ",".join(
+                    pattern
+                    for pattern in [spec["hold_pattern"], *preread_jobs]
+                    if pattern
                 )
-                cfg_file = Path(_file).stem
-                outfile = Path(tempdir).joinpath(
-                    f"{cfg_file}_{_model}_{_obs_network}{PICKLE_JSON_EXT}"
+
+            if cfg_hash is not None:
+                # the job changes its config before the run (see output_store.py)
+                out_cfg[STORE_HASH_KEY] = cfg_hash
+
+            if plan_flag:
+                # the plan file is written by the caller
+                spec["runfile"] = get_plan_entry_path(tempdir, job_name)
+            else:
+                spec["runfile"] = Path(tempdir).joinpath(f"{job_name}{CFG_JSON_EXT}")
+                print(f"writing file {spec['runfile']}")
+                write_config_file(out_cfg, spec["runfile"])
+
+            if options.get("verbose", False):
+                print(out_cfg)
+            yield spec
+
+
+def add_assembly_dir(assemblies: dict, spec: dict) -> None:
+    """add the json_run_dir of a job spec to the assembly of its experiment
+
+    assemblies is a dict with the experiment directory as key and a dict with the keys
+    config_file (used to adjust the order of models and variables),
+    in_dirs (directories to assemble) and
+    runfiles (runfiles of the jobs creating the in_dirs) as value
+    """
+    if spec["json_run_dir"] is None:
+        return
+    assembly = assemblies.setdefault(
+        str(spec["out_dir"]),
+        {"config_file": spec["config_file"], "in_dirs": [], "runfiles": []},
+    )
+    if spec["json_run_dir"] not in assembly["in_dirs"]:
+        assembly["in_dirs"].append(spec["json_run_dir"])
+    runfile = spec["runfile"] or spec.get("run_by")
+    if runfile is not None and runfile not in assembly["runfiles"]:
+        assembly["runfiles"].append(runfile)
+
+
+def get_assembly_hold_jid(assembly: dict, job_id) -> str:
+    """return the ids of the analysis jobs an assembly has to wait for
+
+    falls back to the job name pattern of the whole run (pya_<job_id>_*) if not all
+    of these jobs have been submitted by this process (e.g. in dry runs)
+    """
+    job_ids = [
+        get_job_id(f"{QSUB_ANA_JOB_START}_{Path(runfile).stem}")
+        for runfile in assembly.get("runfiles", [])
+    ]
+    if all(job_ids):
+        return ",".join(job_ids)
+    return resolve_hold_jid(f"pya_{job_id}_*")
+
+
+def prep_files(options):
+    """preprare the aeroval config files to run
+    return a list of files, the cache job name patterns per file, the assemblies
+    (see add_assembly_dir), the temporary directory and the model pre-read jobs
+    (see model_preread.plan_preread; empty unless options["model_preread"] is set)
+
+    collects the job specs of iter_job_specs
+
+    if options["pack_jobs"] is set, units that would exceed options["job_walltime"] [h]
+    are split along their variables and small units are packed into one job (a
+    JOB_LIST_EXT file listing the config files to run)
+
+    if options["output_store"] is set, units with a complete entry in that output store
+    are not run again. Their stored output is linked to their json_basedir instead
+
+    if options["plan"] is set, all configs are written to a single plan file
+    and the returned runfiles are plan entry paths
+
+    if options["validate"] is set, all configs are validated (see validation.py);
+    ConfigValidationError is raised if that fails, unless options["force"] is set
+
+    the returned runfiles are ordered by their estimated runtime (longest first), so
+    that the jobs on the critical path start first; without options["pack_jobs"] the
+    estimate omits the model data volume (see planning.estimate_unit_cost)
+    """
+    # returned list of runfiles
+    runfiles = []
+    # return also the assemblies so that the caller knows which directories to assemble together
+    assemblies = {}
+    # dict with the run filename as key and the corresponding cache creation mask
+    cache_job_id_mask = {}
+    # estimated cost of each runfile
+    runfile_costs = {}
+    # configs to write to the plan file
+    plan_entries = {}
+    # configs to validate
+    validate_cfgs = {}
+    # model pre-read jobs; key: job name
+    preread_requests = {}
+
+    # create tmp dir
+    tempdir = mkdtemp(dir=options["qsub_dir"])
+
+    for spec in iter_job_specs(options, tempdir):
+        add_assembly_dir(assemblies, spec)
+        if spec["runfile"] is None:
+            continue
+        runfiles.append(spec["runfile"])
+        cache_job_id_mask[spec["runfile"]] = spec["hold_pattern"]
+        preread_requests.update(spec.get("prereads", {}))
+        if options.get("plan", False):
+            plan_entries[spec["name"]] = spec["cfg"]
+        if SHARD_COLDATA_KEY in spec["cfg"]:
+            # merge jobs need to be submitted after their shards (hold by job name)
+            runfile_costs[spec["runfile"]] = 0.0
+        elif "cost" in spec:
+            runfile_costs[spec["runfile"]] = spec["cost"]
+        else:
+            # the model data volume is only needed to pack the jobs
+            runfile_costs[spec["runfile"]] = estimate_unit_cost(
+                spec["cfg"], model_volume=options.get("pack_jobs", False)
+            )
+        if options.get("validate", False):
+            validate_cfgs[spec["name"]] = spec["cfg"]
+
+    if validate_cfgs:
+        print(f"validating {len(validate_cfgs)} configs...")
+        errors = validate_configs(validate_cfgs)
+        if errors:
+            print_validation_summary(errors)
+            if not options.get("force", False):
+                raise ConfigValidationError(errors)
+
+    if options.get("plan", False):
+        write_plan(tempdir, plan_entries)
+
+    if options.get("pack_jobs", False):
+        walltime = float(options.get("job_walltime", DEFAULT_JOB_WALLTIME)) * 3600
+        jobs = sorted(
+            pack_units(runfile_costs, walltime=walltime),
+            key=lambda job: sum(runfile_costs[_file] for _file in job),
+            reverse=True,
+        )
+        runfiles = write_job_lists(jobs, tempdir, cache_job_id_mask)
+        # the assemblies wait for the packed jobs
+        packed_runfiles = {
+            _file: runfile for job, runfile in zip(jobs, runfiles) for _file in job
+        }
+        for assembly in assemblies.values():
+            assembly["runfiles"] = list(
+                dict.fromkeys(
+                    packed_runfiles.get(_file, _file) for _file in assembly["runfiles"]
                 )
-                # cache_job_id_mask[outfile] = f"{QSUB_SCRIPT_START}{_obs_network}*"
-                cache_job_id_mask[outfile] = f"{QSUB_SCRIPT_START}*"
-                print(f"writing file {outfile}")
-                json_string = jsonpickle.encode(out_cfg)
-                with open(outfile, "w", encoding="utf-8") as j:
-                    j.write(json_string)
-                    # json.dump(out_cfg, j, ensure_ascii=False, indent=4)
+            )
+    else:
+        # longest first; sorted is stable, so merge jobs stay behind their shards
+        runfiles = sorted(runfiles, key=lambda x: runfile_costs[x], reverse=True)
+
+    return runfiles, cache_job_id_mask, assemblies, tempdir, preread_requests
+
+
+def write_job_lists(
+    jobs: list[list[Path]], tempdir: str | Path, cache_job_id_mask: dict
+) -> list[Path]:
+    """write a JOB_LIST_EXT file for all jobs consisting of more than one config file
+
+    cache_job_id_mask is updated with the combined hold pattern of the jobs members
+    returns the list of runfiles (config files or job list files)
+    """
+    runfiles = []
+    for job_idx, job in enumerate(jobs):
+        if len(job) == 1:
+            runfiles.append(job[0])
+            continue
+
+        outfile = Path(tempdir).joinpath(f"packed_{job_idx + 1:04d}{JOB_LIST_EXT}")
+        print(f"writing file {outfile}")
+        with open(outfile, "w", encoding="utf-8") as j:
+            j.write("\n".join(map(str, job)))
+            j.write("\n")
+        # -hold_jid takes a comma separated list of job names
+        hold_patterns = []
+        for _file in job:
+            for hold_pattern in cache_job_id_mask[_file].split(","):
+                if hold_pattern and hold_pattern not in hold_patterns:
+                    hold_patterns.append(hold_pattern)
+        cache_job_id_mask[outfile] = ",".join(hold_patterns)
+        runfiles.append(outfile)
+
+    return runfiles
+
 
-                dir_idx += 1
-                runfiles.append(outfile)
-                if options["verbose"]:
-                    print(out_cfg)
+def get_job_members(runfile: str | Path) -> list[Path]:
+    """return the config files run by a queue job
 
-    return runfiles, cache_job_id_mask, json_run_dirs, tempdir
+    That's the runfile itself unless it's a JOB_LIST_EXT file
+    """
+    if fnmatch(str(runfile), f"*{JOB_LIST_EXT}"):
+        with open(runfile, "r", encoding="utf-8") as inhandle:
+            return [Path(line.strip()) for line in inhandle if line.strip()]
+    return [Path(runfile)]
 
 
 def write_obs_config(config: dict, tempdir: [Path, str], outfile: [Path, str]):
@@ -279,13 +721,22 @@ def get_runfile_str(
     module=ENV_MODULE_NAME,
     hold_pattern=None,
     ram=DEFAULT_ANA_RAM,
+    output_store=None,
+    priority=QSUB_ANA_PRIORITY,
+    cache_pool=None,
+    pyaro_snapshot=None,
 ) -> str:
     """create list of strings with runfile for gridengine
 
     Parameters
     ----------
+    priority: queue priority of the job
+    cache_pool: read the pyaerocom cache files from this cache pool
+    pyaro_snapshot: read pyaro obs networks from their snapshot in this directory
+    output_store
     hold_pattern
-    file
+    file: config file to run; if None, a generic runfile is created
+        and the config file(s) to run are taken from the job's command line
     queue_name
     script_name
     wd
@@ -296,18 +747,29 @@ def get_runfile_str(
     """
     # create runfile
 
+    if file is None:
+        # the job name is set on the qsub command line in this case
+        job_name = QSUB_ANA_JOB_START
+        file_str = '"$@"'
+        echo_file_str = "$*"
+    else:
+        job_name = f"{QSUB_ANA_JOB_START}_{Path(file).stem}"
+        file_str = str(file)
+        echo_file_str = file_str
+
     if wd is None:
         wd = Path(file).parent
 
-    if script_name is None:
+    if script_name is None and file is not None:
         script_name = str(file.with_name(f"{file.stem}{'.run'}"))
     elif isinstance(script_name, Path):
         script_name = str(script_name)
 
     runfile_str = f"""#!/bin/bash -l
 #$ -S /bin/bash
-#$ -N pya_{RND}_ana_{Path(file).stem}
+#$ -N {job_name}
 #$ -q {queue_name}
+#$ -p {priority}
 #$ -pe shmem-1 1
 #$ -wd {wd}
 #$ -l h_rt=48:00:00
@@ -325,9 +787,17 @@ def get_runfile_str(
 #$ -o {logdir}/
 #$ -e {logdir}/
 """
-    if hold_pattern is not None and isinstance(hold_pattern, str):
+    if hold_pattern and isinstance(hold_pattern, str):
         runfile_str += f"""#$ -hold_jid {hold_pattern}\n"""
 
+    runscript_opts = ""
+    if output_store is not None:
+        runscript_opts += f"--output-store {output_store} "
+    if cache_pool is not None:
+        runscript_opts += f"--cache-pool {cache_pool} "
+    if pyaro_snapshot is not None:
+        runscript_opts += f"--pyaro-snapshot {pyaro_snapshot} "
+
     runfile_str += f"""
 logdir="{logdir}/"
 date="{date}"
@@ -338,8 +808,8 @@ echo "{DEFAULT_PYTHON} --version" >> ${{logfile}} 2>&1
 {DEFAULT_PYTHON} --version >> ${{logfile}} 2>&1
 pwd >> ${{logfile}} 2>&1
 export PYAEROCOM_LOG_FILE="${{logdir}}/${{USER}}.${{date}}.${{JOB_NAME}}.${{JOB_ID}}_pyalog.txt"
-echo "starting {file} ..." >> ${{logfile}}
-{str(JSON_RUNSCRIPT)} {str(file)}
+echo "starting {echo_file_str} ..." >> ${{logfile}}
+{str(JSON_RUNSCRIPT)} {runscript_opts}{file_str}
 
 """
     return runfile_str
@@ -379,7 +849,8 @@ def run_queue(
 
     for idx, _file in enumerate(runfiles):
         try:
-            hold_pattern = options["hold_jid"][_file]
+            # exact ids of the jobs submitted already
+            hold_pattern = resolve_hold_jid(options["hold_jid"][_file])
         except KeyError:
             hold_pattern = None
         # create tmp dir on qsub host; retain some parts
@@ -413,6 +884,10 @@ def run_queue(
             module=options["env_mod"],
             ram=options["anaram"],
             queue_name=qsub_queue,
+            priority=options.get("ana_priority", QSUB_ANA_PRIORITY),
+            output_store=options.get("output_store"),
+            cache_pool=options.get("cache_pool"),
+            pyaro_snapshot=options.get("pyaro_snapshot"),
         )
         with open(qsub_run_file_name, "w") as f:
             f.write(dummy_str)
@@ -466,6 +941,7 @@ qsub {qsub_run_file_name}
             else:
                 print("success...")
                 print(f"{sh_result.stdout}")
+                register_qsub_output(sh_result.stdout)
 
         else:
             print(f"qsub run file created.")
@@ -473,23 +949,230 @@ qsub {qsub_run_file_name}
     return True
 
 
+def run_queue_bundled(
+    runfiles: list[Path],
+    qsub_dir: str = QSUB_DIR,
+    qsub_queue: str = QSUB_QUEUE_NAME,
+    submit_flag: bool = False,
+    options: dict = {},
+):
+    """submit runfiles to the remote cluster using one generic runfile
+
+    Instead of a .run and a .sh file per job, a single generic .run file and a single
+    start script with one qsub command per job are written. Job name and hold pattern
+    of each job are given on the qsub command line.
+    :param runfiles:
+    :param qsub_dir:
+    :param qsub_queue:
+    :param submit_flag:
+    :param options:
+    :return:
+
+    """
+    import shlex
+    import subprocess
+
+    qsub_run_file_name = Path(qsub_dir).joinpath(f"{QSUB_ANA_JOB_START}.run")
+    dummy_str = get_runfile_str(
+        None,
+        wd=qsub_dir,
+        module=options["env_mod"],
+        ram=options["anaram"],
+        queue_name=qsub_queue,
+        priority=options.get("ana_priority", QSUB_ANA_PRIORITY),
+        output_store=options.get("output_store"),
+        cache_pool=options.get("cache_pool"),
+        pyaro_snapshot=options.get("pyaro_snapshot"),
+    )
+    with open(qsub_run_file_name, "w") as f:
+        f.write(dummy_str)
+    print(f"wrote file {qsub_run_file_name}")
+
+    start_script_arr = ["#!/bin/bash -l"]
+    for _file in runfiles:
+        qsub_arr = ["qsub", "-N", f"{QSUB_ANA_JOB_START}_{_file.stem}"]
+        if options.get("hold_jid", {}).get(_file):
+            qsub_arr += ["-hold_jid", resolve_hold_jid(options["hold_jid"][_file])]
+        qsub_arr += [qsub_run_file_name, _file]
+        start_script_arr.append(" ".join(shlex.quote(str(x)) for x in qsub_arr))
+    start_script_arr.append("")
+
+    qsub_start_file_name = Path(qsub_dir).joinpath(f"{QSUB_ANA_JOB_START}.sh")
+    with open(qsub_start_file_name, "w") as f:
+        f.write("\n".join(start_script_arr))
+    print(f"wrote file {qsub_start_file_name}")
+
+    if submit_flag:
+        cmd_arr = ["/usr/bin/bash", "-l", qsub_start_file_name]
+        print(f"running command {' '.join(map(str, cmd_arr))}...")
+        sh_result = subprocess.run(cmd_arr, capture_output=True)
+        if sh_result.returncode != 0:
+            print(f"return code: {sh_result.returncode}")
+            print(f"{sh_result.stderr}")
+        else:
+            print("success...")
+        print(f"{sh_result.stdout}")
+        register_qsub_output(sh_result.stdout)
+    else:
+        print(f"qsub files created.")
+        print(f"you can start the jobs with the command: bash {qsub_start_file_name}.")
+    return True
+
+
+def get_exp_dir(combinedir: str | Path) -> Path:
+    """return the experiment directory (<project dir>/<experiment dir>) of a parallel run's output"""
+    # there should be just one project directory. Use the 1st only anyway
+    proj_dir = next(Path(combinedir).iterdir())
+    return [child for child in proj_dir.iterdir() if Path.is_dir(child)][0]
+
+
+def merge_experiments_json(proj_dir: Path, outdir: Path):
+    """copy / merge {project_name}/experiments.json to the project of outdir"""
+    import shutil
+
+    exp_in_file = Path.joinpath(proj_dir, EXPERIMENT_JSON_FILE)
+    exp_out_file = Path(outdir).parent.joinpath(EXPERIMENT_JSON_FILE)
+    if exp_out_file.exists():
+        # merge file
+        combine_json_files([exp_out_file, exp_in_file], exp_out_file)
+    else:
+        shutil.copy2(exp_in_file, exp_out_file)
+
+
+def set_exp_ids(
+    cfg: dict, proj_id: str, exp_id: str, exp_info: dict | None = None
+) -> dict:
+    """set all proj_id and exp_id entries of a (nested) stored aeroval config
+
+    exp_info optionally holds further entries to replace (e.g. exp_name, see get_exp_info)
+    """
+    if exp_info is None:
+        exp_info = {}
+    for key, value in cfg.items():
+        if key == "proj_id":
+            cfg[key] = proj_id
+        elif key == "exp_id":
+            cfg[key] = exp_id
+        elif key in exp_info:
+            cfg[key] = exp_info[key]
+        elif isinstance(value, dict):
+            set_exp_ids(value, proj_id, exp_id, exp_info=exp_info)
+    return cfg
+
+
+def get_exp_info(config_file: str | None, cfgvar: str = "CFG") -> dict:
+    """return the entries of EXP_INFO_KEYS of an aeroval config file
+
+    returns an empty dict if config_file is None
+    """
+    if config_file is None:
+        return {}
+    cfg = read_config_var(config_file, cfgvar)
+    return {key: cfg[key] for key in EXP_INFO_KEYS if key in cfg}
+
+
+def fan_out_output(
+    combinedir: str | Path,
+    outdir: Path,
+    config_file: str | None = None,
+    cfgvar: str = "CFG",
+) -> Path:
+    """provide the output of a job shared by several experiments to the experiment in outdir
+
+    the output of combinedir is copied to <combinedir>.<project>.<experiment> using the
+    project and experiment names of outdir (<project dir>/<experiment dir>)
+    the experiment's name, description and PI are taken from config_file
+    (the aeroval config of the target experiment) if given
+    returns the directory to combine (combinedir if it belongs to the experiment already)
+    """
+    import shutil
+
+    src_exp_dir = get_exp_dir(combinedir)
+    proj_id, exp_id = Path(outdir).parts[-2:]
+    if src_exp_dir.parts[-2:] == (proj_id, exp_id):
+        return Path(combinedir)
+
+    target_dir = Path(f"{combinedir}.{proj_id}.{exp_id}")
+    exp_dir = target_dir.joinpath(proj_id, exp_id)
+    print(f"fanning out {src_exp_dir} to {exp_dir}...")
+    shutil.copytree(src_exp_dir, exp_dir, dirs_exist_ok=True)
+    exp_info = get_exp_info(config_file, cfgvar)
+
+    # the config file and experiments.json name the experiment
+    src_cfg_file = exp_dir.joinpath(
+        f"cfg_{src_exp_dir.parts[-2]}_{src_exp_dir.parts[-1]}.json"
+    )
+    if src_cfg_file.exists():
+        with open(src_cfg_file, "r") as inhandle:
+            aeroval_config = set_exp_ids(
+                json.load(inhandle), proj_id, exp_id, exp_info=exp_info
+            )
+        with open(
+            exp_dir.joinpath(f"cfg_{proj_id}_{exp_id}.json"), "w", encoding="utf-8"
+        ) as outhandle:
+            json.dump(aeroval_config, outhandle, ensure_ascii=False, indent=4)
+        src_cfg_file.unlink()
+
+    src_exp_file = src_exp_dir.parent.joinpath(EXPERIMENT_JSON_FILE)
+    if src_exp_file.exists():
+        with open(src_exp_file, "r") as inhandle:
+            experiments = json.load(inhandle)
+        exp_entry = experiments.get(src_exp_dir.parts[-1], {})
+        exp_entry.update(exp_info)
+        with open(
+            exp_dir.parent.joinpath(EXPERIMENT_JSON_FILE), "w", encoding="utf-8"
+        ) as outhandle:
+            json.dump(
+                {exp_id: exp_entry},
+                outhandle,
+                ensure_ascii=False,
+                indent=4,
+            )
+    return target_dir
+
+
 def combine_output(options: dict):
-    """combine the json files of the parallelised outputs to a single target directory (experiment)"""
+    """combine the json files of the parallelised outputs to a single target directory (experiment)
+
+    if options["merge"] is set, the outputs are merged into the existing experiment
+    in options["outdir"]; files of the outputs replace existing content
+
+    if options["fan_out"] is set, outputs of other experiments (jobs shared in campaign mode)
+    are fanned out to the experiment in options["outdir"] first (see fan_out_output)
+    """
     import shutil
 
+    merge_flag = options.get("merge", False)
     # create outdir
     try:
         # remove files first to remove artefacts
-        # TODO: This might not always what we want to do (merging of different runs)
-        try:
-            shutil.rmtree(options["outdir"])
-        except (FileNotFoundError, OSError):
-            pass
+        # unless merging into an existing experiment is requested
+        if not merge_flag:
+            try:
+                shutil.rmtree(options["outdir"])
+            except (FileNotFoundError, OSError):
+                pass
         Path.mkdir(options["outdir"], parents=True, exist_ok=True)
     except FileExistsError:
         pass
 
-    for idx, combinedir in enumerate(sorted(options["files"])):
+    combinedirs = sorted(options["files"])
+    if options.get("fan_out", False):
+        # the experiment's own outputs first, so that its experiments.json entry is used
+        fanned_out = [
+            fan_out_output(
+                _dir,
+                options["outdir"],
+                config_file=options.get("fan_out_config"),
+                cfgvar=options.get("cfgvar", "CFG"),
+            )
+            for _dir in combinedirs
+        ]
+        combinedirs = [
+            _dir for _dir, orig in zip(fanned_out, combinedirs) if _dir == Path(orig)
+        ] + [_dir for _dir, orig in zip(fanned_out, combinedirs) if _dir != Path(orig)]
+
+    for idx, combinedir in enumerate(combinedirs):
         # tmp dirs look like this: tmpggb7k02d.0001, tmpggb7k02d.0002
         # create common assembly directory
         # assemble the data
@@ -497,7 +1180,11 @@ def combine_output(options: dict):
 
         print(f"input dir: {combinedir}")
         # The following is not always wanted since we might want to add some data to an existing experiment
-        if idx == 0:
+        if merge_flag:
+            exp_dir = get_exp_dir(combinedir)
+            # the experiment might be new to the project
+            merge_experiments_json(exp_dir.parent, options["outdir"])
+        if idx == 0 and not merge_flag:
             # copy first directory to options['outdir']
             for dir_idx, dir in enumerate(Path(combinedir).iterdir()):
                 # there should be just one directory. Use the 1st only anyway
@@ -509,15 +1196,7 @@ def combine_output(options: dict):
                     # but it might need not exist on the target ==> copy it
                     # if it's existing, then merge with the one of the current experiment
                     # so copy / merge experiments.json first
-                    exp_in_file = Path.joinpath(dir, EXPERIMENT_JSON_FILE)
-                    exp_out_file = Path(options["outdir"]).parent.joinpath(
-                        EXPERIMENT_JSON_FILE
-                    )
-                    if exp_out_file.exists():
-                        # merge file
-                        combine_json_files([exp_out_file, exp_in_file], exp_out_file)
-                    else:
-                        shutil.copy2(exp_in_file, exp_out_file)
+                    merge_experiments_json(dir, options["outdir"])
 
                     # shutil.copytree(dir, options["outdir"], dirs_exist_ok=True)
                     shutil.copytree(exp_dir, options["outdir"], dirs_exist_ok=True)
@@ -572,6 +1251,9 @@ def combine_output(options: dict):
                     if outfile.exists():
                         # should always fire since we handle the 1st directory above
                         infiles = [_file, outfile]
+                        if merge_flag:
+                            # the new content wins
+                            infiles = [outfile, _file]
                         print(f"writing combined json file {outfile}...")
                         # t = Thread(target=combine_json_files, args=(infiles, outfile))
                         # t.start()
@@ -599,6 +1281,9 @@ def combine_output(options: dict):
                         outfile = out_target_dir.joinpath(cmp_file)
                         if outfile.exists():
                             infiles = [_file, outfile]
+                            if merge_flag:
+                                # the new content wins
+                                infiles = [outfile, _file]
                             print(f"writing combined json file {outfile}...")
                             combine_json_files(infiles, outfile)
                         else:
@@ -685,13 +1370,28 @@ def match_file(
     return ret_val
 
 
-def read_config_var(config_file: str, cfgvar: str = "CFG") -> dict:
+def read_config_var(
+    config_file: str,
+    cfgvar: str = "CFG",
+    use_cache: bool = True,
+    cache_dir: str | Path | None = CONFIG_CACHE_DIR,
+) -> dict:
     """method to read the aeroval config file
 
+    configs are cached in process and Python configs also on disk (in cache_dir),
+    see config_cache.py. Set use_cache to False to always read the file.
+
     returns the config variable"""
 
     # read aeroval configuration file
     _file = config_file
+    # plan entries do not exist on disk and are not cached
+    use_cache = use_cache and not fnmatch(_file, f"*{PLAN_ENTRY_EXT}")
+    if use_cache:
+        cfg = get_cached_config(_file, cfgvar, cache_dir=cache_dir)
+        if cfg is not None:
+            return cfg
+
     if fnmatch(_file, "*.py"):
         module_name = "dummy_mod"
         spec = importlib.util.spec_from_file_location(module_name, _file)
@@ -701,7 +1401,7 @@ def read_config_var(config_file: str, cfgvar: str = "CFG") -> dict:
         # the following line does unfortunately not work since a module is not subscriptable
         # CFG = module[options["cfgvar"]]
         # use getattr instead
-        cfg = deepcopy(getattr(module, cfgvar))
+        cfg = getattr(module, cfgvar)
 
     elif fnmatch(_file, f"*{JSON_EXT}"):
         with open(_file, "r", encoding="utf-8") as j:
@@ -710,11 +1410,28 @@ def read_config_var(config_file: str, cfgvar: str = "CFG") -> dict:
         with open(_file, "r", encoding="utf-8") as j:
             json_string = j.read()
         cfg = jsonpickle.decode(json_string)
+    elif fnmatch(_file, f"*{CFG_JSON_EXT}") or fnmatch(_file, f"*{CFG_MSGPACK_EXT}"):
+        cfg = read_config_file(_file)
+    elif fnmatch(_file, f"*{PLAN_ENTRY_EXT}"):
+        cfg = read_plan_entry_path(_file)
     else:
-        msg = f"""Error: {config_file} has to be either a Python file, a {JSON_EXT} file or a {PICKLE_JSON_EXT} file.
+        msg = f"""Error: {config_file} has to be either a Python file, a {JSON_EXT} file, a {PICKLE_JSON_EXT} file,
+a {CFG_JSON_EXT} or {CFG_MSGPACK_EXT} file or a plan entry ({PLAN_ENTRY_EXT}).
 exiting now..."""
         print(msg)
         sys.exit(1)
+
+    if use_cache:
+        # json files are already in serialised form; cache Python configs only on disk
+        cache_config(
+            _file,
+            cfgvar,
+            cfg,
+            cache_dir=cache_dir,
+            disk_cache=fnmatch(_file, "*.py"),
+        )
+    elif fnmatch(_file, "*.py"):
+        cfg = deepcopy(cfg)
     return cfg
 
 
@@ -726,8 +1443,22 @@ def get_config_info(
     """method to return the used observations and variables in a formatted way
 
     returns a dict with the obs network name as key and the corresponding variables as values
+    for a JOB_LIST_EXT file, the obs networks and variables of all listed config files are returned
     """
 
+    if not cfg and fnmatch(str(config_file), f"*{JOB_LIST_EXT}"):
+        var_config = {}
+        for _file in get_job_members(config_file):
+            for obs_id, obs_info in get_config_info(_file, cfgvar).items():
+                if obs_id not in var_config:
+                    var_config[obs_id] = deepcopy(obs_info)
+                    var_config[obs_id]["obs_vars"] = get_obs_vars(obs_info)
+                    continue
+                for _var in get_obs_vars(obs_info):
+                    if _var not in var_config[obs_id]["obs_vars"]:
+                        var_config[obs_id]["obs_vars"].append(_var)
+        return var_config
+
     if not cfg:
         cfg = read_config_var(config_file=config_file, cfgvar=cfgvar)
 
@@ -894,10 +1625,17 @@ def get_assembly_job_str(
     module=ENV_MODULE_NAME,
     hold_pattern=None,
     ram=DEFAULT_ASSEMBLY_RAM,
+    merge: bool = False,
+    fan_out: bool = False,
+    priority=QSUB_ASSEMBLY_PRIORITY,
+    config_file=None,
 ):
     """method to create an assembly job in the PPI queue
 
-    Will wait on all other jobs of the current job ID to finish"""
+    Will wait on all other jobs of the current job ID to finish
+    if merge is set, the output is merged into the existing experiment in out_dir
+    if fan_out is set, outputs of other experiments are fanned out to out_dir first
+    (using the experiment's name, description and PI of config_file if given)"""
 
     if script_name is None:
         script_name = f"pya_{job_id}_assembly.run"
@@ -911,6 +1649,9 @@ def get_assembly_job_str(
     assembly_cmd_arr = [
         "aeroval_parallelize",
         "-c",
+        *(["--merge"] if merge else []),
+        *(["--fan-out"] if fan_out else []),
+        *(["--fan-out-config", f"'{config_file}'"] if fan_out and config_file else []),
         "-o",
         f"'{out_dir}'",
         f"'{in_dir_str}'",
@@ -923,6 +1664,7 @@ def get_assembly_job_str(
 #$ -S /bin/bash
 #$ -N pya_{job_id}_assembly
 #$ -q {queue_name}
+#$ -p {priority}
 #$ -pe shmem-1 1
 #$ -wd {wd}
 #$ -l h_rt=8:00:00
@@ -937,7 +1679,7 @@ def get_assembly_job_str(
 #$ -o {logdir}/
 #$ -e {logdir}/
 """
-    if hold_pattern is not None and isinstance(hold_pattern, str):
+    if hold_pattern and isinstance(hold_pattern, str):
         runfile_str += f"""#$ -hold_jid {hold_pattern}\n"""
 
     runfile_str += f"""
@@ -1103,6 +1845,7 @@ qsub {qsub_run_file_name}
             else:
                 print("success...")
                 print(f"{sh_result.stdout}")
+                register_qsub_output(sh_result.stdout)
 
         else:
             print(f"qsub files created.")
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+pre-flight validation of the split aeroval configs
+
+Every config is turned into an EvalSetup (without running the ExperimentProcessor)
+in a local process pool before anything is submitted. Identical errors of many
+jobs are summarised.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+
+from aeroval_parallelize.model_preread import PREREAD_KEY
+from aeroval_parallelize.output_store import STORE_HASH_KEY
+from aeroval_parallelize.sharding import SHARD_COLDATA_KEY
+
+# maximum number of processes used for the validation (the login nodes are shared)
+VALIDATION_PROCESSES = 8
+
+
+class ConfigValidationError(Exception):
+    """raised if split configs are not valid
+
+    errors is a dict with the job name as key and the error message as value
+    """
+
+    def __init__(self, errors: dict):
+        super().__init__(f"{len(errors)} config(s) failed validation")
+        self.errors = errors
+
+
+def validate_config(cfg: dict) -> str | None:
+    """return the error message of EvalSetup for a config or None if the config is valid"""
+    # to avoid that lustre access is checked if the module is just imported
+    from pyaerocom.aeroval import EvalSetup
+
+    cfg = {
+        key: value
+        for key, value in cfg.items()
+        if key not in [SHARD_COLDATA_KEY, PREREAD_KEY, STORE_HASH_KEY]
+    }
+    try:
+        EvalSetup(**cfg)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def validate_configs(cfgs: dict, processes: int = VALIDATION_PROCESSES) -> dict:
+    """validate configs in a process pool
+
+    cfgs is a dict with the job name as key and the config as value
+    returns a dict with the job name as key and the error message as value (only failed jobs)
+    """
+    names = list(cfgs)
+    if processes == 1 or len(names) < 2:
+        results = [validate_config(cfgs[name]) for name in names]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(
+                executor.map(validate_config, [cfgs[name] for name in names])
+            )
+    return {name: error for name, error in zip(names, results) if error is not None}
+
+
+def print_validation_summary(errors: dict, max_names: int = 5) -> None:
+    """print the validation errors; jobs with identical errors are listed together"""
+    jobs_per_error = {}
+    for name, error in errors.items():
+        jobs_per_error.setdefault(error, []).append(name)
+
+    print(f"{len(errors)} config(s) failed validation:")
+    for error, names in jobs_per_error.items():
+        name_str = ", ".join(names[:max_names])
+        if len(names) > max_names:
+            name_str += f" and {len(names) - max_names} more"
+        print(f"{len(names)} job(s) ({name_str}):\n    {error}")
@@ -0,0 +1,112 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from aeroval_parallelize.cache_pool import (
+    POOL_LOCK_DIR_NAME,
+    cache_pool_lock,
+    evict_cache_pool,
+    get_pool_files_dir,
+    remove_stale_lock,
+    try_lock,
+)
+
+DAY = 24 * 3600
+
+
+class TestCachePoolLock(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pool_dir = Path(self.tmp_dir.name)
+        self.lock_file = self.pool_dir.joinpath(POOL_LOCK_DIR_NAME, "key.lock")
+        self.lock_file.parent.mkdir(parents=True)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def hold_lock(self, hold_time: float, events: list, **kwargs):
+        with cache_pool_lock(self.lock_file.stem, pool_dir=self.pool_dir, **kwargs):
+            events.append("acquired")
+            time.sleep(hold_time)
+            events.append("released")
+
+    def test_try_lock(self):
+        self.assertTrue(try_lock(self.lock_file))
+        self.assertFalse(try_lock(self.lock_file))
+
+    def test_contention(self):
+        events = []
+        holder = threading.Thread(target=self.hold_lock, args=(0.5, events))
+        holder.start()
+        while not events:
+            time.sleep(0.01)
+        self.hold_lock(0, events, poll_interval=0.05)
+        holder.join()
+        self.assertEqual(events, ["acquired", "released"] * 2)
+        self.assertFalse(self.lock_file.exists())
+
+    def test_stale_lock_takeover(self):
+        self.lock_file.write_text("otherhost 1 2000-01-01T00:00:00\n")
+        os.utime(self.lock_file, (time.time() - 2 * DAY,) * 2)
+        self.assertFalse(remove_stale_lock(self.lock_file, timeout=DAY * 3))
+        events = []
+        self.hold_lock(0, events, timeout=DAY, poll_interval=0.05)
+        self.assertEqual(events, ["acquired", "released"])
+        self.assertEqual(list(self.lock_file.parent.iterdir()), [])
+
+    def test_refreshed_lock_is_kept(self):
+        events = []
+        holder = threading.Thread(
+            target=self.hold_lock,
+            args=(1.0, events),
+            kwargs={"refresh_interval": 0.05},
+        )
+        holder.start()
+        while not events:
+            time.sleep(0.01)
+        # the holder runs longer than the timeout, but refreshes its lock
+        self.hold_lock(0, events, timeout=0.3, poll_interval=0.05)
+        holder.join()
+        self.assertEqual(events, ["acquired", "released"] * 2)
+
+
+class TestEvictCachePool(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pool_dir = Path(self.tmp_dir.name)
+        self.files_dir = get_pool_files_dir(self.pool_dir)
+        self.files_dir.mkdir(parents=True)
+        now = time.time()
+        self.files = {}
+        for name, last_use in [
+            ("oldest", now - 3 * DAY),
+            ("old", now - 2 * DAY),
+            ("recent", now - 3600),
+        ]:
+            cache_file = self.files_dir.joinpath(f"{name}.pkl")
+            cache_file.write_bytes(b"0" * 1024)
+            os.utime(cache_file, (last_use, last_use))
+            self.files[name] = cache_file
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_lru_order(self):
+        removed = evict_cache_pool(self.pool_dir, quota=2048 / 1024**3)
+        self.assertEqual(removed, [self.files["oldest"]])
+        self.assertTrue(self.files["old"].exists())
+
+    def test_min_age(self):
+        removed = evict_cache_pool(self.pool_dir, quota=0, min_age=DAY)
+        self.assertEqual(removed, [self.files["oldest"], self.files["old"]])
+        self.assertTrue(self.files["recent"].exists())
+
+    def test_below_quota(self):
+        self.assertEqual(evict_cache_pool(self.pool_dir, quota=1), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
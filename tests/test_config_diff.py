@@ -0,0 +1,118 @@
+import tempfile
+import unittest
+from copy import deepcopy
+from pathlib import Path
+
+import simplejson as json
+
+from aeroval_parallelize.config_diff import (
+    DIFF_IGNORE_KEYS,
+    filter_changed_units,
+    get_changed_globals,
+    is_unit_changed,
+    read_stored_config,
+)
+
+STORED_CFG = {
+    "proj_id": "test",
+    "exp_id": "exp1",
+    "exp_descr": "test experiment",
+    "json_basedir": "/data/aeroval",
+    "periods": ["2019"],
+    "colocation_opts": {"ts_type": "monthly", "resample_how": "mean"},
+    "model_cfg": {
+        "EMEP": {"model_id": "EMEP.ctrl", "model_ts_type_read": "daily"},
+        "TM5": {"model_id": "TM5.ctrl"},
+    },
+    "obs_cfg": {
+        "AN": {"obs_id": "AeronetSunV3Lev2.daily", "obs_vars": ["od550aer"]},
+        "EBAS": {"obs_id": "EBASMC", "obs_vars": ["concpm10"]},
+    },
+}
+
+
+def get_unit(model_name: str, obs_name: str, cfg: dict) -> dict:
+    return {
+        "name": f"{model_name}_{obs_name}",
+        "cfg": {
+            "model_cfg": {model_name: deepcopy(cfg["model_cfg"][model_name])},
+            "obs_cfg": {obs_name: deepcopy(cfg["obs_cfg"][obs_name])},
+        },
+    }
+
+
+class TestConfigDiff(unittest.TestCase):
+    def setUp(self):
+        # the new config only holds a part of the stored options
+        self.cfg = deepcopy(STORED_CFG)
+        del self.cfg["colocation_opts"]
+        self.cfg["ts_type"] = "monthly"
+
+    def get_units(self) -> list:
+        return [
+            get_unit(model_name, obs_name, self.cfg)
+            for model_name in self.cfg["model_cfg"]
+            for obs_name in self.cfg["obs_cfg"]
+        ]
+
+    def get_changed_names(self) -> list:
+        units = filter_changed_units(self.get_units(), self.cfg, STORED_CFG)
+        return [unit["name"] for unit in units]
+
+    def test_unchanged(self):
+        self.assertEqual(get_changed_globals(self.cfg, STORED_CFG), [])
+        self.assertEqual(self.get_changed_names(), [])
+
+    def test_changed_model_entry(self):
+        self.cfg["model_cfg"]["EMEP"]["model_ts_type_read"] = "hourly"
+        self.assertEqual(self.get_changed_names(), ["EMEP_AN", "EMEP_EBAS"])
+
+    def test_new_model_entry(self):
+        self.cfg["model_cfg"]["EMEP"]["model_add_vars"] = {"od550aer": ["od550so4"]}
+        self.cfg["model_cfg"]["NEW"] = {"model_id": "NEW.ctrl"}
+        self.assertEqual(
+            self.get_changed_names(), ["EMEP_AN", "EMEP_EBAS", "NEW_AN", "NEW_EBAS"]
+        )
+
+    def test_changed_obs_entry(self):
+        self.cfg["obs_cfg"]["EBAS"]["obs_vars"] = ["concpm10", "concpm25"]
+        self.assertEqual(self.get_changed_names(), ["EMEP_EBAS", "TM5_EBAS"])
+
+    def test_changed_plot_types(self):
+        unit = get_unit("EMEP", "AN", self.cfg)
+        self.assertFalse(is_unit_changed(unit["cfg"], STORED_CFG))
+        unit["cfg"]["plot_types"] = {"EMEP": "overlay"}
+        self.assertTrue(is_unit_changed(unit["cfg"], STORED_CFG))
+
+    def test_changed_global_key(self):
+        self.cfg["ts_type"] = "daily"
+        self.cfg["periods"] = ["2019", "2020"]
+        self.assertEqual(
+            get_changed_globals(self.cfg, STORED_CFG), ["periods", "ts_type"]
+        )
+        self.assertEqual(len(self.get_changed_names()), 4)
+
+    def test_new_global_key(self):
+        self.cfg["filter_name"] = "WORLD-wMOUNTAINS"
+        self.assertEqual(get_changed_globals(self.cfg, STORED_CFG), ["filter_name"])
+
+    def test_ignored_keys(self):
+        for key in DIFF_IGNORE_KEYS:
+            self.cfg[key] = "changed"
+        self.assertEqual(get_changed_globals(self.cfg, STORED_CFG), [])
+        self.assertEqual(self.get_changed_names(), [])
+
+
+class TestReadStoredConfig(unittest.TestCase):
+    def test_read(self):
+        with tempfile.TemporaryDirectory() as exp_dir:
+            with self.assertRaises(FileNotFoundError):
+                read_stored_config(exp_dir)
+            cfg_file = Path(exp_dir).joinpath("cfg_test_exp1.json")
+            with open(cfg_file, "w", encoding="utf-8") as outhandle:
+                json.dump(STORED_CFG, outhandle)
+            self.assertEqual(read_stored_config(exp_dir), STORED_CFG)
+
+
+if __name__ == "__main__":
+    unittest.main()
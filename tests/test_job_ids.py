@@ -0,0 +1,71 @@
+import unittest
+
+from aeroval_parallelize import job_ids
+from aeroval_parallelize.cache_tools import QSUB_SCRIPT_START, get_hold_jid
+from aeroval_parallelize.job_ids import (
+    get_job_id,
+    register_qsub_output,
+    resolve_hold_jid,
+)
+
+QSUB_OUTPUT = """Your job 4711 ("pya_1234_ana_cfg_EMEP_AN") has been submitted
+Your job-array 4712.1-4:1 ("pya_1234_ana_cfg_EMEP_EBAS") has been submitted
+"""
+
+
+class TestJobIds(unittest.TestCase):
+    def setUp(self):
+        job_ids._JOB_IDS.clear()
+
+    def tearDown(self):
+        job_ids._JOB_IDS.clear()
+
+    def test_register(self):
+        jobs = register_qsub_output(QSUB_OUTPUT.encode("utf-8"))
+        self.assertEqual(
+            jobs,
+            {
+                "pya_1234_ana_cfg_EMEP_AN": "4711",
+                "pya_1234_ana_cfg_EMEP_EBAS": "4712",
+            },
+        )
+        self.assertEqual(get_job_id("pya_1234_ana_cfg_EMEP_AN"), "4711")
+        self.assertEqual(get_job_id("pya_1234_ana_cfg_EMEP_EBAS"), "4712")
+
+    def test_unparsable_output(self):
+        self.assertEqual(register_qsub_output("qsub: Unknown option -hold"), {})
+        self.assertIsNone(get_job_id("pya_1234_ana_cfg_EMEP_AN"))
+        # without submitted jobs the names are kept
+        self.assertEqual(
+            resolve_hold_jid("pya_1234_ana_cfg_EMEP_AN,pya_1234_caching*"),
+            "pya_1234_ana_cfg_EMEP_AN,pya_1234_caching*",
+        )
+
+    def test_resolve_hold_jid(self):
+        register_qsub_output(QSUB_OUTPUT)
+        self.assertEqual(resolve_hold_jid("pya_1234_ana_*"), "4711,4712")
+        self.assertEqual(
+            resolve_hold_jid("pya_1234_ana_cfg_EMEP_AN,,pya_1234_preread_x"),
+            "4711,pya_1234_preread_x",
+        )
+        self.assertEqual(
+            resolve_hold_jid("pya_*,pya_1234_ana_cfg_EMEP_AN"), "4711,4712"
+        )
+        self.assertIsNone(resolve_hold_jid(None))
+
+
+class TestGetHoldJid(unittest.TestCase):
+    def test_cache_patterns_replaced(self):
+        hold_pattern = f"{QSUB_SCRIPT_START}EBAS*,pya_1234_ana_cfg_EMEP_EBAS_shard*"
+        self.assertEqual(
+            get_hold_jid(hold_pattern, "pya_1234_caching_EBAS_concpm10"),
+            "pya_1234_ana_cfg_EMEP_EBAS_shard*,pya_1234_caching_EBAS_concpm10",
+        )
+
+    def test_empty(self):
+        self.assertEqual(get_hold_jid(None, None), "")
+        self.assertEqual(get_hold_jid("", "a,,b"), "a,b")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from aeroval_parallelize.plan_file import (
+    PLAN_PARALLEL_MIN_ENTRIES,
+    get_plan_entry_path,
+    read_plan_entry,
+    read_plan_entry_path,
+    write_plan,
+)
+
+
+def get_cfg(idx: int) -> dict:
+    return {
+        "proj_id": "test",
+        "exp_id": f"exp{idx}",
+        "exp_descr": "Zürich, Tromsø, 北京 ✓",
+        "periods": ["2019-2020"],
+        "obs_cfg": {"EBAS": {"obs_id": "EBASMC", "obs_vars": ("concpm10",)}},
+        "model_cfg": {"EMEP": {"model_id": f"EMEP.{idx}", "model_data_dir": Path("/")}},
+    }
+
+
+class TestPlanFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.plan_dir = Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def check_plan(self, entries: dict, processes: int | None = None):
+        write_plan(self.plan_dir, entries, processes=processes)
+        for name, cfg in entries.items():
+            entry_path = get_plan_entry_path(self.plan_dir, name)
+            self.assertFalse(entry_path.exists())
+            self.assertEqual(read_plan_entry_path(entry_path), cfg)
+
+    def test_single_entry(self):
+        self.check_plan({"cfg_EMEP_EBAS": get_cfg(0)})
+
+    def test_non_ascii(self):
+        self.check_plan({f"cfg_{idx}_Tromsø": get_cfg(idx) for idx in range(5)})
+
+    def test_parallel_encoding(self):
+        self.check_plan(
+            {
+                f"cfg_{idx}": get_cfg(idx)
+                for idx in range(PLAN_PARALLEL_MIN_ENTRIES + 3)
+            },
+            processes=2,
+        )
+
+    def test_entry_by_position(self):
+        entries = {f"cfg_{idx}": get_cfg(idx) for idx in range(3)}
+        plan_file = write_plan(self.plan_dir, entries)
+        for idx, cfg in enumerate(entries.values()):
+            self.assertEqual(read_plan_entry(plan_file, idx), cfg)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import tempfile
+import unittest
+
+from aeroval_parallelize.planning import (
+    JOB_OVERHEAD,
+    OBS_NETWORK_COST_WEIGHTS,
+    VAR_YEAR_COST,
+    estimate_unit_cost,
+    pack_units,
+    record_runtime,
+    split_units,
+)
+
+WALLTIME = JOB_OVERHEAD + 1000
+
+
+def get_cfg(obs_vars: list, obs_id: str = "AeronetSunV3Lev2.daily") -> dict:
+    return {
+        "periods": ["2019-2020"],
+        "model_cfg": {"EMEP": {"model_id": "EMEP.ctrl"}},
+        "obs_cfg": {"AN": {"obs_id": obs_id, "obs_vars": obs_vars}},
+    }
+
+
+class TestEstimateUnitCost(unittest.TestCase):
+    def test_vars_and_years(self):
+        cost = estimate_unit_cost(get_cfg(["od550aer", "ang4487aer"]), history_dir=None)
+        self.assertEqual(cost, VAR_YEAR_COST * 2 * 2)
+
+    def test_network_weight(self):
+        cost = estimate_unit_cost(
+            get_cfg(["concpm10"], obs_id="EEAAQeRep.v2"), history_dir=None
+        )
+        self.assertEqual(cost, VAR_YEAR_COST * 2 * OBS_NETWORK_COST_WEIGHTS["EEA"])
+
+    def test_superobs_is_free(self):
+        cfg = get_cfg(["od550aer"])
+        cfg["obs_cfg"]["AN"]["is_superobs"] = True
+        self.assertEqual(estimate_unit_cost(cfg, history_dir=None), 0.0)
+
+    def test_runtime_history(self):
+        cfg = get_cfg(["od550aer"])
+        with tempfile.TemporaryDirectory() as history_dir:
+            record_runtime(cfg, 42.0, history_dir=history_dir)
+            self.assertEqual(estimate_unit_cost(cfg, history_dir=history_dir), 42.0)
+
+
+class TestPackUnits(unittest.TestCase):
+    def test_capacity(self):
+        costs = {"a": 600, "b": 500, "c": 400, "d": 300, "e": 100}
+        jobs = pack_units(costs, walltime=WALLTIME)
+        for job in jobs:
+            self.assertLessEqual(
+                JOB_OVERHEAD + sum(costs[unit] for unit in job), WALLTIME
+            )
+        self.assertEqual(sorted(unit for job in jobs for unit in job), sorted(costs))
+        self.assertEqual(jobs, [["a", "c"], ["b", "d", "e"]])
+
+    def test_oversize_unit(self):
+        jobs = pack_units({"small": 100, "huge": 5 * WALLTIME}, walltime=WALLTIME)
+        self.assertEqual(jobs, [["huge"], ["small"]])
+
+    def test_deterministic_order(self):
+        costs = {f"unit{idx}": 300 for idx in range(7)}
+        jobs = pack_units(costs, walltime=WALLTIME)
+        self.assertEqual(jobs, pack_units(dict(costs), walltime=WALLTIME))
+        # equal costs keep their order
+        self.assertEqual([unit for job in jobs for unit in job], list(costs))
+
+
+class TestSplitUnits(unittest.TestCase):
+    def test_split_along_vars(self):
+        obs_vars = ["od550aer", "ang4487aer", "abs550aer", "od440aer"]
+        unit = {"name": "EMEP_AN", "cfg": get_cfg(obs_vars)}
+        units = split_units([unit], walltime=WALLTIME, history_dir=None)
+        self.assertEqual(
+            [unit["name"] for unit in units], [f"EMEP_AN_{idx:02d}" for idx in (1, 2)]
+        )
+        self.assertEqual(
+            sorted(
+                var
+                for unit in units
+                for var in unit["cfg"]["obs_cfg"]["AN"]["obs_vars"]
+            ),
+            sorted(obs_vars),
+        )
+        for unit in units:
+            self.assertLessEqual(unit["cost"], WALLTIME - JOB_OVERHEAD)
+
+    def test_no_split(self):
+        unit = {"name": "EMEP_AN", "cfg": get_cfg(["od550aer"])}
+        units = split_units([unit], walltime=WALLTIME, history_dir=None)
+        self.assertEqual(units, [unit])
+        self.assertEqual(unit["cost"], VAR_YEAR_COST * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import math
+import unittest
+from pathlib import Path
+
+from aeroval_parallelize.serializer import (
+    SET_TAG,
+    TUPLE_TAG,
+    decode_config,
+    decode_config_msgpack,
+    encode_config,
+    encode_config_msgpack,
+    msgpack,
+)
+
+CFG = {
+    "proj_id": "test",
+    "periods": ["2019-2020"],
+    "min_num_obs": None,
+    "obs_cfg": {
+        "EEA": {
+            "obs_id": "EEAAQeRep.v2",
+            "obs_vars": ("concpm10", "concpm25"),
+            "obs_filters": {"altitude": [-20, math.inf]},
+        }
+    },
+    "model_cfg": {"EMEP": {"model_id": "EMEP.ctrl", "model_data_dir": Path("/tmp")}},
+    "fill_value": math.nan,
+    "ignore": {"EEA", "AN"},
+    # user dicts looking like tagged values
+    "user_tuple": {TUPLE_TAG: [1, 2]},
+    "user_set": {SET_TAG: []},
+}
+
+
+class TestSerializer(unittest.TestCase):
+    def check_round_trip(self, cfg):
+        self.assertTrue(math.isnan(cfg.pop("fill_value")))
+        self.assertEqual(
+            cfg, {key: value for key, value in CFG.items() if key != "fill_value"}
+        )
+
+    def test_json_round_trip(self):
+        self.check_round_trip(decode_config(encode_config(CFG)))
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_msgpack_round_trip(self):
+        self.check_round_trip(decode_config_msgpack(encode_config_msgpack(CFG)))
+
+
+if __name__ == "__main__":
+    unittest.main()
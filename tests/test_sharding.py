@@ -0,0 +1,111 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+from aeroval_parallelize.sharding import (
+    SHARD_LON_RANGE,
+    SHARD_NAME_START,
+    drop_duplicate_stations,
+    get_lon_band_filters,
+    parse_shard_option,
+    shard_units,
+)
+
+
+def get_coldata(stations: list[str], offset: float = 0.0) -> xr.DataArray:
+    return xr.DataArray(
+        np.arange(2 * len(stations), dtype=float).reshape(2, len(stations)) + offset,
+        dims=("data_source", "station_name"),
+        coords={"data_source": ["obs", "model"], "station_name": stations},
+    )
+
+
+class TestLonBands(unittest.TestCase):
+    def test_bands_cover_range(self):
+        filters = get_lon_band_filters(4)
+        bands = [obs_filter["longitude"] for obs_filter in filters]
+        self.assertEqual(bands[0][0], SHARD_LON_RANGE[0])
+        self.assertEqual(bands[-1][1], SHARD_LON_RANGE[1])
+        # no gaps between the bands
+        for band, next_band in zip(bands, bands[1:]):
+            self.assertEqual(band[1], next_band[0])
+        self.assertEqual(bands, [[-180, -90], [-90, 0], [0, 90], [90, 180]])
+
+    def test_parse_lon_bands(self):
+        obs_name, filters = parse_shard_option("EEA:2:-30:50")
+        self.assertEqual(obs_name, "EEA")
+        self.assertEqual(filters, [{"longitude": [-30, 10]}, {"longitude": [10, 50]}])
+
+    def test_parse_station_list(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            station_file = Path(tmp_dir).joinpath("stations.txt")
+            station_file.write_text("Oslo Bergen\n\nTromsø*\n", encoding="utf-8")
+            obs_name, filters = parse_shard_option(f"EBAS:{station_file}")
+        self.assertEqual(obs_name, "EBAS")
+        self.assertEqual(
+            filters,
+            [{"station_name": ["Oslo", "Bergen"]}, {"station_name": ["Tromsø*"]}],
+        )
+
+    def test_no_shards(self):
+        with self.assertRaises(ValueError):
+            parse_shard_option("EEA")
+
+
+class TestShardUnits(unittest.TestCase):
+    def test_shard_and_merge_units(self):
+        unit = {
+            "name": "EMEP_EEA",
+            "hold_pattern": "pya_1_caching_EEA*",
+            "cfg": {
+                "obs_cfg": {"EEA": {"obs_filters": {"altitude": [-20, 1000]}}},
+            },
+        }
+        other = {"name": "EMEP_AN", "hold_pattern": "", "cfg": {"obs_cfg": {"AN": {}}}}
+        units = list(shard_units([unit, other], {"EEA": get_lon_band_filters(2)}))
+        self.assertEqual(
+            [unit["name"] for unit in units],
+            [
+                f"EMEP_EEA{SHARD_NAME_START}01",
+                f"EMEP_EEA{SHARD_NAME_START}02",
+                "EMEP_EEA",
+                "EMEP_AN",
+            ],
+        )
+        shard = units[0]
+        self.assertEqual(
+            shard["cfg"]["obs_cfg"]["EEA"]["obs_filters"],
+            {"altitude": [-20, 1000], "longitude": [-180, 0]},
+        )
+        self.assertTrue(shard["cfg"]["only_colocation"])
+        self.assertEqual(shard["shard_of"], "EMEP_EEA")
+        merge = units[2]
+        self.assertEqual(merge["shards"], [units[0]["name"], units[1]["name"]])
+        self.assertTrue(merge["cfg"]["only_json"])
+        self.assertNotIn("longitude", merge["cfg"]["obs_cfg"]["EEA"]["obs_filters"])
+
+
+class TestDropDuplicateStations(unittest.TestCase):
+    def test_edge_station_kept_once(self):
+        data = xr.concat(
+            [get_coldata(["a", "edge"]), get_coldata(["edge", "b"], offset=100)],
+            dim="station_name",
+        )
+        merged = drop_duplicate_stations(data)
+        self.assertEqual(list(merged["station_name"].values), ["a", "edge", "b"])
+        # the station is taken from the first shard
+        self.assertEqual(
+            merged.sel(station_name="edge").values.tolist(),
+            get_coldata(["a", "edge"]).sel(station_name="edge").values.tolist(),
+        )
+
+    def test_no_duplicates(self):
+        data = get_coldata(["a", "b"])
+        self.assertIs(drop_duplicate_stations(data), data)
+
+
+if __name__ == "__main__":
+    unittest.main()